@@ -0,0 +1,229 @@
+'''Асинхронные представления чтения товаров и типов товаров для ASGI.
+
+Представления DRF под ASGI занимают поток пула sync_to_async на весь
+запрос. Здесь аутентификация по JWT, фильтрация и сериализация идут
+в цикле событий, а запросы к БД — через асинхронный ORM Django.
+Ответы совпадают с ответами ProductViewSet и ProductTypeViewSet
+(без кэша ответов и условных запросов).
+'''
+from functools import wraps
+from http import HTTPStatus
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import HttpResponse
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import (APIException, AuthenticationFailed,
+                                       MethodNotAllowed, NotAuthenticated,
+                                       NotFound, ValidationError)
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from products.models import ExchangeRate, ProductType
+from products.validators import barcode_regex_validator
+from .changes import await_for_changes, load_changes
+from .filters import ProductFilter
+from .pagination import ProductPagination, ProductTypePagination
+from .renderers import FastJSONRenderer
+from .serializers import (AsyncChangeFeedQuerySerializer,
+                          ProductCreateReadSerializer,
+                          ProductDenormalizedReadSerializer,
+                          ProductTypeSerializer)
+from .utils import product_queryset
+
+ORDERING_FIELDS = ('name', 'date_updated', 'price')
+
+
+class AsyncJWTAuthentication(JWTAuthentication):
+    '''JWTAuthentication, читающая пользователя асинхронным ORM'''
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        '''То же, что JWTAuthentication.get_user'''
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification'))
+        try:
+            user = await self.user_model.objects.aget(
+                **{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_('User not found'),
+                                       code='user_not_found')
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'),
+                                       code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(
+                user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."),
+                code='password_changed')
+        return user
+
+
+authentication = AsyncJWTAuthentication()
+
+
+def render(data, status=HTTPStatus.OK, headers=None):
+    return HttpResponse(FastJSONRenderer().render(data), status=status,
+                        headers=headers, content_type='application/json')
+
+
+def api_view(view):
+    '''Обязательный JWT, только GET и ошибки в формате DRF'''
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            user_auth = await authentication.aauthenticate(request)
+            if user_auth is None:
+                raise NotAuthenticated()
+            request.user, request.auth = user_auth
+            if request.method != 'GET':
+                raise MethodNotAllowed(request.method)
+            return await view(request, *args, **kwargs)
+        except APIException as e:
+            headers = None
+            if isinstance(e, (AuthenticationFailed, NotAuthenticated)):
+                headers = {'WWW-Authenticate':
+                           authentication.authenticate_header(request)}
+            elif isinstance(e, MethodNotAllowed):
+                headers = {'Allow': 'GET'}
+            data = (e.detail if isinstance(e.detail, (list, dict))
+                    else {'detail': e.detail})
+            return render(data, status=e.status_code, headers=headers)
+    return wrapper
+
+
+def get_product_serializer_class():
+    if settings.PRODUCT_DENORMALIZED_PRICE:
+        return ProductDenormalizedReadSerializer
+    return ProductCreateReadSerializer
+
+
+async def paginate(request, queryset, paginator, serializer_class,
+                   context=None):
+    '''Страница limit/offset в формате LimitOffsetPagination
+    с размерами страниц paginator (подсчет всегда точный)'''
+
+    drf_request = Request(request)
+    paginator.request = drf_request
+    paginator.limit = paginator.get_limit(drf_request)
+    paginator.offset = paginator.get_offset(drf_request)
+    paginator.count = await queryset.acount()
+    page = [instance async for instance in
+            queryset[paginator.offset:paginator.offset + paginator.limit]]
+    return {'count': paginator.count,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'results': serializer_class(page, many=True,
+                                        context=context or {}).data}
+
+
+async def filter_products(request):
+    '''Товары с фильтрами ProductFilter и сортировкой ?ordering=.
+    Только с target_currency фильтр сам читает курс из БД,
+    поэтому его выборка строится в потоке'''
+
+    query_params = request.GET.copy()
+    if query_params.get('ordering', '').lstrip('-') not in ORDERING_FIELDS:
+        query_params.pop('ordering', None)
+    filterset = ProductFilter(query_params,
+                              queryset=product_queryset(query_params),
+                              request=Request(request))
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+    if query_params.get('target_currency'):
+        return await sync_to_async(lambda: filterset.qs)()
+    return filterset.qs
+
+
+async def get_product_context(request):
+    target_currency = request.GET.get('target_currency')
+    if not target_currency:
+        return {}
+    target_rate = await sync_to_async(ExchangeRate.objects.get_rate)(
+        target_currency)
+    if target_rate is None:
+        raise ValidationError({'target_currency': [
+            f'Курс валюты {target_currency} не задан']})
+    return {'target_currency': target_currency, 'target_rate': target_rate}
+
+
+@api_view
+async def product_list(request):
+    queryset = await filter_products(request)
+    return render(await paginate(request, queryset, ProductPagination(),
+                                 get_product_serializer_class(),
+                                 await get_product_context(request)))
+
+
+@api_view
+async def product_detail(request, pk):
+    queryset = product_queryset(request.GET)
+    try:
+        product = await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        raise NotFound('No Product matches the given query.')
+    return render(get_product_serializer_class()(
+        product, context=await get_product_context(request)).data)
+
+
+@api_view
+async def product_by_barcode(request, barcode):
+    try:
+        barcode_regex_validator(barcode)
+    except DjangoValidationError as e:
+        raise ValidationError({'barcode': e.messages})
+    product = await product_queryset(request.GET).filter(
+        barcode=barcode).afirst()
+    if product is None:
+        raise NotFound('Товар с таким штрихкодом не найден')
+    return render(get_product_serializer_class()(product).data)
+
+
+@api_view
+async def product_changes(request):
+    '''Лента изменений как ProductViewSet.changes. Long-poll ждет
+    в цикле событий, поэтому допускает ?wait= до CHANGE_FEED_MAX_WAIT'''
+
+    serializer = AsyncChangeFeedQuerySerializer(data=request.GET)
+    if not serializer.is_valid():
+        raise ValidationError(serializer.errors)
+    params = serializer.validated_data
+    if params['wait']:
+        await await_for_changes(params['since'], params['wait'])
+    return render(await sync_to_async(load_changes)(
+        params['since'], params['limit'], get_product_serializer_class()))
+
+
+@api_view
+async def product_type_list(request):
+    return render(await paginate(request, ProductType.objects.all(),
+                                 ProductTypePagination(),
+                                 ProductTypeSerializer))
+
+
+@api_view
+async def product_type_detail(request, pk):
+    try:
+        product_type = await ProductType.objects.aget(pk=pk)
+    except ProductType.DoesNotExist:
+        raise NotFound('No ProductType matches the given query.')
+    return render(ProductTypeSerializer(product_type).data)
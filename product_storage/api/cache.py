@@ -0,0 +1,206 @@
+'''Кэш ответов ProductViewSet.
+
+Ключ детального ответа содержит версию товара, ключ списка — общее
+поколение списков. Изменение товара увеличивает его версию и поколение
+списков, поэтому старые записи перестают читаться сразу, даже если
+запрос успел положить в кэш данные, прочитанные до изменения.
+
+Поиск по штрихкоду обслуживается LRU-кэшем процесса: записи сверяются
+с теми же версиями товаров.
+
+Версии и поколение хранятся в кэше Django. Сброс виден всем процессам,
+только если кэш общий (Redis при REDIS_URL). С locmem по умолчанию
+у каждого процесса свои версии: изменение, сделанное в одном процессе,
+не сбрасывает ответы, закэшированные другими, и они отдаются до
+истечения PRODUCT_CACHE_TIMEOUT. Поэтому с несколькими процессами
+сервера нужен общий кэш.
+'''
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from hashlib import md5
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+
+from .utils import normalized_query
+
+LIST_GENERATION_KEY = 'products:list:generation'
+HITS_KEY = 'products:cache:hits'
+MISSES_KEY = 'products:cache:misses'
+
+
+def increment(key, initial):
+    '''Атомарно увеличивает счетчик, создавая его со значением initial'''
+
+    try:
+        return cache.incr(key)
+    except ValueError:
+        if cache.add(key, initial, timeout=None):
+            return initial
+        return cache.incr(key)
+
+
+def get_counter(key):
+    '''Значение счетчика-версии. Пропавший из кэша счетчик
+    восстанавливается от текущего времени, чтобы не совпасть
+    со старыми версиями'''
+
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        value = cache.get(key)
+    return value
+
+
+def version_key(pk):
+    return f'products:version:{pk}'
+
+
+def detail_key(pk):
+    return f'products:detail:{pk}:{get_counter(version_key(pk))}'
+
+
+def list_key(request):
+    digest = md5(normalized_query(request).encode(),
+                 usedforsecurity=False).hexdigest()
+    return f'products:list:{get_counter(LIST_GENERATION_KEY)}:{digest}'
+
+
+def queryset_key(prefix, queryset):
+    '''Ключ выборки товаров в текущем поколении списков. Не зависит
+    от сортировки и столбцов выборки; None для заведомо пустой'''
+
+    try:
+        sql, params = queryset.values('pk').order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    digest = md5(repr((sql, params)).encode(),
+                 usedforsecurity=False).hexdigest()
+    return f'{prefix}:{get_counter(LIST_GENERATION_KEY)}:{digest}'
+
+
+def read(key):
+    data = cache.get(key)
+    increment(HITS_KEY if data is not None else MISSES_KEY, 1)
+    return data
+
+
+def write(key, data):
+    cache.set(key, data, timeout=settings.PRODUCT_CACHE_TIMEOUT)
+
+
+def read_or_compute(key, compute):
+    '''Значение из кэша или результат compute(), сохраненный в кэш.
+    В счетчики попаданий кэша ответов не входит'''
+
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        write(key, value)
+    return value
+
+
+def invalidate(pks):
+    '''Сбрасывает ответы товаров pks и все списки: два обращения
+    к кэшу при любом числе товаров. Версия сравнивается только на
+    равенство, поэтому товарам записывается одна новая уникальная
+    версия через set_many, а не incr на каждый товар'''
+
+    version = uuid.uuid4().hex
+    cache.set_many({version_key(pk): version for pk in pks}, timeout=None)
+    increment(LIST_GENERATION_KEY, time.time_ns())
+
+
+def get_stats():
+    hits, misses = (cache.get(HITS_KEY, 0), cache.get(MISSES_KEY, 0))
+    return {'hits': hits, 'misses': misses}
+
+
+class LRUCache:
+    '''Кэш процесса не более чем на max_size записей: при переполнении
+    вытесняется запись, которую дольше всех не читали'''
+
+    def __init__(self, max_size, timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = (time.monotonic() + self.timeout
+                   if self.timeout is not None else None)
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# data и version пусты, пока для штрихкода известен только id товара
+BarcodeEntry = namedtuple('BarcodeEntry', ('pk', 'version', 'data'))
+
+barcode_cache = LRUCache(settings.PRODUCT_BARCODE_CACHE_SIZE,
+                         timeout=settings.PRODUCT_CACHE_TIMEOUT)
+
+
+def get_versions(pks):
+    '''Текущие версии товаров одним обращением к общему кэшу'''
+
+    keys = [version_key(pk) for pk in pks]
+    versions = cache.get_many(keys)
+    for key in set(keys) - set(versions):
+        versions[key] = get_counter(key)
+    return {pk: versions[version_key(pk)] for pk in pks}
+
+
+def get_by_barcodes(barcodes, load):
+    '''Сериализованные товары по штрихкодам: {штрихкод: данные}.
+
+    Актуальные записи отдаются без обращения к БД, остальные штрихкоды
+    читает load(штрихкоды) -> {штрихкод: (id, данные)}. Данные кэшируются
+    с версией, прочитанной до запроса к БД, как и в detail_key, поэтому
+    первый запрос штрихкода только запоминает id товара. Возвращает
+    также число попаданий'''
+
+    entries = {barcode: barcode_cache.get(barcode) for barcode in barcodes}
+    versions = get_versions({entry.pk for entry in entries.values()
+                             if entry is not None})
+    found = {}
+    for barcode, entry in entries.items():
+        if (entry is not None and entry.data is not None
+                and versions[entry.pk] == entry.version):
+            found[barcode] = entry.data
+    hits = len(found)
+    missing = [barcode for barcode in barcodes if barcode not in found]
+    if missing:
+        for barcode, (pk, data) in load(missing).items():
+            entry = entries.get(barcode)
+            if entry is not None and entry.pk == pk:
+                barcode_cache.set(barcode,
+                                  BarcodeEntry(pk, versions[pk], data))
+            else:
+                barcode_cache.set(barcode, BarcodeEntry(pk, None, None))
+            found[barcode] = data
+    return found, hits
@@ -0,0 +1,85 @@
+'''Лента изменений каталога: GET /products/changes/?since=<токен>.
+
+Клиент хранит токен next из ответа и передает его в следующем
+запросе, начиная с since=0 (весь каталог). У каждого объекта в ленте
+одна запись — последнее изменение, поэтому синхронизация стоит
+O(изменившихся объектов). Записи отдаются с текущим состоянием
+объекта, удаленные — с deleted=true и data=null.
+
+seq выдается при вставке, и записи фиксируются в порядке seq: на
+SQLite записи сериализуются, на PostgreSQL seq выдается под
+advisory-блокировкой (см. CatalogChangeQuerySet.record). Поэтому
+токен next не пропускает записи, зафиксированные позже.
+
+Long-poll синхронного представления занимает поток воркера на все
+ожидание (не дольше CHANGE_FEED_SYNC_MAX_WAIT секунд). Под ASGI
+асинхронное представление ждет в цикле событий до CHANGE_FEED_MAX_WAIT.
+'''
+import asyncio
+import time
+
+from product_storage.constants import CHANGE_FEED_POLL_INTERVAL
+from products.models import CatalogChange, CatalogObjects, ProductType
+from .serializers import ProductTypeSerializer
+from .utils import product_queryset
+
+
+def wait_for_changes(since, timeout):
+    '''Ждет записей после since до timeout секунд, проверяя
+    ленту раз в CHANGE_FEED_POLL_INTERVAL секунд'''
+
+    deadline = time.monotonic() + timeout
+    changes = CatalogChange.objects.filter(seq__gt=since)
+    while not changes.exists():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(CHANGE_FEED_POLL_INTERVAL, remaining))
+    return True
+
+
+async def await_for_changes(since, timeout):
+    '''Асинхронный wait_for_changes: ожидание не занимает поток'''
+
+    deadline = time.monotonic() + timeout
+    changes = CatalogChange.objects.filter(seq__gt=since)
+    while not await changes.aexists():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        await asyncio.sleep(min(CHANGE_FEED_POLL_INTERVAL, remaining))
+    return True
+
+
+def load_changes(since, limit, product_serializer_class):
+    '''Страница ленты после since: по запросу на ленту, товары
+    и типы товаров'''
+
+    changes = list(CatalogChange.objects.filter(seq__gt=since).order_by(
+        'seq')[:limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    ids = {object_type: [change.object_id for change in changes
+                         if change.object_type == object_type
+                         and not change.deleted]
+           for object_type in CatalogObjects.values}
+    objects = {
+        CatalogObjects.PRODUCT: {
+            product.pk: product_serializer_class(product).data
+            for product in product_queryset({}).filter(
+                pk__in=ids[CatalogObjects.PRODUCT])},
+        CatalogObjects.PRODUCT_TYPE: {
+            product_type.pk: ProductTypeSerializer(product_type).data
+            for product_type in ProductType.objects.filter(
+                pk__in=ids[CatalogObjects.PRODUCT_TYPE])},
+    }
+    results = []
+    for change in changes:
+        # Объект мог быть удален после чтения ленты
+        data = objects[change.object_type].get(change.object_id)
+        results.append({'seq': change.seq, 'object': change.object_type,
+                        'id': change.object_id, 'deleted': data is None,
+                        'data': data})
+    return {'changes': results,
+            'next': str(changes[-1].seq if changes else since),
+            'has_more': has_more}
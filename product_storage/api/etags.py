@@ -0,0 +1,56 @@
+'''Строгие ETag ответов о товарах.
+
+ETag товара строится из id и date_updated (auto_now), поэтому меняется
+при любом сохранении товара или его цены. ETag списка — хэш от
+MAX(date_updated) и числа товаров под фильтром и параметров запроса.
+В оба входит формат ответа: разные представления не должны совпадать.
+
+If-Match в PATCH товара и update-amount сравнивается с версией товара
+(date_updated), поэтому подходит ETag ответа в любом формате.
+'''
+import re
+from datetime import datetime, timezone
+from hashlib import md5
+from http import HTTPStatus
+
+from django.utils.http import parse_etags
+from rest_framework.exceptions import APIException
+
+PRODUCT_ETAG = re.compile(
+    r'"(?P<pk>\d+)-(?P<seconds>\d+)\.(?P<microseconds>\d{6})-[^"]*"')
+
+
+class PreconditionFailed(APIException):
+    status_code = HTTPStatus.PRECONDITION_FAILED
+    default_detail = 'Товар изменен после чтения, перечитайте его'
+    default_code = 'precondition_failed'
+
+
+def product_etag(pk, date_updated, response_format):
+    return f'"{pk}-{date_updated.timestamp():.6f}-{response_format}"'
+
+
+def product_versions(if_match, pk):
+    '''Значения date_updated товара pk из ETag заголовка If-Match;
+    None для "*". Слабые ETag (W/ добавляет CompressionMiddleware
+    сжатым ответам) сравниваются по значению, ETag другого
+    товара не подходит'''
+
+    etags = parse_etags(if_match)
+    if etags == ['*']:
+        return None
+    versions = []
+    for etag in etags:
+        match = PRODUCT_ETAG.fullmatch(etag.removeprefix('W/'))
+        if match and int(match['pk']) == pk:
+            versions.append(datetime.fromtimestamp(
+                int(match['seconds']), tz=timezone.utc).replace(
+                microsecond=int(match['microseconds'])))
+    return versions
+
+
+def list_etag(last_modified, count, query, response_format):
+    digest = md5(f'{last_modified.isoformat()}|{count}|{query}|'
+                 f'{response_format}'.encode(),
+                 usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
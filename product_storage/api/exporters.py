@@ -0,0 +1,35 @@
+from rest_framework import serializers
+
+from product_storage.constants import EXPORT_CHUNK_SIZE
+from .serializers import ProductPriceSerializer
+from .utils import price_field
+
+
+def get_export_columns():
+    return ('id', 'name', price_field('id'), price_field('currency'),
+            price_field('price'), 'amount', 'barcode', 'date_updated',
+            'type', 'is_active')
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    '''Товары в формате ProductCreateReadSerializer, прочитанные
+    серверным курсором по chunk_size строк, без создания моделей
+    и сериализаторов на каждую строку'''
+
+    date_field = serializers.DateTimeField()
+    price_serializer_field = ProductPriceSerializer().fields['price']
+    rows = queryset.values_list(*get_export_columns()).iterator(
+        chunk_size=chunk_size)
+    for (pk, name, price_id, currency, price, amount, barcode,
+         date_updated, type_id, is_active) in rows:
+        yield {'id': pk,
+               'name': name,
+               'price': {'id': price_id, 'currency': currency,
+                         'price': price_serializer_field.to_representation(
+                             price)}
+               if price_id is not None else None,
+               'amount': amount,
+               'barcode': barcode,
+               'date_updated': date_field.to_representation(date_updated),
+               'type': type_id,
+               'is_active': is_active}
@@ -1,6 +1,9 @@
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
 
-from products.models import Product
+from products.models import Currencies, ExchangeRate, Product
+from products.search import search_products
+from .utils import price_field
 
 
 class ProductFilter(filters.FilterSet):
@@ -15,12 +18,64 @@ class ProductFilter(filters.FilterSet):
     date_updated_before = filters.DateTimeFilter(
         field_name='date_updated', lookup_expr='lte')
     is_active = filters.BooleanFilter(field_name='is_active')
-    currency = filters.CharFilter(field_name='price__currency',
-                                  lookup_expr='iexact')
+    currency = filters.CharFilter(method='filter_currency')
+    search = filters.CharFilter(method='filter_search')
+    target_currency = filters.ChoiceFilter(choices=Currencies.choices,
+                                           method='filter_target_currency')
 
     class Meta:
         model = Product
         fields = (
             'name', 'min_price', 'max_price', 'is_active',
             'date_updated_after', 'date_updated_before',
-            'currency')
+            'currency', 'search', 'target_currency')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in ('min_price', 'max_price'):
+            self.filters[name].field_name = price_field('price')
+
+    def filter_queryset(self, queryset):
+        '''С target_currency min_price и max_price заданы в этой валюте:
+        границы переводятся в базовую и сравниваются с price_base'''
+
+        target_currency = self.form.cleaned_data.get('target_currency')
+        if target_currency:
+            self.target_rate = ExchangeRate.objects.get_rate(target_currency)
+            if self.target_rate is None:
+                raise ValidationError({'target_currency': [
+                    f'Курс валюты {target_currency} не задан']})
+            for name in ('min_price', 'max_price'):
+                self.filters[name].field_name = 'price_base'
+                if self.form.cleaned_data.get(name) is not None:
+                    self.form.cleaned_data[name] *= self.target_rate
+        return super().filter_queryset(queryset)
+
+    def filter_currency(self, queryset, name, value):
+        '''Коды валют хранятся в нижнем регистре: точное сравнение
+        вместо iexact позволяет использовать индекс (currency, price)'''
+
+        return queryset.filter(**{price_field('currency'): value.lower()})
+
+    def filter_target_currency(self, queryset, name, value):
+        '''Товары без курса своей валюты нельзя сравнить с остальными:
+        если такие есть в выборке, запрос отклоняется, а не теряет их
+        молча. Товары без цены в выборку не попадают'''
+
+        missing = sorted(queryset.filter(
+            price_base__isnull=True, price_currency__isnull=False,
+        ).order_by().values_list('price_currency', flat=True).distinct())
+        if missing:
+            raise ValidationError({'target_currency': [
+                f'Курс валюты {currency} не задан' for currency in missing]})
+        return queryset.filter(price_base__isnull=False)
+
+    def filter_search(self, queryset, name, value):
+        '''Полнотекстовый поиск по префиксам слов названия и штрихкода.
+        Без явного ordering товары сортируются по релевантности'''
+
+        queryset = search_products(queryset, value)
+        if self.request is None or not self.request.query_params.get(
+                'ordering'):
+            queryset = queryset.order_by('-search_rank')
+        return queryset
@@ -0,0 +1,149 @@
+'''Быстрый путь чтения списков: строки values_list вместо экземпляров
+модели и сериализатора.
+
+RowMapper один раз разбирает поля сериализатора и собирает функцию
+«кортеж строки -> словарь ответа» на itemgetter. Значения, которые сериализатор
+отдает как есть (числа, строки, id связей), копируются без вызова
+полей. Decimal и даты проходят через преобразование с параметрами
+поля (точность, часовой пояс), вычисленными один раз на список,
+а не на каждую строку; ответ совпадает с ответом сериализатора.
+'''
+import decimal
+from datetime import datetime
+from functools import cache
+from operator import itemgetter
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.settings import api_settings
+
+# Поля, чей to_representation не меняет значение из БД
+PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField,
+                serializers.BooleanField, PrimaryKeyRelatedField)
+
+
+def make_decimal_converter(field):
+    if (field.decimal_places is None or field.normalize_output
+            or field.localize or not getattr(
+                field, 'coerce_to_string',
+                api_settings.COERCE_DECIMAL_TO_STRING)):
+        return field.to_representation
+    # Как в DecimalField.quantize
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return '{:f}'.format(value.quantize(exponent, rounding=rounding,
+                                            context=context))
+    return convert
+
+
+def make_datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = (field.timezone if hasattr(field, 'timezone')
+                      else field.default_timezone())
+    if (output_format is None or output_format.lower() != ISO_8601
+            or field_timezone is None):
+        return field.to_representation
+
+    def convert(value):
+        if not isinstance(value, datetime) or value.tzinfo is None:
+            return field.to_representation(value)
+        # Как в DateTimeField.to_representation
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def make_converter(field):
+    '''to_representation поля для одного списка строк'''
+
+    if isinstance(field, serializers.DecimalField):
+        return make_decimal_converter(field)
+    if isinstance(field, serializers.DateTimeField):
+        return make_datetime_converter(field)
+    return field.to_representation
+
+
+def make_builder(names, indexes, converted, nested):
+    '''Функция (строка, преобразователи) -> словарь. Столбцы indexes
+    (у вложенного сериализатора — его id) читаются одним itemgetter,
+    затем поля converted ((имя, столбец)) проходят через преобразователь,
+    а nested ((имя, функция)) заменяются вложенным словарем'''
+
+    if len(indexes) > 1:
+        get_values = itemgetter(*indexes)
+    else:
+        # itemgetter с одним индексом возвращает значение, а не кортеж
+        index, = indexes
+
+        def get_values(row):
+            return row[index],
+
+    def build(row, converters):
+        # Замена значения существующего ключа не меняет порядок ключей
+        data = dict(zip(names, get_values(row)))
+        for name, index in converted:
+            if data[name] is not None:
+                data[name] = converters[index](data[name])
+        for name, build_nested in nested:
+            if data[name] is not None:
+                data[name] = build_nested(row, converters)
+        return data
+    return build
+
+
+class RowMapper:
+    '''lookups — поля для values_list, map(rows) — список словарей
+    в формате сериализатора. Вложенный сериализатор становится None,
+    если его первый столбец (id) пуст, как и отсутствующая связь'''
+
+    def __init__(self, serializer_class, fields=None):
+        self.lookups = []
+        self.converted_fields = {}
+        self.map_row = self.compile(serializer_class(), '', fields)
+
+    def compile(self, serializer, prefix, fields=None):
+        '''Функция «строка -> словарь» для полей serializer
+        (только fields, если они заданы)'''
+
+        names = []
+        indexes = []
+        converted = []
+        nested = []
+        first_index = len(self.lookups)
+        for name, field in serializer.fields.items():
+            if field.write_only or (fields and name not in fields):
+                continue
+            names.append(name)
+            indexes.append(len(self.lookups))
+            if isinstance(field, serializers.BaseSerializer):
+                nested_prefix = (prefix if field.source == '*'
+                                 else f'{prefix}{field.source}__')
+                nested.append((name, self.compile(field, nested_prefix)))
+                continue
+            self.lookups.append(prefix + '__'.join(field.source_attrs))
+            if not isinstance(field, PLAIN_FIELDS):
+                self.converted_fields[indexes[-1]] = field
+                converted.append((name, indexes[-1]))
+        if len(self.lookups) == first_index:
+            raise ValueError(f'{type(serializer).__name__} без полей')
+        return make_builder(names, indexes, converted, nested)
+
+    def map(self, rows):
+        converters = {index: make_converter(field)
+                      for index, field in self.converted_fields.items()}
+        map_row = self.map_row
+        return [map_row(row, converters) for row in rows]
+
+
+@cache
+def get_row_mapper(serializer_class, fields=None):
+    return RowMapper(serializer_class, fields)
@@ -0,0 +1,231 @@
+'''Метрики запросов к API (включаются API_METRICS=true).
+
+MetricsMiddleware замеряет для каждого запроса число SQL-запросов
+и время в БД (execute_wrapper соединений), время сериализации
+данных ответа (to_representation сериализаторов или RowMapper),
+время рендеринга ответа (кодирование в JSON/CSV и т. д.), размер
+ответа на проводе и общее время. Результат отдается заголовком
+Server-Timing, строкой JSON в логгере api.metrics и накапливается
+по представлениям (ProductViewSet.list, ProductTypeViewSet.stats
+и т. д.) для эндпоинта в формате Prometheus. SQL дольше API_SLOW_QUERY_MS
+миллисекунд пишется в лог предупреждением.
+
+Счетчики хранятся в памяти процесса: при нескольких процессах
+сервера каждый отдает свои.
+'''
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Имя метрики, тип, описание и поле ViewStats
+METRICS = (
+    ('api_requests_total', 'counter', 'Число запросов', 'requests'),
+    ('api_request_duration_seconds_total', 'counter',
+     'Суммарное время обработки запросов', 'duration'),
+    ('api_db_queries_total', 'counter', 'Число SQL-запросов', 'queries'),
+    ('api_db_duration_seconds_total', 'counter',
+     'Суммарное время SQL-запросов', 'db_duration'),
+    ('api_serialize_duration_seconds_total', 'counter',
+     'Суммарное время сериализации данных ответов', 'serialize_duration'),
+    ('api_render_duration_seconds_total', 'counter',
+     'Суммарное время рендеринга ответов', 'render_duration'),
+    ('api_response_bytes_total', 'counter',
+     'Суммарный размер ответов (без потоковых)', 'response_bytes'),
+    ('api_slow_queries_total', 'counter',
+     'Число SQL-запросов дольше API_SLOW_QUERY_MS', 'slow_queries'),
+)
+
+
+class ViewStats:
+    __slots__ = tuple(field for *_, field in METRICS)
+
+    def __init__(self):
+        for field in self.__slots__:
+            setattr(self, field, 0)
+
+
+class MetricsRegistry:
+    '''Накопленные метрики по представлениям'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewStats)
+
+    def add(self, request_metrics, duration):
+        with self.lock:
+            stats = self.views[request_metrics.view]
+            stats.requests += 1
+            stats.duration += duration
+            stats.queries += request_metrics.queries
+            stats.db_duration += request_metrics.db_duration
+            stats.serialize_duration += request_metrics.serialize_duration
+            stats.render_duration += request_metrics.render_duration
+            stats.response_bytes += request_metrics.response_bytes or 0
+            stats.slow_queries += request_metrics.slow_queries
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+    def export(self):
+        '''Текстовый формат экспозиции Prometheus'''
+
+        with self.lock:
+            views = sorted(self.views.items())
+            lines = []
+            for name, metric_type, description, field in METRICS:
+                lines += [f'# HELP {name} {description}',
+                          f'# TYPE {name} {metric_type}']
+                lines += [f'{name}{{view="{view}"}} {getattr(stats, field)}'
+                          for view, stats in views]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class RequestMetrics:
+    '''Замеры одного запроса. Экземпляр — обертка execute_wrapper:
+    считает SQL-запросы, их время и медленные запросы'''
+
+    def __init__(self, view):
+        self.view = view
+        self.queries = 0
+        self.slow_queries = 0
+        self.db_duration = 0
+        self.serialize_duration = 0
+        self.render_duration = 0
+        self.render_started = None
+        self.response_bytes = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_duration += duration
+            if duration * 1000 >= settings.API_SLOW_QUERY_MS:
+                self.slow_queries += 1
+                logger.warning(json.dumps({
+                    'event': 'slow_query', 'view': self.view,
+                    'duration_ms': round(duration * 1000, 3),
+                    'sql': sql, 'many': many}, ensure_ascii=False))
+
+    def start_render(self, response):
+        self.render_started = time.perf_counter()
+        response.add_post_render_callback(self.finish_render)
+
+    def finish_render(self, response):
+        self.render_duration = time.perf_counter() - self.render_started
+
+    def server_timing(self, duration):
+        return ', '.join((
+            f'db;dur={self.db_duration * 1000:.3f};'
+            f'desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize_duration * 1000:.3f}',
+            f'render;dur={self.render_duration * 1000:.3f}',
+            f'total;dur={duration * 1000:.3f}'))
+
+
+@contextmanager
+def measure_serialization(request):
+    '''Добавляет время блока к сериализации данных ответа, если
+    метрики включены. SQL-запросы внутри блока (ленивые связи)
+    входят и во время БД'''
+
+    request_metrics = getattr(request, 'metrics', None)
+    if request_metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics.serialize_duration += time.perf_counter() - start
+
+
+def view_name(request):
+    '''ProductViewSet.list, ProductTypeViewSet.stats; для остальных
+    представлений — имя маршрута'''
+
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None)
+    if view_class is not None and actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{view_class.__name__}.{action}'
+    return match.view_name
+
+
+class MetricsMiddleware:
+    '''Замеряет запросы к API, если API_METRICS=true. Ставится
+    перед CompressionMiddleware, чтобы размер ответа был
+    размером на проводе, а общее время включало сжатие'''
+
+    def __init__(self, get_response):
+        if not settings.API_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        # Имя представления известно только после разрешения URL,
+        # поэтому его подставляет process_view
+        request_metrics = request.metrics = RequestMetrics('unresolved')
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(request_metrics))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        if not response.streaming:
+            request_metrics.response_bytes = len(response.content)
+        response['Server-Timing'] = request_metrics.server_timing(duration)
+        registry.add(request_metrics, duration)
+        logger.info(json.dumps({
+            'event': 'request', 'view': request_metrics.view,
+            'method': request.method, 'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'db_queries': request_metrics.queries,
+            'db_ms': round(request_metrics.db_duration * 1000, 3),
+            'serialize_ms': round(
+                request_metrics.serialize_duration * 1000, 3),
+            'render_ms': round(request_metrics.render_duration * 1000, 3),
+            'response_bytes': request_metrics.response_bytes,
+        }, ensure_ascii=False))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics.view = view_name(request)
+
+    def process_template_response(self, request, response):
+        request.metrics.start_render(response)
+        return response
+
+
+def metrics_view(request):
+    '''Метрики в формате Prometheus для сбора с локального адреса'''
+
+    if (not settings.API_METRICS
+            or request.META.get('REMOTE_ADDR')
+            not in settings.API_METRICS_ALLOWED_IPS):
+        raise Http404
+    return HttpResponse(registry.export(),
+                        content_type=PROMETHEUS_CONTENT_TYPE)
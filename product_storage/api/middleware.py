@@ -0,0 +1,142 @@
+'''Сжатие ответов по Accept-Encoding: zstd, br или gzip.
+
+Кодировка выбирается по q-значениям клиента, при равных — в порядке
+ENCODINGS (zstd и br сжимают JSON плотнее и быстрее gzip). zstd и br
+доступны, только если установлены пакеты zstandard и brotli.
+Сжимаются ответы текстовых форматов API не меньше
+RESPONSE_COMPRESSION_MIN_SIZE байт и потоковые выгрузки целиком.
+Сильный ETag сжатого ответа становится слабым (W/"..."), как в
+GZipMiddleware Django: байты ответа уже не совпадают с исходными,
+а сравнение в If-None-Match и так слабое.
+'''
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from product_storage.constants import (BROTLI_COMPRESS_QUALITY,
+                                       GZIP_COMPRESS_LEVEL,
+                                       ZSTD_COMPRESS_LEVEL)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/vnd.columns+json',
+                      'application/x-ndjson', 'text/csv', 'text/html')
+
+
+class BrotliCompressor:
+    '''brotli.Compressor с интерфейсом zlib: compress() и flush()'''
+
+    def __init__(self):
+        self.compressor = brotli.Compressor(quality=BROTLI_COMPRESS_QUALITY)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+def make_encodings():
+    '''Доступные кодировки в порядке предпочтения: имя -> фабрика
+    объекта с compress(data) и flush()'''
+
+    encodings = {}
+    if zstandard is not None:
+        encodings['zstd'] = zstandard.ZstdCompressor(
+            level=ZSTD_COMPRESS_LEVEL).compressobj
+    if brotli is not None:
+        encodings['br'] = BrotliCompressor
+    # wbits=31: поток в формате gzip
+    encodings['gzip'] = lambda: zlib.compressobj(GZIP_COMPRESS_LEVEL,
+                                                 zlib.DEFLATED, 31)
+    return encodings
+
+
+ENCODINGS = make_encodings()
+
+
+def negotiate_encoding(accept_encoding):
+    '''Кодировка из ENCODINGS для заголовка Accept-Encoding или None'''
+
+    weights = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        name, _, value = params.partition('=')
+        if name.strip().lower() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding] = weight
+    best, best_weight = None, 0.0
+    for coding in ENCODINGS:
+        weight = weights.get(coding, weights.get('*', 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+    return best
+
+
+def compress_stream(chunks, compressor):
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def acompress_stream(chunks, compressor):
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        min_size = settings.RESPONSE_COMPRESSION_MIN_SIZE
+        content_type = response.get('Content-Type', '').partition(';')[0]
+        if (not min_size or response.has_header('Content-Encoding')
+                or content_type.strip() not in COMPRESSIBLE_TYPES
+                or (not response.streaming
+                    and len(response.content) < min_size)):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        compressor = ENCODINGS[encoding]()
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(
+                    response.streaming_content, compressor)
+            else:
+                response.streaming_content = compress_stream(
+                    response.streaming_content, compressor)
+            del response['Content-Length']
+        else:
+            compressed = (compressor.compress(response.content)
+                          + compressor.flush())
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
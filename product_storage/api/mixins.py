@@ -1,11 +1,133 @@
 from http import HTTPStatus
 
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import viewsets
 from rest_framework.response import Response
 
+from . import cache
+from .metrics import measure_serialization
 
-class CRUDWithoutPUT(viewsets.ModelViewSet):
+
+class SerializationMetricsMixin:
+    '''list и retrieve ModelViewSet, в которых serializer.data
+    замеряется отдельно от БД и рендеринга ответа'''
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            with measure_serialization(request):
+                data = serializer.data
+            return self.get_paginated_response(data)
+        serializer = self.get_serializer(queryset, many=True)
+        with measure_serialization(request):
+            data = serializer.data
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_object())
+        with measure_serialization(request):
+            data = serializer.data
+        return Response(data)
+
+
+class CRUDWithoutPUT(SerializationMetricsMixin, viewsets.ModelViewSet):
     def update(self, request, *args, **kwargs):
         if request.method == 'PUT':
             return Response(status=HTTPStatus.METHOD_NOT_ALLOWED)
         return super().update(request, *args, **kwargs)
+
+
+class CachedListRetrieveMixin:
+    '''Отдает list и retrieve из кэша, пока товары не изменились'''
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(cache.list_key(request), super().list,
+                                    request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        if (not pk.isdigit() or pk != str(int(pk))
+                or set(request.query_params) - {'format'}):
+            # Ключ строится только по каноничному id, иначе '05' и '5'
+            # попали бы в разные записи с одной версией. Параметры
+            # запроса (например, target_currency) меняют ответ
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(cache.detail_key(pk), super().retrieve,
+                                    request, *args, **kwargs)
+
+    def cached_response(self, key, view, *args, **kwargs):
+        data = cache.read(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        response = view(*args, **kwargs)
+        if response.status_code == HTTPStatus.OK:
+            cache.write(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class ConditionalGetMixin:
+    '''Отвечает 304 на If-None-Match / If-Modified-Since до выполнения
+    list и retrieve. Наследник определяет get_list_version и
+    get_detail_version, возвращающие (etag, дата изменения) или None'''
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            self.get_list_version(request), super().list,
+            request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        return self.conditional_response(
+            self.get_detail_version(request, pk), super().retrieve,
+            request, *args, **kwargs)
+
+    def get_list_version(self, request):
+        return None
+
+    def get_detail_version(self, request, pk):
+        return None
+
+    def conditional_response(self, version, view, request, *args, **kwargs):
+        if version is None:
+            return view(request, *args, **kwargs)
+        etag, last_modified = version
+        # HTTP-даты с точностью до секунды
+        last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != HTTPStatus.OK:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class ValuesListMixin:
+    '''list читает строки через values_list и собирает ответ
+    RowMapper'ом, не создавая экземпляры модели и сериализатора.
+    Наследник возвращает None из get_row_mapper, когда ответ
+    требует самих экземпляров'''
+
+    def get_row_mapper(self):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        mapper = self.get_row_mapper()
+        if mapper is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).values_list(
+            *mapper.lookups)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            with measure_serialization(request):
+                data = mapper.map(page)
+            return self.get_paginated_response(data)
+        with measure_serialization(request):
+            data = mapper.map(queryset)
+        return Response(data)
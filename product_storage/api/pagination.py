@@ -0,0 +1,324 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import (FieldDoesNotExist, ObjectDoesNotExist,
+                                    ValidationError)
+from django.db import connections
+from django.db.models import F, OrderBy, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import cache
+
+
+def estimate_count(queryset):
+    '''Число строк таблицы по статистике СУБД (sqlite_stat1 после
+    ANALYZE, pg_class.reltuples) без чтения таблицы. None, если
+    выборка отфильтрована или статистики нет'''
+
+    if queryset.query.where:
+        return None
+    table = queryset.model._meta.db_table
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        match connection.vendor:
+            case 'sqlite':
+                cursor.execute(
+                    "SELECT count(*) FROM sqlite_master "
+                    "WHERE type = 'table' AND name = 'sqlite_stat1'")
+                if not cursor.fetchone()[0]:
+                    return None
+                # Первое число stat — строк в таблице (в частичном
+                # индексе меньше, поэтому берем максимум)
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s',
+                               [table])
+                counts = [int(stat.split()[0]) for stat, in cursor.fetchall()]
+                return max(counts) if counts else None
+            case 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class '
+                               'WHERE oid = %s::regclass', [table])
+                row = cursor.fetchone()
+                return row[0] if row and row[0] >= 0 else None
+    return None
+
+
+class CountingLimitOffsetPagination(LimitOffsetPagination):
+    '''limit/offset с ограничением max_limit и выбором подсчета строк:
+
+    - по умолчанию точный COUNT(*). С cache_count (выборки товаров)
+      он кэшируется до изменения товаров (смены поколения списков)
+      и переиспользуется всеми страницами одной выборки;
+    - ?count=estimate — оценка по статистике СУБД для выборки без
+      фильтров, иначе точный подсчет;
+    - ?count=false — без подсчета: читается limit + 1 строка, чтобы
+      узнать, есть ли следующая страница, count в ответе нет'''
+
+    count_query_param = 'count'
+    cache_count = False
+
+    def get_count_mode(self, request):
+        value = request.query_params.get(self.count_query_param, '').lower()
+        if value in ('false', '0'):
+            return 'false'
+        if value == 'estimate':
+            return 'estimate'
+        return 'exact'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count_mode = self.get_count_mode(request)
+        if self.count_mode != 'false':
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+        self.offset = self.get_offset(request)
+        self.count = None
+        results = list(queryset[self.offset:self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[:self.limit]
+
+    def get_count(self, queryset):
+        if self.count_mode == 'estimate':
+            count = estimate_count(queryset)
+            if count is not None:
+                return count
+        if not self.cache_count:
+            return super().get_count(queryset)
+        key = cache.queryset_key('products:count', queryset)
+        if key is None:
+            return 0
+        exact_count = super().get_count
+        return cache.read_or_compute(key, lambda: exact_count(queryset))
+
+    def get_paginated_response(self, data):
+        if self.count is not None:
+            return super().get_paginated_response(data)
+        return Response({'next': self.get_next_link(),
+                         'previous': self.get_previous_link(),
+                         'results': data})
+
+    def get_next_link(self):
+        if self.count is not None:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.offset_query_param,
+                                   self.offset + self.limit)
+
+    def get_html_context(self):
+        if self.count is not None:
+            return super().get_html_context()
+        return {'previous_url': self.get_previous_link(),
+                'next_url': self.get_next_link(),
+                'page_links': []}
+
+
+class ProductTypePagination(CountingLimitOffsetPagination):
+    default_limit = settings.PRODUCT_TYPE_PAGE_SIZE
+    max_limit = settings.PRODUCT_TYPE_MAX_PAGE_SIZE
+
+
+class ProductPagination(CountingLimitOffsetPagination):
+    '''limit/offset по умолчанию и keyset-пагинация при наличии ?cursor=.
+
+    В режиме курсора страница выбирается условием WHERE по значению
+    поля сортировки и id последней строки, поэтому задержка не растет
+    с глубиной страницы. COUNT(*) выполняется только по ?count=true
+    (или ?count=estimate)'''
+
+    default_limit = settings.PRODUCT_PAGE_SIZE
+    max_limit = settings.PRODUCT_MAX_PAGE_SIZE
+    cache_count = True
+    cursor_query_param = 'cursor'
+    cursor_mode = False
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.cursor_mode = False
+            return super().paginate_queryset(queryset, request, view)
+        self.cursor_mode = True
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.field, self.descending = self.get_ordering(queryset)
+        path = self.get_ordering_path(queryset)
+        # NULL дает и само поле, и отсутствие связанной строки
+        self.nullable = any(field.null for field in path)
+        self.ordering_field = path[-1]
+        self.count_mode = self.get_count_mode(request)
+        self.count = (self.get_count(queryset)
+                      if self.count_requested(request) else None)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param], queryset)
+        self.reverse = bool(position) and position['r']
+
+        # При обратном проходе (ссылка previous) направление сортировки
+        # меняется, а страница разворачивается перед отдачей
+        descending = self.descending != self.reverse
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(self.get_order_expression(descending),
+                                     prefix + 'id')
+        if position:
+            queryset = queryset.filter(
+                self.get_position_filter(position, descending))
+
+        results = list(queryset[:self.limit + 1])
+        has_more = len(results) > self.limit
+        results = results[:self.limit]
+        if self.reverse:
+            results.reverse()
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = has_more if self.reverse else bool(position)
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        response = {}
+        if self.count is not None:
+            response['count'] = self.count
+        response.update({'next': self.get_next_link(),
+                         'previous': self.get_previous_link(),
+                         'results': data})
+        return Response(response)
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page:
+            return None
+        return self.build_cursor_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page:
+            return None
+        return self.build_cursor_link(self.page[0], reverse=True)
+
+    def count_requested(self, request):
+        return request.query_params.get(
+            self.count_query_param, '').lower() in ('true', '1', 'estimate')
+
+    def get_ordering(self, queryset):
+        '''Первое поле сортировки запроса (или модели) и его направление'''
+
+        ordering = (queryset.query.order_by
+                    or queryset.model._meta.ordering)
+        field = ordering[0]
+        if isinstance(field, OrderBy):
+            return field.expression.name, field.descending
+        return field.lstrip('-'), field.startswith('-')
+
+    def get_order_expression(self, descending):
+        '''Сортировка по полю курсора. NULL (товары без цены) идут
+        в конце выдачи, поэтому при обратном проходе — в начале'''
+
+        if not self.nullable:
+            return f'-{self.field}' if descending else self.field
+        nulls = ({'nulls_first': True} if self.reverse
+                 else {'nulls_last': True})
+        field = F(self.field)
+        return field.desc(**nulls) if descending else field.asc(**nulls)
+
+    def get_position_filter(self, position, descending):
+        '''Строки после position в порядке обхода'''
+
+        lookup = 'lt' if descending else 'gt'
+        after_id = Q(**{f'id__{lookup}': position['id']})
+        is_null = Q(**{f'{self.field}__isnull': True})
+        if position['v'] is None:
+            # Дальше — NULL с большим id, при обратном проходе
+            # за ними еще все строки со значением
+            if self.reverse:
+                return is_null & after_id | ~is_null
+            return is_null & after_id
+        condition = (Q(**{f'{self.field}__{lookup}': position['v']})
+                     | Q(**{self.field: position['v']}) & after_id)
+        if self.nullable and not self.reverse:
+            condition |= is_null
+        return condition
+
+    def get_position_value(self, instance):
+        value = instance
+        for attr in self.field.split('__'):
+            try:
+                value = getattr(value, attr)
+            except ObjectDoesNotExist:
+                # Нет связанной строки (товар без цены)
+                return None
+        return value
+
+    def build_cursor_link(self, instance, reverse):
+        position = {'v': self.get_position_value(instance),
+                    'id': instance.pk, 'r': reverse}
+        cursor = urlsafe_b64encode(
+            json.dumps(position, default=self.encode_value).encode()
+        ).decode()
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.offset_query_param)
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    @staticmethod
+    def encode_value(value):
+        '''Дата сохраняется с микросекундами: DjangoJSONEncoder
+        обрезает их до миллисекунд, и строки с одинаковой датой
+        пропадали бы со страницы'''
+
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        raise TypeError(f'{type(value).__name__} нельзя сохранить в курсор')
+
+    def get_ordering_path(self, queryset):
+        '''Связи и поле модели первого ключа сортировки
+        (или поле аннотации)'''
+
+        model = queryset.model
+        path = []
+        try:
+            for name in self.field.split('__'):
+                path.append(model._meta.get_field(name))
+                model = path[-1].related_model
+        except FieldDoesNotExist:
+            return [queryset.query.annotations[self.field].output_field]
+        return path
+
+    def decode_cursor(self, cursor, queryset):
+        '''Пустой курсор означает первую страницу. Значения курсора
+        приводятся к типам полей сортировки и id: подделанный курсор
+        дает 404, а не ошибку в запросе к БД'''
+
+        if not cursor:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(cursor.encode()))
+            if (not isinstance(position, dict)
+                    or set(position) != {'v', 'id', 'r'}
+                    or not isinstance(position['r'], bool)):
+                raise ValueError
+            position['v'] = self.ordering_field.to_python(position['v'])
+            position['id'] = queryset.model._meta.pk.to_python(
+                position['id'])
+            if (position['v'] is None and not self.nullable
+                    or position['id'] is None):
+                raise ValueError
+        except (binascii.Error, UnicodeDecodeError, ValueError, TypeError,
+                ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return position
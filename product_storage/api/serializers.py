@@ -1,9 +1,26 @@
+from collections import Counter, defaultdict
+
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 
+from product_storage.constants import (BARCODE_LOOKUP_MAX_COUNT,
+                                       BASE_PRICE_MAX_DIGITS,
+                                       CHANGE_FEED_MAX_PAGE_SIZE,
+                                       CHANGE_FEED_MAX_WAIT,
+                                       CHANGE_FEED_PAGE_SIZE,
+                                       CHANGE_FEED_SYNC_MAX_WAIT,
+                                       PRICE_DECIMAL_PLACES, PRICE_MAX_DIGITS,
+                                       PRODUCT_AMOUNT_MAX)
 from products.models import Product, ProductPrice, ProductType
 from products.validators import barcode_regex_validator
 
+# Поле для вывода цены, пересчитанной по ?target_currency=
+CONVERTED_PRICE_FIELD = serializers.DecimalField(
+    max_digits=BASE_PRICE_MAX_DIGITS, decimal_places=PRICE_DECIMAL_PLACES)
+
 
 class ProductPriceSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,7 +28,20 @@ class ProductPriceSerializer(serializers.ModelSerializer):
         fields = ('id', 'currency', 'price')
 
 
-class ProductCreateReadSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    '''Оставляет только поля, перечисленные в context['fields']'''
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.context.get('fields')
+        if not requested:
+            return fields
+        return {name: field for name, field in fields.items()
+                if name in requested}
+
+
+class ProductCreateReadSerializer(SparseFieldsMixin,
+                                  serializers.ModelSerializer):
     price = ProductPriceSerializer()
 
     class Meta:
@@ -26,6 +56,20 @@ class ProductCreateReadSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(e)
         return barcode
 
+    def to_representation(self, instance):
+        '''С ?target_currency= добавляет цену, пересчитанную в эту
+        валюту: курс передает представление в контексте'''
+
+        data = super().to_representation(instance)
+        target_currency = self.context.get('target_currency')
+        if (target_currency and 'price' in data
+                and instance.price_base is not None):
+            data['converted_price'] = {
+                'currency': target_currency,
+                'price': CONVERTED_PRICE_FIELD.to_representation(
+                    instance.price_base / self.context['target_rate'])}
+        return data
+
     def create(self, validated_data):
         price_data = validated_data.pop('price')
         product = super().create(validated_data)
@@ -34,23 +78,92 @@ class ProductCreateReadSerializer(serializers.ModelSerializer):
         return product
 
 
+class ProductPriceColumnsSerializer(serializers.Serializer):
+    '''Цена из столбцов price_* товара в том же виде,
+    что и ProductPriceSerializer, без обращения к ProductPrice'''
+
+    id = serializers.IntegerField(source='price_pk')
+    currency = serializers.CharField(source='price_currency')
+    price = serializers.DecimalField(source='price_amount',
+                                     max_digits=PRICE_MAX_DIGITS,
+                                     decimal_places=PRICE_DECIMAL_PLACES)
+
+    def to_representation(self, product):
+        if product.price_pk is None:
+            return None
+        return super().to_representation(product)
+
+
+class ProductDenormalizedReadSerializer(ProductCreateReadSerializer):
+    price = ProductPriceColumnsSerializer(source='*', read_only=True)
+
+
+class ProductBulkItemSerializer(ProductCreateReadSerializer):
+    '''Тип принимается как id без запроса к БД: существование всех
+    типов проверяет ProductBulkCreateSerializer одним запросом'''
+
+    type = serializers.IntegerField(source='type_id')
+
+    class Meta(ProductCreateReadSerializer.Meta):
+        # Уникальность штрихкодов проверяется для всего списка сразу
+        extra_kwargs = {'barcode': {'validators': []}}
+
+
 class ProductBulkCreateSerializer(serializers.Serializer):
-    products = ProductCreateReadSerializer(many=True)
+    '''При upsert=true товары с существующим штрихкодом
+    обновляются (название, количество, тип и цена), а не дублируются'''
 
-    def create(self, validated_data):
-        validated_data = validated_data.get('products')
-        prices_data = [data.pop('price') for data in validated_data]
-        product_list = [Product(**el_dict) for el_dict in validated_data]
-        products = Product.objects.bulk_create(product_list,
-                                               unique_fields=('barcode',))
-        prices = [ProductPrice(**price_data, product=product)
-                  for price_data, product in zip(prices_data, products)]
-        ProductPrice.objects.bulk_create(prices)
+    products = ProductBulkItemSerializer(many=True)
+    upsert = serializers.BooleanField(default=False)
+
+    default_error_messages = {
+        'type_not_found': 'Тип товара с id={type_id} не существует',
+        'duplicate_barcode': 'Штрихкод повторяется в списке товаров',
+        'barcode_exists': 'Товар с таким штрихкодом уже существует'}
+
+    def validate_products(self, products):
+        type_ids = {product['type_id'] for product in products}
+        existing_type_ids = set(ProductType.objects.filter(
+            pk__in=type_ids).values_list('pk', flat=True))
+        barcodes_count = Counter(product['barcode'] for product in products)
+        errors = []
+        for product in products:
+            product_errors = {}
+            if product['type_id'] not in existing_type_ids:
+                product_errors['type'] = [
+                    self.error_messages['type_not_found'].format(
+                        type_id=product['type_id'])]
+            if barcodes_count[product['barcode']] > 1:
+                product_errors['barcode'] = [
+                    self.error_messages['duplicate_barcode']]
+            errors.append(product_errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
         return products
 
+    def validate(self, attrs):
+        if attrs.get('upsert'):
+            return attrs
+        products = attrs.get('products')
+        existing_barcodes = set(Product.objects.filter(
+            barcode__in=[product['barcode'] for product in products]
+        ).values_list('barcode', flat=True))
+        if existing_barcodes:
+            raise serializers.ValidationError({'products': [
+                {'barcode': [self.error_messages['barcode_exists']]}
+                if product['barcode'] in existing_barcodes else {}
+                for product in products]})
+        return attrs
+
+    def create(self, validated_data):
+        return Product.objects.bulk_create_with_prices(
+            [(product_data, product_data.pop('price'))
+             for product_data in validated_data.get('products')],
+            upsert=validated_data.get('upsert'))
+
     def to_representation(self, instances):
-        return {'products': [ProductCreateReadSerializer(instance).data
-                             for instance in instances]}
+        return {'products': ProductCreateReadSerializer(
+            instances, many=True).data}
 
 
 class ProductUpdateSerializer(ProductCreateReadSerializer):
@@ -61,32 +174,342 @@ class ProductUpdateSerializer(ProductCreateReadSerializer):
         extra_kwargs = {'amount': {'read_only': True}}
 
     def update(self, instance, validated_data):
-        price_data = validated_data.pop('price')
-        ProductPriceSerializer().update(instance.price, price_data)
-        return super().update(instance, validated_data)
+        '''С expected_date_updated в контексте (If-Match) товар
+        меняется, только если не изменился после чтения клиентом'''
+
+        price_data = validated_data.pop('price', None)
+        with transaction.atomic():
+            for name, value in validated_data.items():
+                setattr(instance, name, value)
+            instance.save(expected_date_updated=self.context.get(
+                'expected_date_updated'))
+            if price_data:
+                ProductPriceSerializer().update(instance.price, price_data)
+        return instance
 
 
 class ProductUpdateAmountSerializer(serializers.Serializer):
-    amount_delta = serializers.IntegerField()
+    '''Изменение применяется в БД условным UPDATE, поэтому
+    параллельные запросы не теряют изменения друг друга'''
+
+    amount_delta = serializers.IntegerField(min_value=-PRODUCT_AMOUNT_MAX,
+                                            max_value=PRODUCT_AMOUNT_MAX)
+
+    default_error_messages = {
+        'negative_amount':
+            'Количество товара на складе не может стать отрицательным',
+        'amount_overflow':
+            'Количество товара на складе не может превысить '
+            f'{PRODUCT_AMOUNT_MAX}'}
+
+    def update(self, instance, validated_data):
+        amount_delta = validated_data.get('amount_delta')
+        with transaction.atomic():
+            if not Product.objects.change_amount(
+                    instance.pk, amount_delta,
+                    self.context.get('expected_date_updated')):
+                # Уменьшение упирается только в ноль, увеличение —
+                # только в верхнюю границу столбца
+                code = ('amount_overflow' if amount_delta > 0
+                        else 'negative_amount')
+                raise serializers.ValidationError(
+                    {api_settings.NON_FIELD_ERRORS_KEY: [
+                        self.error_messages[code]]}, code=code)
+            # Строка заблокирована нашим UPDATE до конца транзакции,
+            # поэтому перечитываем именно записанное значение
+            instance.refresh_from_db(fields=('amount', 'date_updated'))
+        return instance
+
+    def to_representation(self, instance):
+        return ProductCreateReadSerializer(instance).data
+
+
+class ProductAmountDeltaSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False)
+    barcode = serializers.CharField(required=False)
+    amount_delta = serializers.IntegerField(min_value=-PRODUCT_AMOUNT_MAX,
+                                            max_value=PRODUCT_AMOUNT_MAX)
 
     def validate(self, attrs):
-        instance = getattr(self, 'instance', None)
-        amount_delta = attrs.get('amount_delta')
-        if instance and instance.amount + amount_delta < 0:
+        if ('id' in attrs) == ('barcode' in attrs):
             raise serializers.ValidationError(
-                'Количество товара на складе не может стать отрицательным')
+                'Нужно указать либо id, либо barcode товара')
         return attrs
 
-    def update(self, instance, validated_data):
-        instance.amount += validated_data.get('amount_delta')
-        instance.save()
+
+class ProductBulkUpdateAmountSerializer(serializers.Serializer):
+    '''Пакетное изменение количества: все изменения применяются
+    в одной транзакции, либо не применяется ни одно'''
+
+    items = ProductAmountDeltaSerializer(many=True, allow_empty=False)
+
+    default_error_messages = {
+        'not_found': 'Товар не найден',
+        'negative_amount':
+            'Количество товара на складе не может стать отрицательным',
+        'amount_overflow':
+            'Количество товара на складе не может превысить '
+            f'{PRODUCT_AMOUNT_MAX}'}
+
+    def validate_items(self, items):
+        '''Находит товары всех позиций одним запросом
+        и сохраняет их id в каждой позиции'''
+
+        ids = {item['id'] for item in items if 'id' in item}
+        barcodes = {item['barcode'] for item in items if 'barcode' in item}
+        found = Product.objects.filter(
+            Q(pk__in=ids) | Q(barcode__in=barcodes)).values_list(
+            'pk', 'barcode')
+        found_ids = {pk for pk, _ in found}
+        ids_by_barcode = {barcode: pk for pk, barcode in found}
+        errors = []
+        for item in items:
+            if 'barcode' in item:
+                item['id'] = ids_by_barcode.get(item['barcode'])
+            elif item['id'] not in found_ids:
+                item['id'] = None
+            errors.append({} if item['id'] else {
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    self.error_messages['not_found']]})
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return items
+
+    def create(self, validated_data):
+        items = validated_data.get('items')
+        amount_deltas = defaultdict(int)
+        for item in items:
+            amount_deltas[item['id']] += item['amount_delta']
+        with transaction.atomic():
+            if Product.objects.change_amounts(amount_deltas) == len(
+                    amount_deltas):
+                products = {product['id']: product for product in
+                            Product.objects.filter(pk__in=amount_deltas)
+                            .values('id', 'barcode', 'amount')}
+                return {'items': [products[item['id']] for item in items]}
+            transaction.set_rollback(True)
+
+        # Изменения откачены: по актуальным остаткам показываем,
+        # какие позиции увели бы количество в минус или за границу
+        # столбца (изменения одного товара суммируются)
+        amounts = dict(Product.objects.filter(
+            pk__in=amount_deltas).values_list('pk', 'amount'))
+        errors = []
+        for item in items:
+            new_amount = amounts[item['id']] + amount_deltas[item['id']]
+            if new_amount < 0:
+                code = 'negative_amount'
+            elif new_amount > PRODUCT_AMOUNT_MAX:
+                code = 'amount_overflow'
+            else:
+                errors.append({})
+                continue
+            errors.append({api_settings.NON_FIELD_ERRORS_KEY: [
+                self.error_messages[code]]})
+        raise serializers.ValidationError({'items': errors})
+
+    def to_representation(self, instance):
         return instance
 
+
+class ProductBulkPatchItemSerializer(ProductBulkItemSerializer):
+    '''Позиция массового изменения: id товара и только
+    изменяемые поля, у каждой позиции свой набор'''
+
+    id = serializers.IntegerField()
+    price = ProductPriceSerializer(required=False)
+
+    class Meta(ProductBulkItemSerializer.Meta):
+        extra_kwargs = {'barcode': {'validators': []},
+                        'amount': {'read_only': True}}
+
+    def validate(self, attrs):
+        # С partial=True обязательные поля не проверяются
+        if 'id' not in attrs:
+            raise serializers.ValidationError(
+                {'id': [self.fields['id'].error_messages['required']]})
+        return attrs
+
+
+class ProductBulkPatchSerializer(serializers.Serializer):
+    '''Массовое частичное изменение товаров: все изменения
+    применяются пачками bulk_update в одной транзакции,
+    либо не применяется ни одно. Используется с partial=True'''
+
+    products = ProductBulkPatchItemSerializer(many=True, allow_empty=False)
+
+    default_error_messages = {
+        'not_found': 'Товар не найден',
+        'duplicate_id': 'Товар повторяется в списке',
+        'type_not_found': 'Тип товара с id={type_id} не существует',
+        'duplicate_barcode': 'Штрихкод повторяется в списке товаров',
+        'barcode_exists': 'Товар с таким штрихкодом уже существует',
+        'price_required': 'У товара нет цены: укажите price.price'}
+
+    def validate_products(self, products):
+        '''Товары, типы и занятые штрихкоды всех позиций
+        проверяются тремя запросами'''
+
+        ids_count = Counter(product['id'] for product in products)
+        barcodes_count = Counter(product['barcode'] for product in products
+                                 if 'barcode' in product)
+        self.existing_ids = set(Product.objects.filter(
+            pk__in=ids_count).values_list('pk', flat=True))
+        self.existing_type_ids = set(ProductType.objects.filter(
+            pk__in={product['type_id'] for product in products
+                    if 'type_id' in product}).values_list('pk', flat=True))
+        self.barcode_owners = dict(Product.objects.filter(
+            barcode__in=barcodes_count).values_list('barcode', 'pk'))
+        errors = [self.get_product_errors(product, ids_count, barcodes_count)
+                  for product in products]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return products
+
+    def get_product_errors(self, product, ids_count, barcodes_count):
+        errors = {}
+        if product['id'] not in self.existing_ids:
+            errors['id'] = [self.error_messages['not_found']]
+        elif ids_count[product['id']] > 1:
+            errors['id'] = [self.error_messages['duplicate_id']]
+        if ('type_id' in product
+                and product['type_id'] not in self.existing_type_ids):
+            errors['type'] = [self.error_messages['type_not_found'].format(
+                type_id=product['type_id'])]
+        barcode = product.get('barcode')
+        if barcode is None:
+            return errors
+        if barcodes_count[barcode] > 1:
+            errors['barcode'] = [self.error_messages['duplicate_barcode']]
+        # Штрихкод может оставаться у того же товара
+        elif self.barcode_owners.get(barcode, product['id']) != product['id']:
+            errors['barcode'] = [self.error_messages['barcode_exists']]
+        return errors
+
+    def create(self, validated_data):
+        items = validated_data.get('products')
+        fields = {name for item in items for name in item
+                  if name not in ('id', 'price')}
+        with transaction.atomic():
+            products = Product.objects.select_related(
+                'price').select_for_update().in_bulk(
+                [item['id'] for item in items])
+            prices, new_prices, price_fields = [], [], set()
+            for item in items:
+                product = products[item['id']]
+                price_data = item.get('price')
+                for name, value in item.items():
+                    if name not in ('id', 'price'):
+                        setattr(product, name, value)
+                if not price_data:
+                    continue
+                if hasattr(product, 'price'):
+                    for name, value in price_data.items():
+                        setattr(product.price, name, value)
+                    prices.append(product.price)
+                    price_fields.update(price_data)
+                elif 'price' in price_data:
+                    new_prices.append(ProductPrice(product=product,
+                                                   **price_data))
+                else:
+                    raise serializers.ValidationError({'products': [
+                        {'price': [self.error_messages['price_required']]}
+                        if other is item else {} for other in items]})
+            if prices:
+                ProductPrice.objects.bulk_update(prices, price_fields)
+            ProductPrice.objects.bulk_create(new_prices)
+            updated = Product.objects.bulk_update(products.values(), fields)
+        return {'updated': updated}
+
     def to_representation(self, instance):
-        return ProductCreateReadSerializer(instance).data
+        return instance
+
+
+class ProductBarcodeLookupSerializer(serializers.Serializer):
+    barcodes = serializers.ListField(
+        child=serializers.CharField(validators=(barcode_regex_validator,)),
+        allow_empty=False, max_length=BARCODE_LOOKUP_MAX_COUNT)
+
+    def validate_barcodes(self, barcodes):
+        '''Повторы убираются с сохранением порядка'''
+
+        return list(dict.fromkeys(barcodes))
+
+
+class ProductStockSerializer(serializers.Serializer):
+    '''Количество товара на момент at (по умолчанию — текущий)'''
+
+    id = serializers.IntegerField(read_only=True)
+    at = serializers.DateTimeField(required=False)
+    amount = serializers.IntegerField(read_only=True)
+
+
+class ChangeFeedQuerySerializer(serializers.Serializer):
+    '''Параметры ленты изменений: токен since из next предыдущего
+    ответа, размер страницы и время ожидания long-poll в секундах'''
+
+    since = serializers.IntegerField(min_value=0, default=0)
+    limit = serializers.IntegerField(min_value=1,
+                                     max_value=CHANGE_FEED_MAX_PAGE_SIZE,
+                                     default=CHANGE_FEED_PAGE_SIZE)
+    wait = serializers.FloatField(min_value=0,
+                                  max_value=CHANGE_FEED_SYNC_MAX_WAIT,
+                                  default=0)
+
+
+class AsyncChangeFeedQuerySerializer(ChangeFeedQuerySerializer):
+    '''Параметры асинхронной ленты: ожидание не занимает поток,
+    поэтому допускается дольше'''
+
+    wait = serializers.FloatField(min_value=0,
+                                  max_value=CHANGE_FEED_MAX_WAIT, default=0)
 
 
 class ProductTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductType
         fields = ('id', 'name', 'description')
+
+
+class ProductTypeStatsSerializer(serializers.ModelSerializer):
+    '''Сводка по типу из агрегатов ProductTypeStats: итоги по всем
+    товарам и цены в разрезе валют (группа без цены в prices не входит)'''
+
+    type = serializers.IntegerField(source='id')
+    product_count = serializers.SerializerMethodField()
+    active_count = serializers.SerializerMethodField()
+    amount_total = serializers.SerializerMethodField()
+    prices = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductType
+        fields = ('type', 'name', 'product_count', 'active_count',
+                  'amount_total', 'prices')
+
+    def get_groups(self, product_type):
+        return [group for group in product_type.stats.all()
+                if group.product_count]
+
+    def get_product_count(self, product_type):
+        return sum(group.product_count
+                   for group in self.get_groups(product_type))
+
+    def get_active_count(self, product_type):
+        return sum(group.active_count
+                   for group in self.get_groups(product_type))
+
+    def get_amount_total(self, product_type):
+        return sum(group.amount_total
+                   for group in self.get_groups(product_type))
+
+    def get_prices(self, product_type):
+        price = serializers.DecimalField(
+            max_digits=PRICE_MAX_DIGITS, decimal_places=PRICE_DECIMAL_PLACES)
+        return [{'currency': group.currency,
+                 'product_count': group.product_count,
+                 'min': price.to_representation(group.price_min),
+                 'max': price.to_representation(group.price_max),
+                 'avg': price.to_representation(group.price_avg)}
+                for group in sorted(self.get_groups(product_type),
+                                    key=lambda group: group.currency)
+                if group.currency]
@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import ExchangeRate, Product, ProductPrice
+from products.signals import products_changed
+from . import cache
+
+
+def invalidate_on_commit(pks):
+    '''Сбрасываем кэш после коммита: до него другие запросы
+    еще читают старые данные и могли бы снова закэшировать их'''
+
+    transaction.on_commit(lambda: cache.invalidate(pks))
+
+
+@receiver((post_save, post_delete), sender=Product)
+def invalidate_product(sender, instance, **kwargs):
+    invalidate_on_commit([instance.pk])
+
+
+@receiver((post_save, post_delete), sender=ProductPrice)
+def invalidate_product_price(sender, instance, **kwargs):
+    invalidate_on_commit([instance.product_id])
+
+
+@receiver((post_save, post_delete), sender=ExchangeRate)
+def invalidate_product_lists(sender, instance, **kwargs):
+    '''Курс меняет списки с ?target_currency=, детальные ответы
+    с этим параметром не кэшируются'''
+
+    invalidate_on_commit([])
+
+
+@receiver(products_changed)
+def invalidate_changed_products(sender, pks, **kwargs):
+    invalidate_on_commit(pks)
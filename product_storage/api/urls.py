@@ -1,6 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import SimpleRouter
 
+from . import async_views
+from .metrics import metrics_view
 from .views import ProductTypeViewSet, ProductViewSet
 
 router_v1 = SimpleRouter()
@@ -13,7 +15,28 @@ router_v1.register('product-types', ProductTypeViewSet,
 
 auth_urls = [path('auth/', include('djoser.urls.jwt'))]
 
+# Асинхронные представления чтения для запуска под ASGI
+async_urls = [
+    path('async/products/', async_views.product_list,
+         name='async-product-list'),
+    path('async/products/<int:pk>/', async_views.product_detail,
+         name='async-product-detail'),
+    path('async/products/changes/', async_views.product_changes,
+         name='async-product-changes'),
+    path('async/products/by-barcode/<str:barcode>/',
+         async_views.product_by_barcode, name='async-product-by-barcode'),
+    path('async/product-types/', async_views.product_type_list,
+         name='async-product-type-list'),
+    path('async/product-types/<int:pk>/', async_views.product_type_detail,
+         name='async-product-type-detail'),
+]
+
+
+# Метрики для Prometheus (API_METRICS=true)
+metrics_urls = [path('metrics/', metrics_view, name='metrics')]
+
 
 urlpatterns = [
-    path('v1/', include(router_v1.urls + auth_urls))
+    path('v1/', include(router_v1.urls + auth_urls + async_urls
+                        + metrics_urls))
 ]
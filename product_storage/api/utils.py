@@ -0,0 +1,48 @@
+from django.conf import settings
+from django.db import models
+
+from products.models import DENORMALIZED_PRICE_FIELDS, Product
+
+
+def normalized_query(request):
+    '''Адрес запроса с отсортированными параметрами: одинаковые
+    по смыслу запросы дают одну строку независимо от порядка параметров'''
+
+    params = sorted((key, sorted(values))
+                    for key, values in request.query_params.lists())
+    return f'{request.build_absolute_uri(request.path)}{params}'
+
+
+def price_field(name):
+    '''Путь к полю цены для запросов к товарам: столбец самого товара
+    при PRODUCT_DENORMALIZED_PRICE, иначе поле связанной ProductPrice'''
+
+    if settings.PRODUCT_DENORMALIZED_PRICE:
+        return DENORMALIZED_PRICE_FIELDS[name]
+    return f'price__{name}'
+
+
+def product_queryset(query_params):
+    '''Товары для чтения через API. Даем возможность обращаться к цене
+    через price вместо price__price. При сортировке по цене товары
+    без цены идут в конце в обоих направлениях. С
+    PRODUCT_DENORMALIZED_PRICE цена читается из столбцов товара:
+    JOIN не нужен, и строки читаются в порядке индекса цен, а через
+    LEFT JOIN СУБД сортирует всю выборку'''
+
+    if settings.PRODUCT_DENORMALIZED_PRICE:
+        queryset = Product.objects.all()
+    else:
+        queryset = Product.objects.select_related('price', 'type')
+    ordering = query_params.get('ordering')
+    if ordering:
+        price = ('price_base' if query_params.get('target_currency')
+                 else price_field('price'))
+        if ordering.lstrip('-') == 'price':
+            price = models.F(price)
+            queryset = queryset.order_by(
+                price.desc(nulls_last=True) if ordering.startswith('-')
+                else price.asc(nulls_last=True))
+        else:
+            queryset = queryset.order_by(ordering.replace('price', price))
+    return queryset
@@ -1,42 +1,187 @@
 from http import HTTPStatus
 
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
 from rest_framework import filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from products.models import Product, ProductType
+from products.models import (ExchangeRate, Product, ProductModified,
+                             ProductType, StockMovement, StockSnapshot)
+from products.validators import barcode_regex_validator
+from . import cache
+from .changes import load_changes, wait_for_changes
+from .etags import (PreconditionFailed, list_etag, product_etag,
+                    product_versions)
+from .exporters import export_rows
 from .filters import ProductFilter
-from .mixins import CRUDWithoutPUT
-from .serializers import (ProductBulkCreateSerializer,
-                          ProductCreateReadSerializer, ProductTypeSerializer,
+from .mappers import get_row_mapper
+from .mixins import (CachedListRetrieveMixin, ConditionalGetMixin,
+                     CRUDWithoutPUT, ValuesListMixin)
+from .pagination import ProductPagination, ProductTypePagination
+from .renderers import ColumnarJSONRenderer, CSVRenderer, NDJSONRenderer
+from .serializers import (ChangeFeedQuerySerializer,
+                          ProductBarcodeLookupSerializer,
+                          ProductBulkCreateSerializer,
+                          ProductBulkPatchSerializer,
+                          ProductBulkUpdateAmountSerializer,
+                          ProductCreateReadSerializer,
+                          ProductDenormalizedReadSerializer,
+                          ProductStockSerializer, ProductTypeSerializer,
+                          ProductTypeStatsSerializer,
                           ProductUpdateAmountSerializer,
                           ProductUpdateSerializer)
+from .utils import normalized_query, product_queryset
 
 
-class ProductViewSet(CRUDWithoutPUT):
+class ProductViewSet(ConditionalGetMixin, CachedListRetrieveMixin,
+                     ValuesListMixin, CRUDWithoutPUT):
     filter_backends = (DjangoFilterBackend, filters.OrderingFilter)
     filterset_class = ProductFilter
+    pagination_class = ProductPagination
+    renderer_classes = (*api_settings.DEFAULT_RENDERER_CLASSES,
+                        ColumnarJSONRenderer)
     ordering_fields = ('name', 'date_updated', 'price__price')
 
     def get_queryset(self):
-        '''Даем возможность обращаться к цене через
-        price вместо price__price'''
-
-        queryset = Product.objects.select_related('price', 'type')
-        ordering = self.request.query_params.get('ordering')
-        if ordering:
-            ordering = ordering.replace('price', 'price__price')
-            queryset = queryset.order_by(ordering)
+        '''С ?fields= читаются только столбцы запрошенных полей,
+        а JOIN с ценой остается, только если запрошена цена'''
+
+        queryset = product_queryset(self.request.query_params)
+        fields = self.get_requested_fields()
+        if fields:
+            lookups = get_row_mapper(self.get_serializer_class(),
+                                     fields).lookups
+            if self.request.query_params.get('target_currency'):
+                lookups = [*lookups, 'price_base']
+            queryset = queryset.select_related(None).only(*lookups)
+            if any(lookup.startswith('price__') for lookup in lookups):
+                queryset = queryset.select_related('price')
         return queryset
 
+    def get_requested_fields(self):
+        '''Поля из ?fields=id,name,... в порядке сериализатора.
+        None, если параметр не задан или действие его не поддерживает'''
+
+        value = self.request.query_params.get('fields')
+        if not value or self.action not in ('list', 'retrieve'):
+            return None
+        requested = {name.strip() for name in value.split(',')
+                     if name.strip()}
+        available = self.get_serializer_class().Meta.fields
+        unknown = requested - set(available)
+        if unknown:
+            raise ValidationError({'fields': [
+                f'Неизвестные поля: {", ".join(sorted(unknown))}']})
+        return tuple(name for name in available if name in requested)
+
+    def get_list_version(self, request):
+        '''Версия списка по MAX(date_updated) и COUNT под фильтром:
+        один агрегирующий запрос без чтения и сериализации строк,
+        кэшируемый до изменения товаров. С target_currency учитывается
+        и дата последнего изменения курса'''
+
+        queryset = self.filter_queryset(self.get_queryset())
+        key = cache.queryset_key('products:list-version', queryset)
+        if key is None:
+            return None
+        version = cache.read_or_compute(key, lambda: queryset.order_by(
+        ).aggregate(last_modified=Max('date_updated'), count=Count('id')))
+        if version['last_modified'] is None:
+            return None
+        if request.query_params.get('target_currency'):
+            rates_updated = ExchangeRate.objects.aggregate(
+                last_modified=Max('date_updated'))['last_modified']
+            if rates_updated:
+                version['last_modified'] = max(version['last_modified'],
+                                               rates_updated)
+        return (list_etag(version['last_modified'], version['count'],
+                          normalized_query(request),
+                          request.accepted_renderer.format),
+                version['last_modified'])
+
+    def get_detail_version(self, request, pk):
+        if (request.query_params.get('target_currency')
+                or request.query_params.get('fields')):
+            # Ответ зависит и от курса валюты или набора полей
+            return None
+        try:
+            date_updated = Product.objects.filter(pk=pk).values_list(
+                'date_updated', flat=True).first()
+        except (TypeError, ValueError):
+            return None
+        if date_updated is None:
+            return None
+        return (product_etag(int(pk), date_updated,
+                             request.accepted_renderer.format),
+                date_updated)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_requested_fields()
+        target_currency = self.request.query_params.get('target_currency')
+        if self.action in ('list', 'retrieve') and target_currency:
+            # Валюту и наличие курса уже проверил ProductFilter
+            context.update(
+                target_currency=target_currency,
+                target_rate=ExchangeRate.objects.get_rate(target_currency))
+        if_match = self.request.headers.get('If-Match')
+        if self.action in ('partial_update', 'update_amount') and if_match:
+            context['expected_date_updated'] = product_versions(
+                if_match, int(self.kwargs['pk']))
+        return context
+
+    def get_row_mapper(self):
+        '''Список читается через values_list, кроме пересчета цены
+        в target_currency и keyset-пагинации: им нужны экземпляры'''
+
+        query_params = self.request.query_params
+        if (not settings.PRODUCT_VALUES_LIST_READ
+                or query_params.get('target_currency')
+                or self.paginator.cursor_query_param in query_params):
+            return None
+        return get_row_mapper(self.get_serializer_class(),
+                              self.get_requested_fields())
+
     def get_serializer_class(self):
         match self.action:
             case 'partial_update':
                 return ProductUpdateSerializer
+            case ('list' | 'retrieve' | 'by_barcode' | 'by_barcodes'
+                  | 'changes') if settings.PRODUCT_DENORMALIZED_PRICE:
+                return ProductDenormalizedReadSerializer
             case _:
                 return ProductCreateReadSerializer
 
+    def partial_update(self, request, *args, **kwargs):
+        '''С If-Match: <ETag товара> изменение применяется, только
+        если товар не менялся после чтения, иначе 412'''
+
+        serializer = self.get_serializer(self.get_object(),
+                                         data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        return self.save_product(serializer)
+
+    def save_product(self, serializer):
+        '''Сохраняет товар и отдает его с новым ETag,
+        по которому клиент может изменить товар еще раз'''
+
+        try:
+            serializer.save()
+        except ProductModified:
+            raise PreconditionFailed
+        product = serializer.instance
+        return Response(data=serializer.data, status=HTTPStatus.OK, headers={
+            'ETag': product_etag(product.pk, product.date_updated,
+                                 self.request.accepted_renderer.format)})
+
     @action(detail=False, methods=('POST',), url_path='bulk-create')
     def bulk_create(self, request):
         '''Метод для множественного добавления товаров в одном запросе'''
@@ -46,22 +191,195 @@ class ProductViewSet(CRUDWithoutPUT):
         serializer.save()
         return Response(data=serializer.data, status=HTTPStatus.CREATED)
 
+    @action(detail=False, methods=('POST',), url_path='bulk-update-amount')
+    def bulk_update_amount(self, request):
+        '''Метод для относительного изменения количества многих товаров
+        в одной транзакции (все изменения или ни одного)'''
+
+        serializer = ProductBulkUpdateAmountSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(data=serializer.data, status=HTTPStatus.OK)
+
+    @action(detail=False, methods=('PATCH',), url_path='bulk-update')
+    def bulk_partial_update(self, request):
+        '''Метод для частичного изменения многих товаров в одной
+        транзакции: у каждой позиции id и свой набор полей'''
+
+        serializer = ProductBulkPatchSerializer(data=request.data,
+                                                partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(data=serializer.data, status=HTTPStatus.OK)
+
+    @action(detail=False, methods=('POST',), url_path='bulk-deactivate')
+    def bulk_deactivate(self, request):
+        '''Снимает с продажи все товары, выбранные фильтрами списка'''
+
+        deactivated = self.get_selected_products().deactivate()
+        return Response(data={'deactivated': deactivated},
+                        status=HTTPStatus.OK)
+
+    @action(detail=False, methods=('DELETE',), url_path='bulk-delete')
+    def bulk_delete(self, request):
+        '''Удаляет все товары, выбранные фильтрами списка'''
+
+        deleted = self.get_selected_products().bulk_delete()
+        return Response(data={'deleted': deleted}, status=HTTPStatus.OK)
+
+    def get_selected_products(self):
+        '''Товары по фильтрам ProductFilter из строки запроса.
+        Без непустого фильтра массовое действие не выполняется, чтобы
+        случайный запрос (в том числе ?name= или ?search=%20) не
+        затронул весь каталог. target_currency товары не выбирает'''
+
+        filterset = ProductFilter(self.request.query_params,
+                                  queryset=Product.objects.all(),
+                                  request=self.request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        if not any(value not in (None, '')
+                   for name, value in filterset.form.cleaned_data.items()
+                   if name != 'target_currency'):
+            raise ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Укажите хотя бы один фильтр товаров']})
+        return filterset.qs
+
+    @action(detail=False, methods=('GET',),
+            renderer_classes=(NDJSONRenderer, CSVRenderer))
+    def export(self, request):
+        '''Потоковая выгрузка всех товаров с учетом фильтров и сортировки
+        (?format=ndjson по умолчанию или ?format=csv)'''
+
+        queryset = self.filter_queryset(self.get_queryset())
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(export_rows(queryset)),
+            content_type=renderer.media_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="products.{renderer.format}"')
+        return response
+
+    @action(detail=False, methods=('GET',),
+            url_path=r'by-barcode/(?P<barcode>[^/]+)')
+    def by_barcode(self, request, barcode):
+        '''Товар по штрихкоду из кэша процесса. Штрихкод проверяется
+        до обращения к кэшу и БД'''
+
+        try:
+            barcode_regex_validator(barcode)
+        except DjangoValidationError as e:
+            raise ValidationError({'barcode': e.messages})
+        found, hits = cache.get_by_barcodes((barcode,),
+                                            self.load_by_barcodes)
+        if barcode not in found:
+            raise NotFound('Товар с таким штрихкодом не найден')
+        return Response(data=found[barcode], status=HTTPStatus.OK,
+                        headers={'X-Cache': 'HIT' if hits else 'MISS'})
+
+    @action(detail=False, methods=('POST',), url_path='by-barcode')
+    def by_barcodes(self, request):
+        '''Товары по списку штрихкодов: не найденные в кэше читаются
+        одним запросом WHERE barcode IN (...)'''
+
+        serializer = ProductBarcodeLookupSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        barcodes = serializer.validated_data['barcodes']
+        found, _ = cache.get_by_barcodes(barcodes, self.load_by_barcodes)
+        data = {'results': [found[barcode] for barcode in barcodes
+                            if barcode in found],
+                'not_found': [barcode for barcode in barcodes
+                              if barcode not in found]}
+        return Response(data=data, status=HTTPStatus.OK)
+
+    def load_by_barcodes(self, barcodes):
+        products = self.get_queryset().filter(barcode__in=barcodes)
+        return {product.barcode: (product.pk,
+                                  self.get_serializer(product).data)
+                for product in products}
+
+    @action(detail=False, methods=('GET',))
+    def changes(self, request):
+        '''Лента изменений товаров и типов товаров после токена ?since=.
+        С ?wait=N ответ без изменений ждет их до N секунд (long-poll,
+        не больше CHANGE_FEED_SYNC_MAX_WAIT: ожидание занимает поток)'''
+
+        serializer = ChangeFeedQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        if params['wait']:
+            wait_for_changes(params['since'], params['wait'])
+        return Response(data=load_changes(params['since'], params['limit'],
+                                          self.get_serializer_class()),
+                        status=HTTPStatus.OK)
+
+    @action(detail=False, methods=('GET',), url_path='cache-stats')
+    def cache_stats(self, request):
+        '''Счетчики попаданий и промахов кэша ответов'''
+
+        return Response(data=cache.get_stats(), status=HTTPStatus.OK)
+
     @action(detail=True, methods=('PATCH',), url_path='update-amount')
     def update_amount(self, request, pk):
         '''Метод для относительного изменения количества
-        товара (+50, -100 и т.д.)'''
+        товара (+50, -100 и т.д.). If-Match — как в PATCH товара'''
 
         instance = self.get_object()
-        serializer = ProductUpdateAmountSerializer(instance=instance,
-                                                   data=request.data)
+        serializer = ProductUpdateAmountSerializer(
+            instance=instance, data=request.data,
+            context=self.get_serializer_context())
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(data=serializer.data, status=HTTPStatus.OK)
+        return self.save_product(serializer)
+
+    @action(detail=True, methods=('GET',))
+    def stock(self, request, pk):
+        '''Количество товара на момент ?at= из журнала движений:
+        последний дневной снимок и движения после него. История
+        доступна и для удаленного товара'''
+
+        serializer = ProductStockSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        moment = serializer.validated_data.get('at', timezone.now())
+        if not pk.isdigit() or not any(
+                model.objects.filter(**{lookup: pk}).exists()
+                for model, lookup in ((Product, 'pk'),
+                                      (StockMovement, 'product_id'),
+                                      (StockSnapshot, 'product_id'))):
+            raise NotFound('Товар не найден')
+        data = {'id': int(pk), 'at': moment,
+                'amount': StockMovement.objects.amount_as_of(pk, moment)}
+        return Response(data=ProductStockSerializer(data).data,
+                        status=HTTPStatus.OK)
 
 
 class ProductTypeViewSet(CRUDWithoutPUT):
     queryset = ProductType.objects.all()
     serializer_class = ProductTypeSerializer
+    pagination_class = ProductTypePagination
+
+    def get_queryset(self):
+        if self.action in ('stats', 'stats_list'):
+            return ProductType.objects.prefetch_related('stats')
+        return super().get_queryset()
+
+    def get_serializer_class(self):
+        if self.action in ('stats', 'stats_list'):
+            return ProductTypeStatsSerializer
+        return super().get_serializer_class()
+
+    @action(detail=True, methods=('GET',))
+    def stats(self, request, pk):
+        '''Количество, остатки и цены товаров типа из агрегатов
+        ProductTypeStats: два запроса вне зависимости от числа товаров'''
+
+        serializer = self.get_serializer(self.get_object())
+        return Response(data=serializer.data, status=HTTPStatus.OK)
+
+    @action(detail=False, methods=('GET',), url_path='stats')
+    def stats_list(self, request):
+        '''Статистика всех типов постранично'''
+
+        return self.list(request)
 
 
 # class ProductPriceViewSet(CRUDWithoutPUT):
@@ -0,0 +1,130 @@
+'''Нагрузочный тест представлений чтения под ASGI: ProductViewSet
+против асинхронных представлений api/async_views.py.
+
+ASGI-приложение Django вызывается в том же процессе, без сети:
+каждый клиент — задача asyncio, которая отправляет запросы один
+за другим до конца замера. Кэш ответов отключен, чтобы оба
+варианта читали БД.
+
+    python -m benchmarks.bench_async_views --rows 10000 --clients 500
+'''
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from benchmarks.utils import benchmark_database, make_user, setup_django
+
+DUMMY_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+def get_endpoints(rows):
+    '''Пары (синхронный адрес, асинхронный адрес) и генератор запроса'''
+
+    def page():
+        return f'limit=10&offset={random.randrange(0, rows, 10)}'
+
+    def barcode():
+        return str(10 ** 12 + random.randrange(rows))
+
+    return {
+        'list': (lambda: ('/api/v1/products/', page()),
+                 lambda: ('/api/v1/async/products/', page())),
+        'detail': (lambda: (f'/api/v1/products/{random.randint(1, rows)}/',
+                            ''),
+                   lambda: (f'/api/v1/async/products/'
+                            f'{random.randint(1, rows)}/', '')),
+        'by-barcode': (lambda: (f'/api/v1/products/by-barcode/{barcode()}/',
+                                ''),
+                       lambda: (f'/api/v1/async/products/by-barcode/'
+                                f'{barcode()}/', '')),
+    }
+
+
+async def call(app, path, query_string, headers):
+    '''Один запрос к ASGI-приложению, возвращает статус ответа'''
+
+    scope = {'type': 'http', 'asgi': {'version': '3.0'},
+             'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+             'path': path, 'raw_path': path.encode(), 'root_path': '',
+             'query_string': query_string.encode(), 'headers': headers,
+             'server': ('testserver', 80), 'client': ('127.0.0.1', 0)}
+    request_sent = False
+    status = None
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'',
+                    'more_body': False}
+        # Клиент не отключается: Django отменит ожидание сам
+        await asyncio.Future()
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run_load(app, make_request, headers, clients, duration):
+    '''Запросы clients параллельных клиентов в течение duration секунд.
+    Возвращает (запросов в секунду, p50, p99 в секундах)'''
+
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def client():
+        while time.perf_counter() < deadline:
+            path, query_string = make_request()
+            start = time.perf_counter()
+            status = await call(app, path, query_string, headers)
+            latencies.append(time.perf_counter() - start)
+            assert status == 200, f'{path}?{query_string}: {status}'
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100)
+    return len(latencies) / elapsed, quantiles[49], quantiles[98]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10_000)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from benchmarks.bench_denormalized_price import fill_products
+    from django.core.asgi import get_asgi_application
+    from django.test.utils import override_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    with benchmark_database(), override_settings(CACHES=DUMMY_CACHE):
+        fill_products(args.rows)
+        token = AccessToken.for_user(make_user())
+        headers = [(b'host', b'testserver'),
+                   (b'authorization', f'Bearer {token}'.encode())]
+        app = get_asgi_application()
+        print(f'rows={args.rows}, clients={args.clients}, '
+              f'{args.duration:.0f} с на замер')
+        for name, (sync_request, async_request) in get_endpoints(
+                args.rows).items():
+            for kind, make_request in (('sync', sync_request),
+                                       ('async', async_request)):
+                rps, p50, p99 = asyncio.run(run_load(
+                    app, make_request, headers, args.clients,
+                    args.duration))
+                print(f'{name:12} {kind:6} {rps:8.0f} запр/с   '
+                      f'p50 {p50 * 1000:8.1f} мс   p99 {p99 * 1000:8.1f} мс')
+
+
+if __name__ == '__main__':
+    main()
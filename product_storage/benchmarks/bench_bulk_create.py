@@ -0,0 +1,57 @@
+'''Пропускная способность POST /products/bulk-create/.
+
+    python -m benchmarks.bench_bulk_create --items 10000 --batch-size 1000
+'''
+import argparse
+
+from benchmarks.utils import benchmark_database, make_user, setup_django, timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=10_000)
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from products.models import Product, ProductType
+
+    if args.batch_size:
+        settings.BULK_CREATE_BATCH_SIZE = args.batch_size
+
+    with benchmark_database():
+        client = APIClient()
+        client.force_authenticate(make_user())
+        product_type = ProductType.objects.create(name='Бенчмарк',
+                                                  description='')
+        data = {'products': [
+            {'name': f'Товар {idx}', 'amount': idx % 1000,
+             'barcode': str(10 ** 12 + idx),
+             'price': {'price': '100.00', 'currency': 'rub'},
+             'type': product_type.id} for idx in range(args.items)]}
+        url = reverse('product-bulk-create')
+
+        print(f'items={args.items} '
+              f'batch_size={settings.BULK_CREATE_BATCH_SIZE}')
+        for attempt in range(1, args.repeat + 1):
+            Product.objects.all().delete()
+            results = {}
+            with CaptureQueriesContext(connection) as queries:
+                with timer(results, 'request'):
+                    response = client.post(url, data, format='json')
+            assert response.status_code == 201, response.content[:500]
+            seconds = results['request']
+            print(f'#{attempt}: {seconds:.2f} s, '
+                  f'{args.items / seconds:,.0f} items/s, '
+                  f'{len(queries)} queries')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+'''Задержка списка товаров: цена через JOIN с ProductPrice против
+денормализованных столбцов price_* (PRODUCT_DENORMALIZED_PRICE).
+
+    python -m benchmarks.bench_denormalized_price --rows 100000
+'''
+import argparse
+import random
+import statistics
+
+from benchmarks.utils import benchmark_database, make_user, setup_django, timer
+
+CURRENCIES = ('rub', 'dollar', 'euro', 'yuan')
+# Первая страница списка API, как ее запрашивает клиент
+QUERIES = (
+    {},
+    {'ordering': 'price'},
+    {'ordering': '-price', 'min_price': 100, 'max_price': 500},
+    {'currency': 'euro', 'ordering': 'price'},
+    {'currency': 'yuan', 'min_price': 900},
+)
+
+
+def fill_products(rows, batch_size=10_000):
+    from products.models import Product, ProductType
+
+    product_type = ProductType.objects.create(name='Бенчмарк',
+                                              description='')
+    rng = random.Random(0)
+    Product.objects.bulk_create_with_prices(
+        [({'name': f'Товар {idx}', 'amount': 1,
+           'barcode': str(10 ** 12 + idx), 'type': product_type},
+          {'price': rng.randint(1, 1000),
+           'currency': rng.choice(CURRENCIES)}) for idx in range(rows)],
+        batch_size=batch_size)
+
+
+def measure(client, url, params, repeat):
+    '''Медиана времени ответа с пустым кэшем ответов'''
+
+    from django.core.cache import cache
+
+    times = []
+    for _ in range(repeat):
+        cache.clear()
+        results = {}
+        with timer(results, 'request'):
+            response = client.get(url, params)
+        assert response.status_code == 200, response.content[:500]
+        times.append(results['request'])
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    with benchmark_database():
+        results = {}
+        with timer(results, 'fill'):
+            fill_products(args.rows)
+        print(f'rows={args.rows}, заполнение {results["fill"]:.1f} с')
+        client = APIClient()
+        client.force_authenticate(make_user())
+        url = reverse('product-list')
+        for params in QUERIES:
+            settings.PRODUCT_DENORMALIZED_PRICE = False
+            joined = measure(client, url, params, args.repeat)
+            settings.PRODUCT_DENORMALIZED_PRICE = True
+            denormalized = measure(client, url, params, args.repeat)
+            print(f'{str(params):60} join {joined * 1000:8.1f} мс   '
+                  f'price_* {denormalized * 1000:8.1f} мс   '
+                  f'x{joined / denormalized:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+'''Рендеринг и сжатие страницы из 1000 товаров: процессорное время
+JSONRenderer DRF и FastJSONRenderer (orjson), затем каждой доступной
+кодировки CompressionMiddleware и размер ответа на проводе.
+
+    python -m benchmarks.bench_json_compression --limit 1000
+'''
+import argparse
+import statistics
+import time
+
+from benchmarks.utils import benchmark_database, make_user, setup_django
+
+
+def measure_cpu(function, repeat):
+    '''Медиана процессорного времени вызова и его результат'''
+
+    times = []
+    for _ in range(repeat):
+        start = time.process_time()
+        result = function()
+        times.append(time.process_time() - start)
+    return statistics.median(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--limit', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=21)
+    args = parser.parse_args()
+
+    setup_django()
+    from benchmarks.bench_denormalized_price import fill_products
+    from django.urls import reverse
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIClient
+
+    from api.middleware import ENCODINGS
+    from api.renderers import FastJSONRenderer, orjson
+
+    with benchmark_database():
+        fill_products(args.limit)
+        client = APIClient()
+        client.force_authenticate(make_user())
+        data = client.get(reverse('product-list'),
+                          {'limit': args.limit}).data
+        print(f'{len(data["results"])} товаров, медиана из {args.repeat}, '
+              f'orjson {"есть" if orjson else "не установлен"}')
+
+        content = None
+        for renderer in (JSONRenderer(), FastJSONRenderer()):
+            cpu, content = measure_cpu(lambda: renderer.render(data),
+                                       args.repeat)
+            print(f'  {type(renderer).__name__:18} {cpu * 1000:7.2f} мс CPU'
+                  f'   {len(content):8} байт')
+
+        def compress(factory):
+            compressor = factory()
+            return compressor.compress(content) + compressor.flush()
+
+        for encoding, factory in ENCODINGS.items():
+            cpu, compressed = measure_cpu(lambda: compress(factory),
+                                          args.repeat)
+            print(f'  {encoding:18} {cpu * 1000:7.2f} мс CPU'
+                  f'   {len(compressed):8} байт'
+                  f'   x{len(content) / len(compressed):.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+'''Задержка страницы списка товаров при разных способах подсчета:
+точный COUNT(*), COUNT(*) из кэша, оценка по статистике СУБД
+(?count=estimate) и без подсчета (?count=false).
+
+Таблица дозаполняется до каждого размера из --sizes, после чего
+выполняется ANALYZE. Каждый запрос берет другую страницу, чтобы
+не попадать в кэш ответов.
+
+    python -m benchmarks.bench_pagination --sizes 10000,100000,1000000
+'''
+import argparse
+import itertools
+import random
+import statistics
+
+from benchmarks.utils import benchmark_database, make_user, setup_django, timer
+
+CURRENCIES = ('rub', 'dollar', 'euro', 'yuan')
+QUERIES = (
+    {},
+    {'is_active': 'true', 'ordering': 'name'},
+)
+offsets = itertools.count(step=10)
+
+
+def fill_products(product_type, start, stop, batch_size=10_000):
+    from products.models import Product
+
+    rng = random.Random(start)
+    Product.objects.bulk_create_with_prices(
+        [({'name': f'Товар {idx}', 'amount': 1, 'is_active': idx % 3 > 0,
+           'barcode': str(10 ** 12 + idx), 'type': product_type},
+          {'price': rng.randint(1, 1000),
+           'currency': rng.choice(CURRENCIES)})
+         for idx in range(start, stop)],
+        batch_size=batch_size)
+
+
+def measure(client, url, params, repeat, clear_cache):
+    from django.core.cache import cache
+
+    times = []
+    for _ in range(repeat):
+        if clear_cache:
+            cache.clear()
+        # Новое смещение на каждый запрос: ответ не берется из кэша
+        page = {**params, 'offset': next(offsets) % 1000}
+        results = {}
+        with timer(results, 'request'):
+            response = client.get(url, page)
+        assert response.status_code == 200, response.content[:500]
+        times.append(results['request'])
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    setup_django()
+    from django.db import connection
+    from django.urls import reverse
+    from rest_framework.test import APIClient
+
+    from products.models import ProductType
+
+    with benchmark_database():
+        client = APIClient()
+        client.force_authenticate(make_user())
+        url = reverse('product-list')
+        product_type = ProductType.objects.create(name='Бенчмарк',
+                                                  description='')
+        filled = 0
+        for size in sizes:
+            results = {}
+            with timer(results, 'fill'):
+                fill_products(product_type, filled, size)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            filled = size
+            print(f'rows={size}, заполнение {results["fill"]:.1f} с')
+            for params in QUERIES:
+                exact = measure(client, url, params, args.repeat, True)
+                cached = measure(client, url, params, args.repeat, False)
+                estimate = measure(client, url, {**params,
+                                                 'count': 'estimate'},
+                                   args.repeat, True)
+                without = measure(client, url, {**params, 'count': 'false'},
+                                  args.repeat, True)
+                print(f'  {str(params):45} COUNT {exact * 1000:7.1f} мс   '
+                      f'кэш {cached * 1000:7.1f} мс   '
+                      f'estimate {estimate * 1000:7.1f} мс   '
+                      f'count=false {without * 1000:7.1f} мс')
+
+
+if __name__ == '__main__':
+    main()
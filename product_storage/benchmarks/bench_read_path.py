@@ -0,0 +1,71 @@
+'''Стоимость строки списка товаров: экземпляры модели и
+ProductCreateReadSerializer против values_list и RowMapper.
+
+Замер включает чтение из БД и сборку данных ответа (без рендеринга
+JSON, он одинаков для обоих путей).
+
+    python -m benchmarks.bench_read_path --rows 5000
+'''
+import argparse
+import statistics
+
+from benchmarks.utils import benchmark_database, setup_django, timer
+
+PAGE_SIZES = (100, 500, 1000, 5000)
+
+
+def measure(function, repeat):
+    times = []
+    for _ in range(repeat):
+        results = {}
+        with timer(results, 'run'):
+            data = function()
+        times.append(results['run'])
+    return statistics.median(times), data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=7)
+    args = parser.parse_args()
+
+    setup_django()
+    from benchmarks.bench_denormalized_price import fill_products
+    from django.conf import settings
+    from rest_framework.renderers import JSONRenderer
+
+    from api.mappers import get_row_mapper
+    from api.serializers import (ProductCreateReadSerializer,
+                                 ProductDenormalizedReadSerializer)
+    from api.utils import product_queryset
+
+    with benchmark_database():
+        fill_products(args.rows)
+        print(f'rows={args.rows}, медиана из {args.repeat}')
+        for denormalized_price, serializer_class in (
+                (False, ProductCreateReadSerializer),
+                (True, ProductDenormalizedReadSerializer)):
+            settings.PRODUCT_DENORMALIZED_PRICE = denormalized_price
+            queryset = product_queryset({})
+            mapper = get_row_mapper(serializer_class)
+            print(serializer_class.__name__)
+            for size in PAGE_SIZES:
+                page = queryset[:size]
+                serializer_time, serializer_data = measure(
+                    lambda: serializer_class(page, many=True).data,
+                    args.repeat)
+                values_time, values_data = measure(
+                    lambda: mapper.map(page.values_list(*mapper.lookups)),
+                    args.repeat)
+                assert (JSONRenderer().render(serializer_data)
+                        == JSONRenderer().render(values_data))
+                rows = len(values_data)
+                print(f'  {rows:6} строк   serializer '
+                      f'{serializer_time / rows * 1e6:7.1f} мкс/строка   '
+                      f'values_list {values_time / rows * 1e6:7.1f} '
+                      f'мкс/строка   x{serializer_time / values_time:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+'''Поиск по названию: полнотекстовый индекс против name__icontains.
+
+    python -m benchmarks.bench_search --rows 1000000
+'''
+import argparse
+import random
+import statistics
+
+from benchmarks.utils import benchmark_database, setup_django, timer
+
+WORDS = ('молоко', 'молочный', 'шоколад', 'кефир', 'сыр', 'творог',
+         'масло', 'сливочное', 'хлеб', 'ржаной', 'батон', 'чай', 'черный',
+         'зеленый', 'кофе', 'молотый', 'сок', 'яблочный', 'томатный',
+         'вода', 'минеральная', 'печенье', 'овсяное', 'конфеты')
+SYLLABLES = ('ка', 'ро', 'ми', 'ла', 'ту', 'не', 'да', 'со', 'би', 'ва',
+             'зо', 'ре', 'пу', 'ги', 'ма', 'ло', 'ши', 'фе', 'ку', 'ты')
+# Частые слова встречаются в каждом восьмом товаре, бренды — в единицах
+QUERIES = ('молоч', 'сливочное масло', 'ржан хлеб', 'каро', 'ламиту',
+           'кефир ламиту')
+
+
+def make_brands(rng, count=20_000):
+    return [''.join(rng.choices(SYLLABLES, k=rng.randint(3, 4)))
+            for _ in range(count)]
+
+
+def fill_products(rows, batch_size=10_000):
+    from products.models import Product, ProductPrice, ProductType
+
+    product_type = ProductType.objects.create(name='Бенчмарк',
+                                              description='')
+    rng = random.Random(0)
+    brands = make_brands(rng)
+    for start in range(0, rows, batch_size):
+        products = Product.objects.bulk_create(
+            Product(name=' '.join((*rng.sample(WORDS, 3),
+                                   rng.choice(brands))).capitalize(),
+                    amount=1, barcode=str(10 ** 12 + idx),
+                    type=product_type)
+            for idx in range(start, min(start + batch_size, rows)))
+        ProductPrice.objects.bulk_create(
+            ProductPrice(price=1, product=product) for product in products)
+
+
+def measure(queryset_factory, repeat):
+    '''Медиана времени получения первой страницы (20 строк) и числа
+    найденных товаров, как это делает список API'''
+
+    times = []
+    for _ in range(repeat):
+        results = {}
+        with timer(results, 'query'):
+            queryset = queryset_factory()
+            queryset.count()
+            list(queryset[:20])
+        times.append(results['query'])
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Q
+
+    from products.models import Product
+    from products.search import get_terms, search_products
+
+    with benchmark_database():
+        results = {}
+        with timer(results, 'fill'):
+            fill_products(args.rows)
+        print(f'rows={args.rows}, заполнение {results["fill"]:.1f} с')
+        base = Product.objects.select_related('price', 'type')
+        for query in QUERIES:
+            def icontains():
+                condition = Q()
+                for term in get_terms(query):
+                    condition &= Q(name__icontains=term)
+                return base.filter(condition).order_by('-date_updated')
+
+            def fulltext():
+                return search_products(base, query).order_by('-search_rank')
+
+            old, new = (measure(icontains, args.repeat),
+                        measure(fulltext, args.repeat))
+            print(f'{query!r:20} icontains {old * 1000:8.1f} мс   '
+                  f'fts {new * 1000:8.1f} мс   x{old / new:.1f}')
+
+
+if __name__ == '__main__':
+    main()
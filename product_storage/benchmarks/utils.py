@@ -0,0 +1,51 @@
+'''Общая обвязка бенчмарков: настройка Django и временная тестовая БД.
+
+Бенчмарки запускаются из каталога product_storage:
+    python -m benchmarks.bench_bulk_create --items 10000
+'''
+import os
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                          'product_storage.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    django.setup()
+
+
+@contextmanager
+def benchmark_database():
+    '''Создает тестовую БД (как pytest) и удаляет ее после замеров'''
+
+    from django.db import connection
+    from django.test.utils import (setup_test_environment,
+                                   teardown_test_environment)
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0,
+                                                  autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+@contextmanager
+def timer(results, name):
+    '''Сохраняет в results[name] время выполнения блока в секундах'''
+
+    start = time.perf_counter()
+    yield
+    results[name] = time.perf_counter() - start
+
+
+def make_user():
+    from django.contrib.auth import get_user_model
+
+    return get_user_model().objects.create_user(username='benchmark',
+                                                password='benchmark')
@@ -5,3 +5,30 @@ BARCODE_LENGTH_2 = 8
 PRICE_MAX_DIGITS = 10
 PRICE_DECIMAL_PLACES = 2
 LONG_NAME_LENGTH_LIMIT = 20
+# Наибольшее количество товара: верхняя граница PositiveSmallIntegerField
+PRODUCT_AMOUNT_MAX = 32767
+AMOUNT_UPDATE_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 2000
+# Наибольшее число штрихкодов в одном запросе поиска
+BARCODE_LOOKUP_MAX_COUNT = 100
+PRICE_BACKFILL_BATCH_SIZE = 10000
+STOCK_COMPACTION_BATCH_SIZE = 10000
+# Базовая валюта: в ней хранится Product.price_base, курсы задаются к ней
+BASE_CURRENCY = 'rub'
+BASE_PRICE_MAX_DIGITS = 16
+EXCHANGE_RATE_MAX_DIGITS = 12
+EXCHANGE_RATE_DECIMAL_PLACES = 6
+# Уровни сжатия ответов: быстрые, подходящие для сжатия на лету
+GZIP_COMPRESS_LEVEL = 6
+BROTLI_COMPRESS_QUALITY = 5
+ZSTD_COMPRESS_LEVEL = 3
+# Лента изменений: размер страницы и long-poll (секунды)
+CHANGE_FEED_PAGE_SIZE = 100
+CHANGE_FEED_MAX_PAGE_SIZE = 1000
+# Синхронный long-poll занимает поток воркера на все ожидание,
+# асинхронный (/async/products/changes/) — только цикл событий
+CHANGE_FEED_SYNC_MAX_WAIT = 5
+CHANGE_FEED_MAX_WAIT = 30
+CHANGE_FEED_POLL_INTERVAL = 0.5
+# Ключ advisory-блокировки PostgreSQL, упорядочивающей ленту изменений
+CHANGE_FEED_LOCK_ID = 7301
@@ -29,6 +29,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.metrics.MetricsMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,6 +66,63 @@ DATABASES = {
     }
 }
 
+# Кэш ответов API: locmem по умолчанию, Redis при заданном REDIS_URL
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+if os.getenv('REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL'),
+    }
+
+PRODUCT_CACHE_TIMEOUT = int(os.getenv('PRODUCT_CACHE_TIMEOUT', 300))
+
+# Число товаров в кэше процесса для поиска по штрихкоду
+PRODUCT_BARCODE_CACHE_SIZE = int(
+    os.getenv('PRODUCT_BARCODE_CACHE_SIZE', 10000))
+
+# Список товаров фильтрует, сортирует и отдает цену из столбцов price_*
+# товара, без JOIN с ProductPrice. Столбцы заполняют миграции, после
+# правок цен в обход модели: python manage.py backfill_product_prices
+PRODUCT_DENORMALIZED_PRICE = os.getenv(
+    'PRODUCT_DENORMALIZED_PRICE', 'false').lower() == 'true'
+
+# Список товаров читается через values_list без создания экземпляров
+# модели и сериализатора (формат ответа тот же)
+PRODUCT_VALUES_LIST_READ = os.getenv(
+    'PRODUCT_VALUES_LIST_READ', 'true').lower() == 'true'
+
+# Движения товаров старше этого числа дней compact_stock_movements
+# сворачивает в дневные снимки остатков
+STOCK_MOVEMENT_RETENTION_DAYS = int(
+    os.getenv('STOCK_MOVEMENT_RETENTION_DAYS', 90))
+
+# Ответы API больше этого размера (в байтах) сжимаются zstd, br или
+# gzip по Accept-Encoding клиента; 0 отключает сжатие
+RESPONSE_COMPRESSION_MIN_SIZE = int(
+    os.getenv('RESPONSE_COMPRESSION_MIN_SIZE', 1024))
+
+# Замеры запросов к API: Server-Timing, строки JSON в логгере
+# api.metrics и эндпоинт /api/v1/metrics/ в формате Prometheus
+API_METRICS = os.getenv('API_METRICS', 'false').lower() == 'true'
+# SQL-запросы дольше этого числа миллисекунд пишутся в лог
+API_SLOW_QUERY_MS = float(os.getenv('API_SLOW_QUERY_MS', 100))
+# Адреса, с которых доступен эндпоинт метрик
+API_METRICS_ALLOWED_IPS = os.getenv(
+    'API_METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'api.metrics': {'handlers': ('console',), 'level': 'INFO',
+                                'propagate': False}},
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -98,10 +157,24 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 10,
 }
 
+# Размер страницы по умолчанию и наибольший ?limit= для списков
+PRODUCT_PAGE_SIZE = int(os.getenv('PRODUCT_PAGE_SIZE', 10))
+PRODUCT_MAX_PAGE_SIZE = int(os.getenv('PRODUCT_MAX_PAGE_SIZE', 1000))
+PRODUCT_TYPE_PAGE_SIZE = int(os.getenv('PRODUCT_TYPE_PAGE_SIZE', 100))
+PRODUCT_TYPE_MAX_PAGE_SIZE = int(os.getenv('PRODUCT_TYPE_MAX_PAGE_SIZE',
+                                           1000))
+
+# Размер пачки INSERT при массовом добавлении товаров
+BULK_CREATE_BATCH_SIZE = int(os.getenv('BULK_CREATE_BATCH_SIZE', 1000))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
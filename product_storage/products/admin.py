@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 
-from .models import Product, ProductPrice, ProductType
+from .models import ExchangeRate, Product, ProductPrice, ProductType
+from .search import search_products
 
 admin.site.unregister(Group)
 
@@ -27,6 +28,14 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ('is_active', 'type')
     search_fields = ('name', 'barcode')
 
+    def get_search_results(self, request, queryset, search_term):
+        '''Поиск по полнотекстовому индексу вместо LIKE '%...%'
+        по каждому полю из search_fields'''
+
+        if not search_term:
+            return queryset, False
+        return search_products(queryset, search_term), False
+
     @admin.display(description='Название')
     def get_short_name(self, obj):
         return str(obj)
@@ -57,3 +66,15 @@ class ProductPriceAdmin(admin.ModelAdmin):
     list_display = ('product', 'price', 'currency')
     list_editable = ('price', 'currency')
     list_filter = ('product__type',)
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'rate', 'date_updated')
+    list_editable = ('rate',)
+
+    def get_readonly_fields(self, request, obj=None):
+        '''Валюту существующего курса не меняем: пересчитанные
+        по нему цены остались бы у товаров прежней валюты'''
+
+        return ('currency',) if obj else ()
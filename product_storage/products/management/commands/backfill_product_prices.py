@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from product_storage.constants import PRICE_BACKFILL_BATCH_SIZE
+from products.models import Product, ProductTypeStats
+
+
+class Command(BaseCommand):
+    help = ('Заполняет столбцы price_* товаров из ProductPrice '
+            'пачками по диапазонам id, каждая в своей транзакции')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=PRICE_BACKFILL_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        last_pk = Product.objects.aggregate(last_pk=Max('pk'))['last_pk']
+        updated = 0
+        start = time.perf_counter()
+        # Агрегаты по столбцам цены пересчитываются целиком в конце
+        with ProductTypeStats.objects.paused():
+            for first_pk in range(1, (last_pk or 0) + 1, batch_size):
+                with transaction.atomic():
+                    updated += Product.objects.filter(
+                        pk__gte=first_pk, pk__lt=first_pk + batch_size
+                    ).sync_prices()
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'Обработано до id {first_pk + batch_size}')
+        ProductTypeStats.objects.rebuild()
+        seconds = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено товаров: {updated}, {seconds:.1f} с'))
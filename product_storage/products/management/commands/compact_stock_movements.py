@@ -0,0 +1,30 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from product_storage.constants import STOCK_COMPACTION_BATCH_SIZE
+from products.models import StockMovement
+
+
+class Command(BaseCommand):
+    help = ('Сворачивает движения товаров старше --days дней в дневные '
+            'снимки остатков StockSnapshot и удаляет их из журнала')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.STOCK_MOVEMENT_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int,
+                            default=STOCK_COMPACTION_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        before = timezone.now().date() - timedelta(days=options['days'])
+        start = time.perf_counter()
+        snapshots, movements = StockMovement.objects.compact(
+            before, batch_size=options['batch_size'])
+        seconds = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Движений до {before} свернуто: {movements}, снимков '
+            f'создано: {snapshots}, {seconds:.1f} с'))
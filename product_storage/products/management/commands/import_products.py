@@ -0,0 +1,169 @@
+import csv
+import json
+import sys
+import time
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from products.models import Product, ProductPrice, ProductType
+
+PRODUCT_FIELDS = ('name', 'amount', 'barcode', 'is_active')
+PRICE_FIELDS = ('price', 'currency')
+
+
+def read_csv(file):
+    '''Строки CSV с заголовком name,amount,barcode,type,price,currency
+    и необязательным is_active (1/0, True/False)'''
+
+    reader = csv.DictReader(file)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_ndjson(file):
+    '''Строки NDJSON в формате API: цена — плоские поля
+    price/currency или объект {"price": ..., "currency": ...}'''
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = ValidationError({'json': f'Некорректный JSON: {e}'})
+        if not isinstance(row, (dict, ValidationError)):
+            row = ValidationError({'json': 'Строка должна быть объектом'})
+        elif isinstance(row, dict) and isinstance(row.get('price'), dict):
+            row.update(row.pop('price'))
+        yield line_number, row
+
+
+READERS = {'csv': read_csv, 'ndjson': read_ndjson}
+
+
+class Command(BaseCommand):
+    help = ('Потоковый импорт товаров из CSV или NDJSON: файл читается '
+            'построчно и записывается пачками, память не зависит '
+            'от размера файла')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу или - для stdin')
+        parser.add_argument('--format', choices=READERS,
+                            help='По умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument(
+            '--upsert', action='store_true',
+            help='Обновлять товары с уже существующим штрихкодом')
+        parser.add_argument(
+            '--errors', help='CSV-файл для отчета об ошибках по строкам '
+            '(по умолчанию stderr)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError('Укажите --format: csv или ndjson')
+        self.batch_size = (options['batch_size']
+                           or settings.BULK_CREATE_BATCH_SIZE)
+        self.verbosity = options['verbosity']
+        self.upsert = options['upsert']
+        self.type_ids = set(ProductType.objects.values_list('pk', flat=True))
+        self.imported = self.failed = 0
+
+        errors_file = (open(options['errors'], 'w', newline='',
+                            encoding='utf-8')
+                       if options['errors'] else self.stderr)
+        source = (sys.stdin if path == '-'
+                  else open(path, newline='', encoding='utf-8-sig'))
+        self.errors = csv.writer(errors_file)
+        self.errors.writerow(('line', 'barcode', 'error'))
+        start = time.perf_counter()
+        try:
+            self.import_rows(READERS[file_format](source))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if options['errors']:
+                errors_file.close()
+        seconds = time.perf_counter() - start
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано строк: {self.imported}, ошибок: {self.failed}, '
+            f'{seconds:.1f} с ({self.imported / (seconds or 1):,.0f} '
+            'строк/с)'))
+
+    def import_rows(self, rows):
+        batch = {}
+        for line_number, row in rows:
+            try:
+                product_data, price_data = self.clean_row(row)
+            except ValidationError as e:
+                self.report_error(line_number, row, '; '.join(
+                    f'{field}: {" ".join(messages)}'
+                    for field, messages in e.message_dict.items()))
+                continue
+            barcode = product_data['barcode']
+            if barcode in batch:
+                # Иначе bulk_create получил бы два товара с одним
+                # штрихкодом; повторы из разных пачек ловит write_batch
+                # (с --upsert следующая пачка обновляет товар)
+                self.report_error(
+                    line_number, row,
+                    f'Штрихкод повторяет строку {batch[barcode][0]}')
+                continue
+            batch[barcode] = (line_number, product_data, price_data)
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = {}
+        if batch:
+            self.write_batch(batch)
+
+    def clean_row(self, row):
+        if isinstance(row, ValidationError):
+            raise row
+        product = Product(**{field: row[field] for field in PRODUCT_FIELDS
+                             if row.get(field) not in (None, '')})
+        price = ProductPrice(**{field: row[field] for field in PRICE_FIELDS
+                                if row.get(field) not in (None, '')})
+        errors = {}
+        for instance, exclude in ((product, ('type',)),
+                                  (price, ('product',))):
+            try:
+                instance.clean_fields(exclude=exclude)
+            except ValidationError as e:
+                errors.update(e.message_dict)
+        try:
+            type_id = int(row.get('type'))
+        except (TypeError, ValueError):
+            type_id = None
+        if type_id not in self.type_ids:
+            errors['type'] = [f'Тип товара {row.get("type")!r} не найден']
+        if errors:
+            raise ValidationError(errors)
+        return ({'type_id': type_id,
+                 **{field: getattr(product, field)
+                    for field in PRODUCT_FIELDS}},
+                {field: getattr(price, field) for field in PRICE_FIELDS})
+
+    def write_batch(self, batch):
+        if not self.upsert:
+            existing = set(Product.objects.filter(
+                barcode__in=batch).values_list('barcode', flat=True))
+            for barcode in existing:
+                line_number, *_ = batch.pop(barcode)
+                self.report_error(line_number, {'barcode': barcode},
+                                  'Товар с таким штрихкодом уже существует')
+        Product.objects.bulk_create_with_prices(
+            [(product_data, price_data)
+             for _, product_data, price_data in batch.values()],
+            batch_size=self.batch_size, upsert=self.upsert)
+        self.imported += len(batch)
+        if self.verbosity > 1:
+            self.stdout.write(f'Импортировано строк: {self.imported}')
+
+    def report_error(self, line_number, row, error):
+        barcode = row.get('barcode') if isinstance(row, dict) else None
+        self.errors.writerow((line_number, barcode or '', error))
+        self.failed += 1
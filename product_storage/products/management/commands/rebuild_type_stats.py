@@ -0,0 +1,18 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.models import ProductTypeStats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает агрегаты ProductTypeStats по всем товарам '
+            'одним запросом GROUP BY')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        groups = ProductTypeStats.objects.rebuild()
+        seconds = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано групп (тип, валюта): {len(groups)}, '
+            f'{seconds:.1f} с'))
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:18
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def delete_duplicate_barcodes(apps, schema_editor):
+    '''Из товаров с одинаковым штрихкодом оставляем
+    последний обновленный, остальные удаляем вместе с ценами'''
+
+    Product = apps.get_model('products', 'Product')
+    duplicate_barcodes = Product.objects.values('barcode').annotate(
+        products_count=Count('id')).filter(
+        products_count__gt=1).values_list('barcode', flat=True)
+    for barcode in duplicate_barcodes:
+        duplicates = Product.objects.filter(barcode=barcode).order_by(
+            '-date_updated', '-id')
+        Product.objects.filter(barcode=barcode).exclude(
+            pk=duplicates[0].pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_barcodes,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='barcode',
+            field=models.CharField(max_length=13, unique=True, validators=[django.core.validators.RegexValidator(message='Штрихкод должен иметь длину 13 или 8 символов и состоять из цифр', regex='^\\d{13}$|^\\d{8}$')], verbose_name='Штрихкод'),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Копия DDL на момент миграции: код приложения может меняться,
+# а миграция должна создавать ту же схему
+FTS_TABLE = 'products_product_fts'
+SEARCH_INDEX_NAME = 'product_search_idx'
+
+SQLITE_SETUP = (
+    f'''CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, barcode, content='products_product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2')''',
+    f'''CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, barcode)
+        VALUES (new.id, new.name, new.barcode);
+    END''',
+    f'''CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, barcode)
+        VALUES ('delete', old.id, old.name, old.barcode);
+    END''',
+    f'''CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF name, barcode
+        ON products_product BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, barcode)
+        VALUES ('delete', old.id, old.name, old.barcode);
+        INSERT INTO {FTS_TABLE}(rowid, name, barcode)
+        VALUES (new.id, new.name, new.barcode);
+    END''',
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+SQLITE_TEARDOWN = (
+    *(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}'
+      for suffix in ('ai', 'ad', 'au')),
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+
+
+def get_search_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(SearchVector('name', 'barcode', config='simple'),
+                    name=SEARCH_INDEX_NAME)
+
+
+def create_search_index(apps, schema_editor):
+    match schema_editor.connection.vendor:
+        case 'sqlite':
+            for sql in SQLITE_SETUP:
+                schema_editor.execute(sql)
+        case 'postgresql':
+            schema_editor.add_index(
+                apps.get_model('products', 'Product'), get_search_index())
+
+
+def drop_search_index(apps, schema_editor):
+    match schema_editor.connection.vendor:
+        case 'sqlite':
+            for sql in SQLITE_TEARDOWN:
+                schema_editor.execute(sql)
+        case 'postgresql':
+            schema_editor.remove_index(
+                apps.get_model('products', 'Product'), get_search_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_barcode_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchIndex',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='products.product')),
+                ('document', models.TextField(db_column='products_product_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'products_product_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:49
+
+from django.db import migrations, models
+
+from product_storage.constants import PRICE_BACKFILL_BATCH_SIZE
+
+FIELDS = {'id': 'price_pk', 'price': 'price_amount',
+          'currency': 'price_currency'}
+
+
+def fill_prices(apps, schema_editor):
+    '''Столбцы price_* существующих товаров: без них товары с ценой
+    пропадали бы из фильтров и сортировки по цене до ручного запуска
+    backfill_product_prices. Пачки — диапазоны id'''
+
+    Product = apps.get_model('products', 'Product')
+    ProductPrice = apps.get_model('products', 'ProductPrice')
+    prices = ProductPrice.objects.filter(product=models.OuterRef('pk'))
+    last_pk = Product.objects.aggregate(last_pk=models.Max('pk'))['last_pk']
+    for first_pk in range(1, (last_pk or 0) + 1, PRICE_BACKFILL_BATCH_SIZE):
+        Product.objects.filter(
+            pk__gte=first_pk, pk__lt=first_pk + PRICE_BACKFILL_BATCH_SIZE,
+            price__isnull=False,
+        ).update(**{column: models.Subquery(prices.values(field)[:1])
+                    for field, column in FIELDS.items()})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='price_amount',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=10, null=True, verbose_name='Цена'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_currency',
+            field=models.CharField(choices=[('rub', 'Рубль'), ('dollar', 'Доллар'), ('euro', 'Евро'), ('yuan', 'Юань')], editable=False, max_length=6, null=True, verbose_name='Валюта'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_pk',
+            field=models.BigIntegerField(editable=False, null=True, verbose_name='id цены'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price_amount', 'id'], name='product_price_amount_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price_currency', 'price_amount'], name='product_price_currency_idx'),
+        ),
+        migrations.RunPython(fill_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-18 16:55
+
+from decimal import Decimal
+
+import django.core.validators
+from django.db import migrations, models
+
+from product_storage.constants import BASE_CURRENCY
+
+
+def fill_base_prices(apps, schema_editor):
+    '''Цена в базовой валюте для товаров с ценой в BASE_CURRENCY.
+    Курсов других валют еще нет: их цена появится при сохранении курса'''
+
+    Product = apps.get_model('products', 'Product')
+    Product.objects.filter(price_currency=BASE_CURRENCY).update(
+        price_base=models.F('price_amount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_denormalized_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('rub', 'Рубль'), ('dollar', 'Доллар'), ('euro', 'Евро'), ('yuan', 'Юань')], max_length=6, unique=True, verbose_name='Валюта')),
+                ('rate', models.DecimalField(decimal_places=6, help_text='Стоимость единицы валюты в базовой валюте', max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.000001'))], verbose_name='Курс')),
+                ('date_updated', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+            options={
+                'verbose_name': 'курс валюты',
+                'verbose_name_plural': 'Курсы валют',
+                'ordering': ('currency',),
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_base',
+            field=models.DecimalField(decimal_places=2, editable=False, max_digits=16, null=True, verbose_name='Цена в базовой валюте'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price_base', 'id'], name='product_price_base_id_idx'),
+        ),
+        migrations.RunPython(fill_base_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.1.2 on 2026-10-18 17:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Round
+
+
+def fill_type_stats(apps, schema_editor):
+    '''Агрегаты существующих товаров: без них первая запись товара
+    уменьшила бы нулевые счетчики и нарушила бы ограничения'''
+
+    Product = apps.get_model('products', 'Product')
+    ProductTypeStats = apps.get_model('products', 'ProductTypeStats')
+    groups = Product.objects.order_by().values(
+        'type', 'price_currency').annotate(
+        product_count=models.Count('pk'),
+        active_count=models.Count('pk', filter=models.Q(is_active=True)),
+        amount_total=Coalesce(models.Sum('amount'), 0),
+        # Сумма в копейках, как в ProductTypeStats.price_sum
+        price_sum=Coalesce(models.Sum(
+            Round(models.F('price_amount') * 100)), 0,
+            output_field=models.DecimalField()),
+        price_min=models.Min('price_amount'),
+        price_max=models.Max('price_amount'))
+    ProductTypeStats.objects.bulk_create(
+        ProductTypeStats(type_id=group.pop('type'),
+                         currency=group.pop('price_currency') or '',
+                         price_sum=int(group.pop('price_sum')), **group)
+        for group in groups)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_exchange_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTypeStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(blank=True, choices=[('rub', 'Рубль'), ('dollar', 'Доллар'), ('euro', 'Евро'), ('yuan', 'Юань')], max_length=6, verbose_name='Валюта')),
+                ('product_count', models.PositiveIntegerField(default=0, verbose_name='Товаров')),
+                ('active_count', models.PositiveIntegerField(default=0, verbose_name='Активных')),
+                ('amount_total', models.PositiveBigIntegerField(default=0, verbose_name='Количество')),
+                ('price_sum', models.BigIntegerField(default=0, verbose_name='Сумма цен, коп.')),
+                ('price_min', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Минимальная цена')),
+                ('price_max', models.DecimalField(decimal_places=2, max_digits=10, null=True, verbose_name='Максимальная цена')),
+            ],
+            options={
+                'verbose_name': 'статистика типа товаров',
+                'verbose_name_plural': 'Статистика типов товаров',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['type', 'price_currency', 'price_amount'], name='product_type_price_idx'),
+        ),
+        migrations.AddField(
+            model_name='producttypestats',
+            name='type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='products.producttype', verbose_name='Тип товара'),
+        ),
+        migrations.AddConstraint(
+            model_name='producttypestats',
+            constraint=models.UniqueConstraint(fields=('type', 'currency'), name='product_type_stats_unique'),
+        ),
+        migrations.RunPython(fill_type_stats, migrations.RunPython.noop),
+    ]
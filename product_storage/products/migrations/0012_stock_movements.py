@@ -0,0 +1,65 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+BATCH_SIZE = 10000
+
+
+def record_initial_amounts(apps, schema_editor):
+    '''Текущее количество существующих товаров — первое движение
+    журнала: сумма движений товара совпадает с его amount'''
+
+    Product = apps.get_model('products', 'Product')
+    StockMovement = apps.get_model('products', 'StockMovement')
+    amounts = Product.objects.filter(amount__gt=0).order_by(
+        'pk').values_list('pk', 'amount')
+    batch = []
+    for pk, amount in amounts.iterator(chunk_size=BATCH_SIZE):
+        batch.append(StockMovement(product_id=pk, delta=amount,
+                                   reason='initial'))
+        if len(batch) >= BATCH_SIZE:
+            StockMovement.objects.bulk_create(batch)
+            batch = []
+    StockMovement.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_product_type_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField(verbose_name='Изменение')),
+                ('reason', models.CharField(choices=[('initial', 'Начальный остаток'), ('create', 'Добавление товара'), ('update', 'Изменение товара'), ('amount', 'Изменение количества'), ('bulk_create', 'Массовое добавление'), ('delete', 'Удаление товара')], max_length=11, verbose_name='Причина')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_movements', to='products.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'движение товара',
+                'verbose_name_plural': 'Движения товаров',
+                'indexes': [models.Index(fields=['product', 'created_at'], name='stock_movement_product_idx'), models.Index(fields=['created_at'], name='stock_movement_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_snapshots', to='products.product', verbose_name='Товар')),
+            ],
+            options={
+                'verbose_name': 'снимок остатка',
+                'verbose_name_plural': 'Снимки остатков',
+                'constraints': [models.UniqueConstraint(fields=('product', 'date'), name='stock_snapshot_unique')],
+            },
+        ),
+        migrations.RunPython(record_initial_amounts,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.2 on 2026-10-18 18:08
+
+from django.db import migrations, models
+
+BATCH_SIZE = 10000
+
+
+def record_existing_objects(apps, schema_editor):
+    '''Все существующие типы и товары — первые записи ленты:
+    синхронизация с since=0 получает каталог целиком'''
+
+    CatalogChange = apps.get_model('products', 'CatalogChange')
+    for object_type, model_name in (('product_type', 'ProductType'),
+                                    ('product', 'Product')):
+        pks = apps.get_model('products', model_name).objects.order_by(
+            'pk').values_list('pk', flat=True)
+        batch = []
+        for pk in pks.iterator(chunk_size=BATCH_SIZE):
+            batch.append(CatalogChange(object_type=object_type,
+                                       object_id=pk))
+            if len(batch) >= BATCH_SIZE:
+                CatalogChange.objects.bulk_create(batch)
+                batch = []
+        CatalogChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0012_stock_movements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('object_type', models.CharField(choices=[('product', 'Товар'), ('product_type', 'Тип товара')], max_length=12, verbose_name='Объект')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('deleted', models.BooleanField(default=False, verbose_name='Удален')),
+                ('date_changed', models.DateTimeField(auto_now_add=True, verbose_name='Дата изменения')),
+            ],
+            options={
+                'verbose_name': 'изменение каталога',
+                'verbose_name_plural': 'Изменения каталога',
+                'indexes': [models.Index(fields=['object_type', 'object_id'], name='catalog_change_object_idx')],
+            },
+        ),
+        migrations.RunPython(record_existing_objects,
+                             migrations.RunPython.noop),
+    ]
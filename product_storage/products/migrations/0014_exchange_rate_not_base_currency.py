@@ -0,0 +1,39 @@
+# Generated by Django 5.1.2 on 2026-10-18 19:28
+
+from django.db import migrations, models
+from django.db.models.functions import Round
+
+from product_storage.constants import (BASE_CURRENCY, BASE_PRICE_MAX_DIGITS,
+                                       PRICE_DECIMAL_PLACES)
+
+
+def fix_exchange_rates(apps, schema_editor):
+    '''Удаляет курс базовой валюты (он всегда равен 1) и округляет
+    цены в базовой валюте, сохраненные без округления'''
+
+    ExchangeRate = apps.get_model('products', 'ExchangeRate')
+    Product = apps.get_model('products', 'Product')
+    ExchangeRate.objects.filter(currency=BASE_CURRENCY).delete()
+    for currency, rate in ExchangeRate.objects.values_list('currency',
+                                                           'rate'):
+        Product.objects.filter(price_currency=currency).update(
+            price_base=Round(
+                models.F('price_amount') * rate, PRICE_DECIMAL_PLACES,
+                output_field=models.DecimalField(
+                    max_digits=BASE_PRICE_MAX_DIGITS,
+                    decimal_places=PRICE_DECIMAL_PLACES)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_catalog_changes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fix_exchange_rates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.CheckConstraint(condition=models.Q(('currency', 'rub'), _negated=True), name='exchange_rate_not_base_currency'),
+        ),
+    ]
@@ -1,12 +1,307 @@
-from django.db import models
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
 
-from product_storage.constants import BARCODE_LENGTH_1, BARCODE_LENGTH_2
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import connections, models, transaction
+from django.db.models.functions import (Coalesce, Greatest, Least, Round,
+                                        TruncDate)
+from django.db.models.lookups import GreaterThanOrEqual, LessThanOrEqual
+from django.utils import timezone
+
+from product_storage.constants import (AMOUNT_UPDATE_BATCH_SIZE,
+                                       BARCODE_LENGTH_1, BARCODE_LENGTH_2,
+                                       BASE_CURRENCY, BASE_PRICE_MAX_DIGITS,
+                                       CHANGE_FEED_LOCK_ID,
+                                       EXCHANGE_RATE_DECIMAL_PLACES,
+                                       EXCHANGE_RATE_MAX_DIGITS)
 from product_storage.constants import LONG_NAME_LENGTH_LIMIT as LEN_LIM
 from product_storage.constants import (PRICE_DECIMAL_PLACES, PRICE_MAX_DIGITS,
+                                       PRODUCT_AMOUNT_MAX,
                                        PRODUCT_NAME_MAX_LENGTH,
-                                       PRODUCT_TYPE_NAME_MAX_LENGTH)
+                                       PRODUCT_TYPE_NAME_MAX_LENGTH,
+                                       STOCK_COMPACTION_BATCH_SIZE)
+from products.signals import products_changed
 from products.validators import barcode_regex_validator
 
+UPSERT_UPDATE_FIELDS = ('name', 'amount', 'type', 'date_updated')
+# Поле ProductPrice -> его копия в столбце Product
+DENORMALIZED_PRICE_FIELDS = {'id': 'price_pk', 'price': 'price_amount',
+                             'currency': 'price_currency'}
+# Столбцы товара, которые пишутся только вместе с ценой или курсом
+PRICE_COLUMNS = (*DENORMALIZED_PRICE_FIELDS.values(), 'price_base')
+# Поля товара, из которых складываются агрегаты ProductTypeStats
+STATS_FIELDS = ('type_id', 'price_currency', 'price_amount', 'amount',
+                'is_active')
+# Внутри ProductTypeStats.objects.track вложенные track ничего не делают
+stats_tracking = ContextVar('stats_tracking', default=False)
+
+
+class ProductQuerySet(models.QuerySet):
+    def change_amount(self, pk, amount_delta, expected_date_updated=None):
+        '''Относительно меняет количество товара одним условным UPDATE,
+        если остаток не станет отрицательным и не превысит
+        PRODUCT_AMOUNT_MAX (диапазон столбца). Возвращает True,
+        если строка изменена. С expected_date_updated условие включает
+        и версию товара: если товар изменился, — ProductModified'''
+
+        products = self.filter(pk=pk)
+        if expected_date_updated is not None:
+            products = products.filter(
+                date_updated__in=expected_date_updated)
+        with transaction.atomic(using=self.db):
+            updated = products.filter(
+                amount__gte=-amount_delta,
+                amount__lte=PRODUCT_AMOUNT_MAX - amount_delta,
+            ).update(
+                amount=models.F('amount') + amount_delta,
+                date_updated=timezone.now())
+            if not updated:
+                # Отказ по версии отличаем от отказа по остатку
+                if (expected_date_updated is not None
+                        and not products.exists()
+                        and self.filter(pk=pk).exists()):
+                    raise ProductModified
+                return False
+            ProductTypeStats.objects.using(self.db).add_amount(
+                self.filter(pk=pk), amount_delta)
+            if amount_delta:
+                StockMovement.objects.using(self.db).create(
+                    product_id=pk, delta=amount_delta,
+                    reason=StockMovementReasons.AMOUNT)
+            products_changed.send(sender=self.model, pks=[pk])
+        return True
+
+    def change_amounts(self, amount_deltas,
+                       batch_size=AMOUNT_UPDATE_BATCH_SIZE):
+        '''Применяет словарь {id: изменение} пачками UPDATE ... CASE.
+        Строки, где остаток стал бы отрицательным или больше
+        PRODUCT_AMOUNT_MAX, не меняются.
+        Возвращает число измененных строк'''
+
+        date_updated = timezone.now()
+        items = list(amount_deltas.items())
+        updated = 0
+        for start in range(0, len(items), batch_size):
+            batch = dict(items[start:start + batch_size])
+            amount_delta = models.Case(
+                *(models.When(pk=pk, then=models.Value(delta))
+                  for pk, delta in batch.items()),
+                output_field=models.IntegerField())
+            new_amount = models.F('amount') + amount_delta
+            products = self.filter(pk__in=batch)
+            with ProductTypeStats.objects.using(self.db).track(products), \
+                    StockMovement.objects.using(self.db).record(
+                        products, StockMovementReasons.AMOUNT):
+                updated += self.filter(
+                    GreaterThanOrEqual(new_amount, 0),
+                    LessThanOrEqual(new_amount, PRODUCT_AMOUNT_MAX),
+                    pk__in=batch,
+                ).update(amount=new_amount, date_updated=date_updated)
+                products_changed.send(sender=self.model, pks=list(batch))
+        return updated
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        '''Как save() для многих товаров: обновляет date_updated,
+        учитывает изменения в ProductTypeStats и журнале StockMovement
+        и отправляет products_changed. Пачки по batch_size'''
+
+        objs = list(objs)
+        batch_size = batch_size or settings.BULK_CREATE_BATCH_SIZE
+        fields = list(dict.fromkeys((*fields, 'date_updated')))
+        date_updated = timezone.now()
+        updated = 0
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            for obj in batch:
+                obj.date_updated = date_updated
+            pks = [obj.pk for obj in batch]
+            products = self.filter(pk__in=pks)
+            with ProductTypeStats.objects.using(self.db).track(products), \
+                    StockMovement.objects.using(self.db).record(
+                        products, StockMovementReasons.UPDATE):
+                updated += super().bulk_update(batch, fields)
+                products_changed.send(sender=self.model, pks=pks)
+        return updated
+
+    def deactivate(self, batch_size=None):
+        '''Снимает с продажи активные товары выборки: один UPDATE
+        на пачку из batch_size id, все пачки в одной транзакции.
+        Возвращает число измененных товаров'''
+
+        batch_size = batch_size or settings.BULK_CREATE_BATCH_SIZE
+        date_updated = timezone.now()
+        updated = 0
+        with transaction.atomic(using=self.db):
+            for batch in self._pk_batches(batch_size, is_active=True):
+                products = self.model.objects.using(self.db).filter(
+                    pk__in=batch)
+                with ProductTypeStats.objects.using(self.db).track(
+                        products):
+                    updated += products.update(is_active=False,
+                                               date_updated=date_updated)
+                products_changed.send(sender=self.model, pks=batch)
+        return updated
+
+    def bulk_delete(self, batch_size=None):
+        '''Удаляет товары выборки вместе с ценами без загрузки
+        экземпляров и сигналов удаления на каждую строку: DELETE цен
+        и товаров на пачку из batch_size id, все пачки в одной
+        транзакции. Агрегаты, журнал остатков и ленту изменений
+        обновляет так же, как удаление по одному. Возвращает число
+        удаленных товаров'''
+
+        # Строки удаляются без Collector: каскад на цены выполняется
+        # явно, другие обратные связи товара не должны ничего удалять
+        assert cascading_relations(self.model) == {ProductPrice}
+        assert not cascading_relations(ProductPrice)
+        batch_size = batch_size or settings.BULK_CREATE_BATCH_SIZE
+        amount_index = STATS_FIELDS.index('amount')
+        deleted = 0
+        with transaction.atomic(using=self.db):
+            for batch in self._pk_batches(batch_size):
+                products = self.model.objects.using(self.db).filter(
+                    pk__in=batch)
+                locked = products.select_for_update()
+                rows = {row[0]: row[1:] for row in locked.values_list(
+                    'pk', *STATS_FIELDS)}
+                # Последствия удаления применяются ниже сразу ко всей
+                # пачке, поэтому строки удаляются без Collector и сигналов
+                ProductPrice.objects.using(self.db).filter(
+                    product_id__in=batch)._raw_delete(self.db)
+                deleted += products._raw_delete(self.db)
+                # Границы цен пересчитываются уже без удаленных товаров
+                ProductTypeStats.objects.using(self.db).apply(
+                    rows.values(), ())
+                StockMovement.objects.using(self.db).bulk_create(
+                    StockMovement(product_id=pk, delta=-row[amount_index],
+                                  reason=StockMovementReasons.DELETE)
+                    for pk, row in rows.items() if row[amount_index])
+                products_changed.send(sender=self.model, pks=batch,
+                                      deleted=True)
+        return deleted
+
+    def _pk_batches(self, batch_size, **filters):
+        '''id выборки пачками по batch_size по возрастанию. Каждая
+        пачка читается отдельным запросом после последнего id
+        предыдущей: все id не держатся в памяти, а изменение
+        и удаление уже обработанных строк не сбивают обход'''
+
+        pks = self.filter(**filters).order_by('pk').values_list(
+            'pk', flat=True)
+        batch = list(pks[:batch_size])
+        while batch:
+            yield batch
+            batch = list(pks.filter(pk__gt=batch[-1])[:batch_size])
+
+    def sync_prices(self, **columns):
+        '''Копирует id, цену и валюту из ProductPrice в столбцы price_*
+        товаров и пересчитывает цену в базовой валюте одним UPDATE.
+        columns — другие столбцы, записываемые тем же UPDATE.
+        Возвращает число обновленных строк'''
+
+        prices = ProductPrice.objects.filter(
+            product=models.OuterRef('pk')).annotate(
+            base=ExchangeRate.objects.to_base('price', 'currency'))
+        with ProductTypeStats.objects.using(self.db).track(self):
+            return self.update(price_base=models.Subquery(
+                prices.values('base')[:1]), **columns, **{
+                column: models.Subquery(prices.values(field)[:1])
+                for field, column in DENORMALIZED_PRICE_FIELDS.items()})
+
+    def bulk_create(self, objs, batch_size=None, **kwargs):
+        '''Добавленные (и обновленные при update_conflicts) товары
+        учитываются в агрегатах ProductTypeStats и журнале StockMovement,
+        о них отправляется products_changed. Вклад товаров читается
+        по штрихкодам пачками по batch_size'''
+
+        objs = list(objs)
+        batch_size = batch_size or settings.BULK_CREATE_BATCH_SIZE
+        for start in range(0, len(objs), batch_size):
+            batch = objs[start:start + batch_size]
+            products = self.filter(
+                barcode__in=[obj.barcode for obj in batch])
+            # Без *_conflicts существующий штрихкод — ошибка
+            created = not (kwargs.get('update_conflicts')
+                           or kwargs.get('ignore_conflicts'))
+            with ProductTypeStats.objects.using(self.db).track(
+                    products, created=created), \
+                    StockMovement.objects.using(self.db).record(
+                        products, StockMovementReasons.BULK_CREATE,
+                        created=created):
+                super().bulk_create(batch, batch_size=batch_size, **kwargs)
+                pks = [obj.pk for obj in batch if obj.pk is not None]
+                if len(pks) < len(batch):
+                    # Бэкенд не вернул id (или конфликт пропущен)
+                    pks = list(products.values_list('pk', flat=True))
+                products_changed.send(sender=self.model, pks=pks)
+        return objs
+
+    def bulk_create_with_prices(self, rows, batch_size=None, upsert=False):
+        '''Создает товары вместе с ценами пачками по batch_size.
+        rows — пары (данные товара, данные цены). В режиме upsert
+        товары с уже существующим штрихкодом обновляются на месте'''
+
+        batch_size = batch_size or settings.BULK_CREATE_BATCH_SIZE
+        product_conflicts, price_conflicts = {}, {}
+        if upsert:
+            product_conflicts = {'update_conflicts': True,
+                                 'unique_fields': ('barcode',),
+                                 'update_fields': UPSERT_UPDATE_FIELDS}
+            price_conflicts = {'update_conflicts': True,
+                               'unique_fields': ('product',),
+                               'update_fields': ('price', 'currency')}
+        products = []
+        with transaction.atomic(using=self.db):
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                batch_products = [self.model(**product_data)
+                                  for product_data, _ in batch]
+                # Товары и цены пачки учитываются в агрегатах один раз
+                with ProductTypeStats.objects.using(self.db).track(
+                        self.filter(barcode__in=[
+                            product.barcode for product in batch_products]),
+                        created=not upsert):
+                    self._bulk_create_returning_pks(batch_products,
+                                                    **product_conflicts)
+                    ProductPrice.objects.using(self.db).bulk_create(
+                        [ProductPrice(product=product, **price_data)
+                         for product, (_, price_data) in zip(
+                             batch_products, batch)],
+                        **price_conflicts)
+                products.extend(batch_products)
+        return products
+
+    def _bulk_create_returning_pks(self, products, **kwargs):
+        '''На бэкендах без INSERT ... RETURNING bulk_create не проставляет
+        pk, поэтому перечитываем id вставленных строк по штрихкоду'''
+
+        self.bulk_create(products, **kwargs)
+        if connections[self.db].features.can_return_rows_from_bulk_insert:
+            return products
+        pks_by_barcode = dict(self.filter(
+            barcode__in=[product.barcode for product in products]
+        ).values_list('barcode', 'pk'))
+        for product in products:
+            product.pk = pks_by_barcode[product.barcode]
+        return products
+
+
+class Currencies(models.TextChoices):
+    RUB = 'rub', 'Рубль'
+    DOLLAR = 'dollar', 'Доллар'
+    EURO = 'euro', 'Евро'
+    YUAN = 'yuan', 'Юань'
+
+
+class ProductModified(Exception):
+    '''Товар изменен после того, как клиент его прочитал'''
+
 
 class Product(models.Model):
     name = models.CharField('Название',
@@ -15,21 +310,103 @@ class Product(models.Model):
     barcode = models.CharField('Штрихкод', max_length=max(BARCODE_LENGTH_1,
                                                           BARCODE_LENGTH_2),
                                validators=(barcode_regex_validator,),
-                               db_index=True)
+                               unique=True)
     date_updated = models.DateTimeField('Дата обновления', auto_now=True)
     type = models.ForeignKey('ProductType', on_delete=models.PROTECT,
                              verbose_name='Тип товара')
     is_active = models.BooleanField('Активный', default=True)
+    # Копия цены из ProductPrice, чтобы список товаров фильтровался
+    # и сортировался по цене без JOIN (PRODUCT_DENORMALIZED_PRICE).
+    # Пишется только вместе с ProductPrice, см. sync_prices
+    price_pk = models.BigIntegerField('id цены', null=True, editable=False)
+    price_amount = models.DecimalField('Цена', max_digits=PRICE_MAX_DIGITS,
+                                       decimal_places=PRICE_DECIMAL_PLACES,
+                                       null=True, editable=False)
+    price_currency = models.CharField(
+        'Валюта', max_length=max(map(len, Currencies.values)),
+        choices=Currencies.choices, null=True, editable=False)
+    # Цена в BASE_CURRENCY по текущему курсу: по ней фильтруется
+    # и сортируется список с ?target_currency=. None, если курса нет
+    price_base = models.DecimalField(
+        'Цена в базовой валюте', max_digits=BASE_PRICE_MAX_DIGITS,
+        decimal_places=PRICE_DECIMAL_PLACES, null=True, editable=False)
+
+    objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'товар'
         verbose_name_plural = 'Товары'
         ordering = ('-date_updated',)
+        # Индексы под keyset-пагинацию: поле сортировки + id
+        indexes = (
+            models.Index(fields=('-date_updated', '-id'),
+                         name='product_date_updated_id_idx'),
+            models.Index(fields=('name', 'id'), name='product_name_id_idx'),
+            # Фильтр is_active вместе с сортировкой и диапазоном по дате
+            models.Index(fields=('is_active', '-date_updated', '-id'),
+                         name='product_active_updated_id_idx'),
+            # Частичный индекс только по активным товарам: меньше и
+            # быстрее, где СУБД его поддерживает (SQLite, PostgreSQL)
+            models.Index(fields=('-date_updated', '-id'),
+                         condition=models.Q(is_active=True),
+                         name='product_active_only_idx'),
+            # Те же сценарии по денормализованной цене
+            models.Index(fields=('price_amount', 'id'),
+                         name='product_price_amount_id_idx'),
+            models.Index(fields=('price_currency', 'price_amount'),
+                         name='product_price_currency_idx'),
+            models.Index(fields=('price_base', 'id'),
+                         name='product_price_base_id_idx'),
+            # Пересчет минимальной и максимальной цены ProductTypeStats
+            models.Index(fields=('type', 'price_currency', 'price_amount'),
+                         name='product_type_price_idx'),
+        )
 
     def __str__(self):
         name = self.name
         return name[:LEN_LIM] + '...' if len(name) > LEN_LIM else name
 
+    def save(self, *args, expected_date_updated=None, **kwargs):
+        '''Столбцы price_* при сохранении товара не пишутся: экземпляр
+        мог быть загружен до изменения цены и затер бы новую цену.
+        С expected_date_updated (список значений date_updated, при
+        которых клиент читал товар) строка меняется, только если она
+        с тех пор не менялась, иначе — ProductModified'''
+
+        self._expected_date_updated = expected_date_updated
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in PRICE_COLUMNS]
+        products = (Product.objects.filter(barcode=self.barcode)
+                    if self._state.adding
+                    else Product.objects.filter(pk=self.pk))
+        reason = (StockMovementReasons.CREATE if self._state.adding
+                  else StockMovementReasons.UPDATE)
+        try:
+            with ProductTypeStats.objects.track(products), \
+                    StockMovement.objects.record(products, reason):
+                super().save(*args, **kwargs)
+        finally:
+            self._expected_date_updated = None
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields,
+                   forced_update):
+        '''Проверка версии и запись — один условный UPDATE:
+        без блокировки строки между чтением и записью'''
+
+        expected = getattr(self, '_expected_date_updated', None)
+        if expected is None:
+            return super()._do_update(base_qs, using, pk_val, values,
+                                      update_fields, forced_update)
+        filtered = base_qs.filter(pk=pk_val)
+        if filtered.filter(date_updated__in=expected)._update(values):
+            return True
+        if filtered.exists():
+            raise ProductModified
+        return False
+
 
 class ProductType(models.Model):
     name = models.CharField('Название',
@@ -46,12 +423,37 @@ class ProductType(models.Model):
         return name[:LEN_LIM] + '...' if len(name) > LEN_LIM else name
 
 
+class ProductPriceQuerySet(models.QuerySet):
+    '''Массовые записи цен в той же транзакции
+    обновляют копию цены в столбцах price_* товаров'''
+
+    def bulk_create(self, objs, batch_size=None, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, batch_size=batch_size, **kwargs)
+            self._sync_products([obj.product_id for obj in objs],
+                                batch_size)
+        return objs
+
+    def update(self, **kwargs):
+        with transaction.atomic(using=self.db, savepoint=False):
+            product_ids = list(self.values_list('product_id', flat=True))
+            updated = super().update(**kwargs)
+            # Как ProductPrice.save(): изменение цены меняет и версию
+            # товара, по которой строятся ETag и If-Match
+            self._sync_products(product_ids, date_updated=timezone.now())
+            products_changed.send(sender=Product, pks=product_ids)
+        return updated
+
+    def _sync_products(self, product_ids, batch_size=None, **columns):
+        batch_size = batch_size or settings.BULK_CREATE_BATCH_SIZE
+        for start in range(0, len(product_ids), batch_size):
+            Product.objects.using(self.db).filter(
+                pk__in=product_ids[start:start + batch_size]).sync_prices(
+                **columns)
+
+
 class ProductPrice(models.Model):
-    class Currencies(models.TextChoices):
-        RUB = 'rub', 'Рубль'
-        DOLLAR = 'dollar', 'Доллар'
-        EURO = 'euro', 'Евро'
-        YUAN = 'yuan', 'Юань'
+    Currencies = Currencies
 
     currency = models.CharField(
         'Валюта',
@@ -64,10 +466,530 @@ class ProductPrice(models.Model):
     product = models.OneToOneField(Product, on_delete=models.CASCADE,
                                    related_name='price', verbose_name='Товар')
 
+    objects = ProductPriceQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'стоимость'
         verbose_name_plural = 'Стоимости'
         ordering = ('price',)
+        # product_id совпадает с id товара и служит вторым ключом
+        # keyset-пагинации по цене
+        indexes = (
+            models.Index(fields=('price', 'product'),
+                         name='price_price_product_idx'),
+            models.Index(fields=('currency', 'price'),
+                         name='price_currency_price_idx'),
+        )
 
     def __str__(self):
         return f'{self.price} {self.get_currency_display()}'
+
+    def save(self, *args, **kwargs):
+        '''В той же транзакции копирует цену в столбцы price_* товара.
+        Изменение цены обновляет и дату изменения товара:
+        по ней строятся ETag и Last-Modified ответов API'''
+
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            columns = self.get_product_columns()
+            if not adding:
+                columns['date_updated'] = timezone.now()
+            if self._meta.get_field('product').is_cached(self):
+                for column, value in columns.items():
+                    setattr(self.product, column, value)
+            products = Product.objects.filter(pk=self.product_id)
+            with ProductTypeStats.objects.track(products):
+                products.update(**columns)
+
+    def get_product_columns(self, delete=False):
+        '''Значения столбцов price_* товара для этой цены
+        (None для всех, если цена удаляется)'''
+
+        if delete:
+            return dict.fromkeys(PRICE_COLUMNS)
+        columns = {column: getattr(self, field)
+                   for field, column in DENORMALIZED_PRICE_FIELDS.items()}
+        rate = ExchangeRate.objects.get_rate(self.currency)
+        price = self._meta.get_field('price').to_python(self.price)
+        columns['price_base'] = (
+            None if rate is None
+            else (price * rate).quantize(Decimal(1).scaleb(
+                -PRICE_DECIMAL_PLACES)))
+        return columns
+
+
+def round_base_price(expression):
+    '''Цена в BASE_CURRENCY, округленная в SQL до точности столбца
+    price_base: иначе SQLite хранит все знаки произведения на курс,
+    и фильтры и сортировка по price_base сравнивают неокругленные
+    значения'''
+
+    return Round(expression, PRICE_DECIMAL_PLACES,
+                 output_field=models.DecimalField(
+                     max_digits=BASE_PRICE_MAX_DIGITS,
+                     decimal_places=PRICE_DECIMAL_PLACES))
+
+
+class ExchangeRateQuerySet(models.QuerySet):
+    def get_rate(self, currency):
+        '''Стоимость единицы валюты в BASE_CURRENCY
+        или None, если курс не задан'''
+
+        if currency == BASE_CURRENCY:
+            return Decimal(1)
+        return self.filter(currency=currency).values_list(
+            'rate', flat=True).first()
+
+    def to_base(self, price_field, currency_field):
+        '''Выражение для цены в BASE_CURRENCY по полям цены и валюты
+        (NULL, если курса нет)'''
+
+        rate = self.filter(currency=models.OuterRef(currency_field))
+        return models.Case(
+            models.When(**{currency_field: BASE_CURRENCY},
+                        then=models.F(price_field)),
+            default=round_base_price(models.F(price_field) * models.Subquery(
+                rate.values('rate')[:1])),
+            output_field=models.DecimalField(
+                max_digits=BASE_PRICE_MAX_DIGITS,
+                decimal_places=PRICE_DECIMAL_PLACES))
+
+
+class ExchangeRate(models.Model):
+    currency = models.CharField(
+        'Валюта', max_length=max(map(len, Currencies.values)),
+        choices=Currencies.choices, unique=True)
+    rate = models.DecimalField(
+        'Курс', max_digits=EXCHANGE_RATE_MAX_DIGITS,
+        decimal_places=EXCHANGE_RATE_DECIMAL_PLACES,
+        validators=(MinValueValidator(Decimal('0.000001')),),
+        help_text='Стоимость единицы валюты в базовой валюте')
+    date_updated = models.DateTimeField('Дата обновления', auto_now=True)
+
+    objects = ExchangeRateQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'курс валюты'
+        verbose_name_plural = 'Курсы валют'
+        ordering = ('currency',)
+        constraints = (
+            models.CheckConstraint(
+                condition=~models.Q(currency=BASE_CURRENCY),
+                name='exchange_rate_not_base_currency'),
+        )
+
+    def __str__(self):
+        return f'{self.get_currency_display()}: {self.rate}'
+
+    def clean(self):
+        if self.currency == BASE_CURRENCY:
+            raise ValidationError(
+                {'currency': 'Курс базовой валюты всегда равен 1'})
+
+    def save(self, *args, **kwargs):
+        '''В той же транзакции пересчитывает цену в базовой валюте
+        у всех товаров этой валюты одним UPDATE'''
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Product.objects.filter(price_currency=self.currency).update(
+                price_base=round_base_price(
+                    models.F('price_amount') * self.rate))
+
+
+class ProductSearchIndex(models.Model):
+    '''FTS5-таблица полнотекстового поиска (только SQLite).
+    Создается и наполняется миграцией 0007 (там же DDL триггеров),
+    поиск — products.search'''
+
+    product = models.OneToOneField(
+        Product, on_delete=models.DO_NOTHING, primary_key=True,
+        db_column='rowid', db_constraint=False, related_name='search_index')
+    # Скрытый столбец FTS5 с именем таблицы: по нему ищут через MATCH
+    document = models.TextField(db_column='products_product_fts')
+    # Скрытый столбец bm25-ранга: тем меньше, чем релевантнее строка
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'products_product_fts'
+
+
+def cascading_relations(model):
+    '''Модели, строки которых удаление model затрагивает через
+    on_delete (все, кроме DO_NOTHING)'''
+
+    return {relation.related_model
+            for relation in model._meta.related_objects
+            if relation.on_delete is not models.DO_NOTHING}
+
+
+def to_cents(price):
+    return int(price * 100)
+
+
+class ProductTypeStatsQuerySet(models.QuerySet):
+    @contextmanager
+    def track(self, products, created=False):
+        '''Применяет к агрегатам разницу вклада товаров из products
+        до и после изменений внутри блока, в той же транзакции.
+        Вложенный track ничего не делает: внешний блок должен
+        охватывать все товары, которые меняются внутри. created=True —
+        товаров products до блока нет, их вклад не читается'''
+
+        if stats_tracking.get():
+            yield
+            return
+        token = stats_tracking.set(True)
+        try:
+            with transaction.atomic(using=self.db, savepoint=False):
+                before = () if created else list(
+                    products.select_for_update().values_list(*STATS_FIELDS))
+                yield
+                self.apply(before, products.values_list(*STATS_FIELDS))
+        finally:
+            stats_tracking.reset(token)
+
+    @contextmanager
+    def paused(self):
+        '''Отключает track внутри блока: для массовых исправлений данных,
+        после которых агрегаты пересчитываются через rebuild'''
+
+        token = stats_tracking.set(True)
+        try:
+            yield
+        finally:
+            stats_tracking.reset(token)
+
+    def add_amount(self, products, amount_delta):
+        '''Изменение количества одного товара: один UPDATE строки
+        агрегата, найденной подзапросами по типу и валюте товара'''
+
+        return self.filter(
+            type=models.Subquery(products.values('type')[:1]),
+            currency=Coalesce(
+                models.Subquery(products.values('price_currency')[:1]),
+                models.Value('')),
+        ).update(amount_total=models.F('amount_total') + amount_delta)
+
+    def apply(self, before, after):
+        '''Вычитает из агрегатов вклад строк before и добавляет вклад
+        after. Строки — значения STATS_FIELDS товаров'''
+
+        changes = defaultdict(Counter)
+        prices = defaultdict(Counter)
+        for sign, rows in ((-1, before), (1, after)):
+            for type_id, currency, price, amount, is_active in rows:
+                group = (type_id, currency or '')
+                changes[group].update(product_count=sign,
+                                      active_count=sign * is_active,
+                                      amount_total=sign * amount)
+                if price is not None:
+                    changes[group]['price_sum'] += sign * to_cents(price)
+                    prices[group][price] += sign
+        changes = {group: {field: delta for field, delta in change.items()
+                           if delta}
+                   for group, change in changes.items()}
+        groups = [group for group, change in changes.items()
+                  if change or any(prices[group].values())]
+        if not groups:
+            return
+        self.bulk_create([self.model(type_id=type_id, currency=currency)
+                          for type_id, currency in groups],
+                         ignore_conflicts=True)
+        for group in groups:
+            values = {field: models.F(field) + delta
+                      for field, delta in changes[group].items()}
+            added = [price for price, count in prices[group].items()
+                     if count > 0]
+            if any(count < 0 for count in prices[group].values()):
+                # Ушедшая цена могла быть границей: ищем новые по индексу
+                values.update(self.get_price_bounds(*group))
+            elif added:
+                values.update(
+                    price_min=Least(Coalesce('price_min', min(added)),
+                                    min(added)),
+                    price_max=Greatest(Coalesce('price_max', max(added)),
+                                       max(added)))
+            self.filter(type_id=group[0], currency=group[1]).update(
+                **values)
+
+    def get_price_bounds(self, type_id, currency):
+        '''Минимальная и максимальная цена группы: два поиска
+        по индексу (type, price_currency, price_amount)'''
+
+        prices = Product.objects.using(self.db).filter(
+            type_id=type_id, price_currency=currency
+        ).order_by('price_amount').values_list('price_amount', flat=True)
+        return {'price_min': prices.first(), 'price_max': prices.last()}
+
+    def rebuild(self):
+        '''Пересчитывает все агрегаты одним GROUP BY по товарам'''
+
+        with transaction.atomic(using=self.db):
+            self.all().delete()
+            return self.bulk_create(
+                self.model(**values) for values in type_stats_values(
+                    Product.objects.using(self.db)))
+
+
+def type_stats_values(products):
+    '''Значения полей ProductTypeStats для товаров products одним
+    GROUP BY'''
+
+    groups = products.order_by().values('type', 'price_currency').annotate(
+        product_count=models.Count('pk'),
+        active_count=models.Count('pk', filter=models.Q(is_active=True)),
+        amount_total=Coalesce(models.Sum('amount'), 0),
+        # Сумма в копейках: каждое слагаемое целое, ошибки
+        # округления чисел с плавающей точкой не накапливаются
+        price_sum=Coalesce(models.Sum(
+            Round(models.F('price_amount') * 100)), 0,
+            output_field=models.DecimalField()),
+        price_min=models.Min('price_amount'),
+        price_max=models.Max('price_amount'))
+    for group in groups:
+        yield {'type_id': group.pop('type'),
+               'currency': group.pop('price_currency') or '',
+               'price_sum': int(group.pop('price_sum')), **group}
+
+
+class ProductTypeStats(models.Model):
+    '''Агрегаты товаров одного типа в одной валюте (currency='' —
+    товары без цены). Поддерживаются при каждой записи товара и цены,
+    поэтому статистика типа читается без обхода товаров'''
+
+    type = models.ForeignKey(ProductType, on_delete=models.CASCADE,
+                             related_name='stats', verbose_name='Тип товара')
+    currency = models.CharField(
+        'Валюта', max_length=max(map(len, Currencies.values)),
+        choices=Currencies.choices, blank=True)
+    product_count = models.PositiveIntegerField('Товаров', default=0)
+    active_count = models.PositiveIntegerField('Активных', default=0)
+    amount_total = models.PositiveBigIntegerField('Количество', default=0)
+    price_sum = models.BigIntegerField('Сумма цен, коп.', default=0)
+    price_min = models.DecimalField(
+        'Минимальная цена', max_digits=PRICE_MAX_DIGITS,
+        decimal_places=PRICE_DECIMAL_PLACES, null=True)
+    price_max = models.DecimalField(
+        'Максимальная цена', max_digits=PRICE_MAX_DIGITS,
+        decimal_places=PRICE_DECIMAL_PLACES, null=True)
+
+    objects = ProductTypeStatsQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'статистика типа товаров'
+        verbose_name_plural = 'Статистика типов товаров'
+        constraints = (
+            models.UniqueConstraint(fields=('type', 'currency'),
+                                    name='product_type_stats_unique'),
+        )
+
+    @property
+    def price_avg(self):
+        if not self.product_count or not self.currency:
+            return None
+        return (Decimal(self.price_sum) / 100 / self.product_count).quantize(
+            Decimal(1).scaleb(-PRICE_DECIMAL_PLACES))
+
+
+class StockMovementReasons(models.TextChoices):
+    INITIAL = 'initial', 'Начальный остаток'
+    CREATE = 'create', 'Добавление товара'
+    UPDATE = 'update', 'Изменение товара'
+    AMOUNT = 'amount', 'Изменение количества'
+    BULK_CREATE = 'bulk_create', 'Массовое добавление'
+    DELETE = 'delete', 'Удаление товара'
+
+
+def start_of_day(date):
+    return datetime.combine(date, time.min, tzinfo=dt_timezone.utc)
+
+
+class StockMovementQuerySet(models.QuerySet):
+    @contextmanager
+    def record(self, products, reason, created=False):
+        '''Записывает в журнал изменения количества товаров из products
+        внутри блока, в той же транзакции: разницу amount до и после.
+        created=True — товаров products до блока нет'''
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            before = {} if created else dict(
+                products.select_for_update().values_list('pk', 'amount'))
+            yield
+            self.bulk_create(
+                self.model(product_id=pk, reason=reason,
+                           delta=amount - before.get(pk, 0))
+                for pk, amount in products.values_list('pk', 'amount')
+                if amount != before.get(pk, 0))
+
+    def amount_as_of(self, product_id, moment):
+        '''Количество товара на момент moment: последний дневной снимок
+        до этого момента плюс движения после снимка. Для свернутых
+        движений точность — начало дня'''
+
+        snapshot = StockSnapshot.objects.using(self.db).filter(
+            product_id=product_id,
+            date__lt=moment.astimezone(dt_timezone.utc).date(),
+        ).order_by('-date').values_list('date', 'amount').first()
+        movements = self.filter(product_id=product_id,
+                                created_at__lte=moment)
+        amount = 0
+        if snapshot is not None:
+            date, amount = snapshot
+            movements = movements.filter(
+                created_at__gte=start_of_day(date + timedelta(days=1)))
+        return amount + movements.aggregate(
+            total=Coalesce(models.Sum('delta'), 0))['total']
+
+    def compact(self, before, batch_size=STOCK_COMPACTION_BATCH_SIZE):
+        '''Сворачивает движения до даты before (по UTC) в снимки
+        StockSnapshot — количество на конец каждого дня, в который
+        товар менялся, — и удаляет эти движения.
+        Возвращает (число снимков, число удаленных движений)'''
+
+        old = self.filter(created_at__lt=start_of_day(before))
+        latest_snapshot = StockSnapshot.objects.using(self.db).filter(
+            product_id=models.OuterRef('product_id')
+        ).order_by('-date').values('amount')[:1]
+        days = old.annotate(
+            date=TruncDate('created_at', tzinfo=dt_timezone.utc)
+        ).values('product_id', 'date').annotate(
+            delta=models.Sum('delta'),
+            base=models.Subquery(latest_snapshot),
+        ).order_by('product_id', 'date').values_list(
+            'product_id', 'date', 'delta', 'base')
+        snapshots = StockSnapshot.objects.using(self.db)
+        created = 0
+        with transaction.atomic(using=self.db):
+            batch = []
+            product_id = amount = None
+            for row_product_id, date, delta, base in days.iterator():
+                if row_product_id != product_id:
+                    product_id, amount = row_product_id, base or 0
+                amount += delta
+                batch.append(StockSnapshot(product_id=product_id,
+                                           date=date, amount=amount))
+                if len(batch) >= batch_size:
+                    created += len(snapshots.bulk_create(batch))
+                    batch = []
+            created += len(snapshots.bulk_create(batch))
+            deleted, _ = old.delete()
+        return created, deleted
+
+
+class StockMovement(models.Model):
+    '''Журнал изменений количества товаров: строки только добавляются
+    в той же транзакции, что и изменение amount. Старые движения
+    сворачиваются в StockSnapshot командой compact_stock_movements.
+    Связь без внешнего ключа: история переживает удаление товара'''
+
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='stock_movements', verbose_name='Товар')
+    delta = models.IntegerField('Изменение')
+    reason = models.CharField(
+        'Причина', max_length=max(map(len, StockMovementReasons.values)),
+        choices=StockMovementReasons.choices)
+    created_at = models.DateTimeField('Дата', auto_now_add=True)
+
+    objects = StockMovementQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'движение товара'
+        verbose_name_plural = 'Движения товаров'
+        indexes = (
+            # Хвост после снимка для одного товара
+            models.Index(fields=('product', 'created_at'),
+                         name='stock_movement_product_idx'),
+            # Выбор движений для сворачивания
+            models.Index(fields=('created_at',),
+                         name='stock_movement_created_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.product_id}: {self.delta:+d}'
+
+
+class StockSnapshot(models.Model):
+    '''Количество товара на конец дня date (UTC) по свернутым
+    движениям. Снимок есть только за дни, когда товар менялся'''
+
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False,
+        related_name='stock_snapshots', verbose_name='Товар')
+    date = models.DateField('Дата')
+    amount = models.PositiveIntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'снимок остатка'
+        verbose_name_plural = 'Снимки остатков'
+        constraints = (
+            models.UniqueConstraint(fields=('product', 'date'),
+                                    name='stock_snapshot_unique'),
+        )
+
+    def __str__(self):
+        return f'{self.product_id} на {self.date}: {self.amount}'
+
+
+class CatalogObjects(models.TextChoices):
+    PRODUCT = 'product', 'Товар'
+    PRODUCT_TYPE = 'product_type', 'Тип товара'
+
+
+class CatalogChangeQuerySet(models.QuerySet):
+    def record(self, object_type, pks, deleted=False):
+        '''Записывает изменение объектов pks с новыми seq и удаляет
+        их прежние записи: у объекта в ленте одна запись — последняя,
+        поэтому лента растет с числом объектов, а не изменений.
+        Вызывается в транзакции самого изменения.
+
+        На PostgreSQL seq выдается под advisory-блокировкой до конца
+        транзакции: записи ленты фиксируются в порядке seq, и читатель
+        не получит токен, за которым позже появится меньший seq.
+        Цена — записи в каталог сериализуются от вызова record до
+        фиксации. На SQLite записи сериализуются и так'''
+
+        pks = list(dict.fromkeys(pks))
+        if not pks:
+            return
+        with transaction.atomic(using=self.db, savepoint=False):
+            connection = connections[self.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_xact_lock(%s)',
+                                   [CHANGE_FEED_LOCK_ID])
+            self.filter(object_type=object_type, object_id__in=pks).delete()
+            self.bulk_create(self.model(object_type=object_type,
+                                        object_id=pk, deleted=deleted)
+                             for pk in pks)
+
+
+class CatalogChange(models.Model):
+    '''Лента изменений каталога для инкрементальной синхронизации:
+    добавление, изменение (в том числе цены и количества) и удаление
+    товаров и типов товаров. seq монотонно растет (AUTOINCREMENT),
+    удаленный объект остается записью deleted=True'''
+
+    seq = models.BigAutoField(primary_key=True)
+    object_type = models.CharField(
+        'Объект', max_length=max(map(len, CatalogObjects.values)),
+        choices=CatalogObjects.choices)
+    object_id = models.BigIntegerField('id объекта')
+    deleted = models.BooleanField('Удален', default=False)
+    date_changed = models.DateTimeField('Дата изменения', auto_now_add=True)
+
+    objects = CatalogChangeQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'изменение каталога'
+        verbose_name_plural = 'Изменения каталога'
+        indexes = (
+            models.Index(fields=('object_type', 'object_id'),
+                         name='catalog_change_object_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.seq}: {self.object_type} {self.object_id}'
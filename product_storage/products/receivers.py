@@ -0,0 +1,91 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import (STATS_FIELDS, CatalogChange, CatalogObjects, ExchangeRate,
+                     Product, ProductPrice, ProductType, ProductTypeStats,
+                     StockMovement, StockMovementReasons)
+from .signals import products_changed
+
+
+def is_product_deletion(origin):
+    '''Удаление запущено для товаров, а не для самих цен'''
+
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is Product
+
+
+@receiver(post_delete, sender=ProductPrice)
+def clear_product_price_columns(sender, instance, origin=None, **kwargs):
+    '''Удаление цены (в том числе QuerySet.delete() из админки)
+    очищает ее копию в столбцах товара. При удалении самого товара
+    цена удаляется каскадом, и обновлять его строку незачем'''
+
+    if is_product_deletion(origin):
+        return
+    products = Product.objects.filter(pk=instance.product_id)
+    with ProductTypeStats.objects.track(products):
+        products.update(**instance.get_product_columns(delete=True))
+
+
+@receiver(pre_delete, sender=Product)
+def remove_product_from_stats(sender, instance, **kwargs):
+    '''Вклад читается из БД до удаления: у экземпляра могли
+    устареть столбцы цены'''
+
+    ProductTypeStats.objects.apply(
+        Product.objects.filter(pk=instance.pk).values_list(*STATS_FIELDS),
+        ())
+
+
+@receiver(pre_delete, sender=Product)
+def record_product_deletion(sender, instance, **kwargs):
+    '''Остаток удаляемого товара списывается в журнале'''
+
+    amount = Product.objects.filter(pk=instance.pk).values_list(
+        'amount', flat=True).first()
+    if amount:
+        StockMovement.objects.create(product_id=instance.pk, delta=-amount,
+                                     reason=StockMovementReasons.DELETE)
+
+
+@receiver(post_delete, sender=ExchangeRate)
+def clear_product_base_prices(sender, instance, **kwargs):
+    '''Без курса цену товаров этой валюты перевести нельзя'''
+
+    Product.objects.filter(price_currency=instance.currency).update(
+        price_base=None)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def record_product_change(sender, instance, signal, **kwargs):
+    CatalogChange.objects.record(CatalogObjects.PRODUCT, [instance.pk],
+                                 deleted=signal is post_delete)
+
+
+@receiver(post_save, sender=ProductPrice)
+@receiver(post_delete, sender=ProductPrice)
+def record_product_price_change(sender, instance, origin=None, **kwargs):
+    '''Цена входит в ответ о товаре. При удалении товара
+    его запись в ленте добавит record_product_change'''
+
+    if not is_product_deletion(origin):
+        CatalogChange.objects.record(CatalogObjects.PRODUCT,
+                                     [instance.product_id])
+
+
+@receiver(products_changed)
+def record_changed_products(sender, pks, deleted=False, **kwargs):
+    CatalogChange.objects.record(CatalogObjects.PRODUCT, pks,
+                                 deleted=deleted)
+
+
+@receiver(post_save, sender=ProductType)
+@receiver(post_delete, sender=ProductType)
+def record_product_type_change(sender, instance, signal, **kwargs):
+    '''Изменение типа не меняет строки его товаров, поэтому
+    тип — отдельный объект ленты'''
+
+    CatalogChange.objects.record(CatalogObjects.PRODUCT_TYPE, [instance.pk],
+                                 deleted=signal is post_delete)
@@ -0,0 +1,70 @@
+'''Полнотекстовый поиск товаров по названию и штрихкоду.
+
+На SQLite используется внешняя FTS5-таблица products_product_fts,
+которую триггеры синхронизируют с products_product при любой записи,
+включая bulk_create и update(). На PostgreSQL — GIN-индекс по
+to_tsvector('simple', name || barcode), он обновляется самой СУБД.
+Таблицу, триггеры и индекс создает миграция 0007.
+Каждое слово запроса ищется по префиксу, результаты ранжируются.
+'''
+import re
+
+from django.db import connections
+from django.db.models import F, FloatField, Lookup, Q, Value
+
+from .models import ProductSearchIndex
+
+
+def get_search_vector():
+    from django.contrib.postgres.search import SearchVector
+
+    return SearchVector('name', 'barcode', config='simple')
+
+
+@ProductSearchIndex._meta.get_field('document').register_lookup
+class Match(Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+
+def get_terms(query):
+    '''Слова запроса без символов синтаксиса FTS'''
+
+    return re.findall(r'\w+', query.lower())
+
+
+def search_products(queryset, query):
+    '''Товары, у которых каждое слово запроса — префикс слова названия
+    или штрихкода, с аннотацией search_rank (больше — релевантнее)'''
+
+    terms = get_terms(query)
+    if not terms:
+        return queryset.none().annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+    match connections[queryset.db].vendor:
+        case 'sqlite':
+            # JOIN с FTS-таблицей: SQLite сначала выбирает совпадения
+            # из индекса, затем находит товары по первичному ключу
+            return queryset.filter(search_index__document__match=' '.join(
+                f'"{term}"*' for term in terms)
+            ).annotate(search_rank=-F('search_index__rank'))
+        case 'postgresql':
+            from django.contrib.postgres.search import SearchQuery, SearchRank
+
+            search_query = SearchQuery(
+                ' & '.join(f'{term}:*' for term in terms),
+                search_type='raw', config='simple')
+            return queryset.annotate(
+                search_vector=get_search_vector()
+            ).filter(search_vector=search_query).annotate(
+                search_rank=SearchRank(get_search_vector(), search_query))
+    # Прочие СУБД: без индекса, как раньше
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(barcode__startswith=term)
+    return queryset.filter(condition).annotate(
+        search_rank=Value(0.0, output_field=FloatField()))
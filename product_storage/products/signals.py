@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+# Отправляется массовыми операциями ProductQuerySet, которые меняют строки
+# в обход save() и поэтому не вызывают post_save, в транзакции изменения.
+# Аргументы: pks — id измененных товаров; deleted=True — товары удалены
+products_changed = Signal()
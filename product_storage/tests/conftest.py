@@ -1,15 +1,32 @@
 from http import HTTPStatus
 
 import pytest
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 from rest_framework.test import APIClient
 
+from api.cache import barcode_cache
 from products.models import Product, ProductPrice, ProductType
 
 User = get_user_model()
 
 
+@pytest.fixture(scope='session')
+def django_db_modify_db_settings(django_db_modify_db_settings_parallel_suffix):
+    '''SQLite для тестов параллельных запросов. Тестовая БД в файле:
+    shared-cache in-memory SQLite не ждет блокировок. Транзакции сразу
+    берут блокировку на запись, поэтому потоки теста ждут друг друга,
+    а не получают database is locked при повышении блокировки чтения'''
+
+    database = settings.DATABASES['default']
+    if database['ENGINE'] == 'django.db.backends.sqlite3':
+        database.setdefault('OPTIONS', {})['transaction_mode'] = 'IMMEDIATE'
+        database.setdefault('TEST', {})['NAME'] = (
+            settings.BASE_DIR / 'test_db.sqlite3')
+
+
 # ---------- INSTANCES ----------
 
 
@@ -18,6 +35,12 @@ def enable_db_access_for_all_tests(db):
     pass
 
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    barcode_cache.clear()
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -145,6 +168,21 @@ def product_bulk_create():
     return reverse('product-bulk-create')
 
 
+@pytest.fixture
+def product_export_url():
+    return reverse('product-export')
+
+
+@pytest.fixture
+def product_cache_stats_url():
+    return reverse('product-cache-stats')
+
+
+@pytest.fixture
+def product_bulk_update_amount_url():
+    return reverse('product-bulk-update-amount')
+
+
 @pytest.fixture
 def update_amount_url(product):
     return reverse('product-update-amount', args=(product.id,))
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management import call_command
+
+from products.models import Product
+
+
+def test_import_products_csv(product_type, tmp_path):
+    '''Тест проверяет импорт CSV с отчетом об ошибочных строках'''
+
+    path = tmp_path / 'products.csv'
+    path.write_text(
+        'name,amount,barcode,type,price,currency,is_active\n'
+        f'Телефон,5,12345678,{product_type.id},100.50,rub,1\n'
+        f'Планшет,3,123,{product_type.id},200,dollar,\n'
+        f'Ноутбук,-1,1234567890123,{product_type.id},300,rub,0\n'
+        f'Часы,1,87654321,0,50,euro,\n'
+        f'Наушники,2,11111111,{product_type.id},10,yuan,0\n',
+        encoding='utf-8')
+    errors_path = tmp_path / 'errors.csv'
+    call_command('import_products', str(path), batch_size=1,
+                 errors=str(errors_path))
+
+    assert dict(Product.objects.values_list('barcode', 'is_active')) == {
+        '12345678': True, '11111111': False}
+    product = Product.objects.get(barcode='12345678')
+    assert product.name == 'Телефон'
+    assert str(product.price.price) == '100.50'
+    error_lines = [line.split(',')[:2] for line in
+                   errors_path.read_text(encoding='utf-8').splitlines()[1:]]
+    assert error_lines == [['3', '123'], ['4', '1234567890123'],
+                           ['5', '87654321']]
+
+
+def test_import_products_duplicate_barcode(product_type, tmp_path):
+    '''Тест проверяет, что повтор штрихкода в пачке — ошибка строки,
+    а не молчаливая замена первой строки'''
+
+    path = tmp_path / 'products.csv'
+    path.write_text(
+        'name,amount,barcode,type,price,currency\n'
+        f'Телефон,5,12345678,{product_type.id},100,rub\n'
+        f'Планшет,3,87654321,{product_type.id},200,rub\n'
+        f'Копия,1,12345678,{product_type.id},1,rub\n',
+        encoding='utf-8')
+    errors_path = tmp_path / 'errors.csv'
+    call_command('import_products', str(path), errors=str(errors_path))
+
+    assert dict(Product.objects.values_list('barcode', 'name')) == {
+        '12345678': 'Телефон', '87654321': 'Планшет'}
+    assert errors_path.read_text(encoding='utf-8').splitlines()[1:] == [
+        '4,12345678,Штрихкод повторяет строку 2']
+
+
+def test_import_products_ndjson_upsert(product, product_type, tmp_path):
+    '''Тест проверяет импорт NDJSON с обновлением по штрихкоду'''
+
+    path = tmp_path / 'products.ndjson'
+    rows = [{'name': 'Nokia 3310', 'amount': 1, 'barcode': product.barcode,
+             'type': product_type.id,
+             'price': {'price': '1.00', 'currency': 'rub'}},
+            {'name': 'Siemens', 'amount': 2, 'barcode': '1234567890123',
+             'type': product_type.id, 'price': '2.00', 'currency': 'rub'}]
+    path.write_text('\n'.join(map(json.dumps, rows)) + '\nnot json\n',
+                    encoding='utf-8')
+    errors_path = tmp_path / 'errors.csv'
+    call_command('import_products', str(path), upsert=True,
+                 errors=str(errors_path))
+
+    assert Product.objects.count() == 2
+    product.refresh_from_db()
+    assert product.name == 'Nokia 3310'
+    assert product.amount == 1
+    assert len(errors_path.read_text(encoding='utf-8').splitlines()) == 2
@@ -1,7 +1,10 @@
 from decimal import Decimal
 from http import HTTPStatus
+from threading import Thread
 
 import pytest
+from django.db import connection
+from rest_framework.test import APIClient
 
 from products.models import Product
 
@@ -150,3 +153,119 @@ def test_delete_product(api_client_with_jwt, product, product_detail_url):
     response = api_client_with_jwt.delete(product_detail_url)
     assert response.status_code == HTTPStatus.NO_CONTENT
     assert Product.objects.count() == start_count - 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_update_product_amount_concurrent(user, product, update_amount_url):
+    '''Тест проверяет, что параллельные запросы не теряют изменения'''
+
+    threads_count, requests_per_thread = 8, 5
+    statuses = []
+
+    def worker():
+        client = APIClient()
+        client.force_authenticate(user)
+        for _ in range(requests_per_thread):
+            response = client.patch(update_amount_url, {'amount_delta': 1},
+                                    format='json')
+            statuses.append(response.status_code)
+        connection.close()
+
+    threads = [Thread(target=worker) for _ in range(threads_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(statuses) == {HTTPStatus.OK}
+    product.refresh_from_db()
+    assert product.amount == 50 + threads_count * requests_per_thread
+
+
+def test_bulk_update_product_amount(api_client_with_jwt, product_list,
+                                    product_bulk_update_amount_url):
+    '''Тест проверяет пакетное изменение количества по id и штрихкоду'''
+
+    car, laptop, banana = (Product.objects.get(name=name)
+                           for name in ('car', 'laptop', 'banana'))
+    data = {'items': [{'id': car.id, 'amount_delta': -10},
+                      {'barcode': laptop.barcode, 'amount_delta': 5},
+                      {'id': car.id, 'amount_delta': 3},
+                      {'id': banana.id, 'amount_delta': 0}]}
+    response = api_client_with_jwt.post(product_bulk_update_amount_url,
+                                        data, format='json')
+    assert response.status_code == HTTPStatus.OK, f'Response: {response.data}'
+    assert [el.get('amount') for el in response.data.get('items')] == [
+        car.amount - 7, laptop.amount + 5, car.amount - 7, banana.amount]
+    for product, expected in ((car, car.amount - 7),
+                              (laptop, laptop.amount + 5)):
+        product.refresh_from_db()
+        assert product.amount == expected
+
+
+def test_bulk_create_product_query_count(api_client_with_jwt, product_type,
+                                         product_bulk_create,
+                                         django_assert_max_num_queries):
+    '''Тест проверяет, что число запросов не зависит от числа товаров'''
+
+    data = {'products': [{'name': str(idx), 'amount': idx,
+                          'barcode': str(10000000 + idx),
+                          'price': {'price': 100, 'currency': 'rub'},
+                          'type': product_type.id} for idx in range(50)]}
+    # Из них 4 запроса — обновление агрегатов ProductTypeStats,
+    # по 2 — запись журнала StockMovement и ленты CatalogChange
+    with django_assert_max_num_queries(16):
+        response = api_client_with_jwt.post(product_bulk_create, data,
+                                            format='json')
+    assert response.status_code == HTTPStatus.CREATED, (
+        f'Response: {response.data}')
+    assert Product.objects.count() == 50
+
+
+def test_bulk_create_product_without_returning(
+        api_client_with_jwt, product_bulk_create_data, product_bulk_create,
+        monkeypatch):
+    '''Тест проверяет привязку цен к товарам на бэкендах
+    без INSERT ... RETURNING'''
+
+    monkeypatch.setattr(type(connection.features),
+                        'can_return_rows_from_bulk_insert', False)
+    data = product_bulk_create_data
+    response = api_client_with_jwt.post(product_bulk_create, data,
+                                        format='json')
+    assert response.status_code == HTTPStatus.CREATED, (
+        f'Response: {response.data}')
+    for product_data in data.get('products'):
+        product = Product.objects.get(barcode=product_data.get('barcode'))
+        assert product.name == product_data.get('name')
+        assert product.price.price == Decimal(
+            product_data.get('price').get('price'))
+    assert [el.get('id') for el in response.data.get('products')] == list(
+        Product.objects.order_by('id').values_list('id', flat=True))
+
+
+def test_bulk_create_product_upsert(api_client_with_jwt, product,
+                                    product_type_2, product_bulk_create):
+    '''Тест проверяет, что в режиме upsert существующий по штрихкоду
+    товар обновляется, а новый создается'''
+
+    data = {'upsert': True, 'products': [
+        {'name': 'Nokia 3310', 'amount': 7, 'barcode': product.barcode,
+         'price': {'price': 999, 'currency': 'euro'},
+         'type': product_type_2.id},
+        {'name': 'Siemens', 'amount': 3, 'barcode': '1234567890123',
+         'price': {'price': 10, 'currency': 'rub'},
+         'type': product_type_2.id}]}
+    response = api_client_with_jwt.post(product_bulk_create, data,
+                                        format='json')
+    assert response.status_code == HTTPStatus.CREATED, (
+        f'Response: {response.data}')
+    assert Product.objects.count() == 2
+    assert response.data.get('products')[0].get('id') == product.id
+    product.refresh_from_db()
+    product.price.refresh_from_db()
+    assert product.name == 'Nokia 3310'
+    assert product.amount == 7
+    assert product.type == product_type_2
+    assert product.price.price == 999
+    assert product.price.currency == 'euro'
@@ -0,0 +1,82 @@
+from http import HTTPStatus
+
+import pytest
+from django.urls import reverse
+
+from products.models import ExchangeRate
+
+
+@pytest.mark.parametrize('params', (
+    {},
+    {'ordering': 'price', 'limit': 2},
+    {'ordering': '-name', 'limit': 1, 'offset': 1},
+    {'is_active': True, 'currency': 'euro'},
+    {'target_currency': 'dollar', 'ordering': 'price'},
+))
+@pytest.mark.parametrize('denormalized_price', (False, True))
+def test_async_product_list(api_client_with_jwt, product_list,
+                            product_list_url, settings, params,
+                            denormalized_price):
+    '''Тест проверяет, что асинхронный список отдает тот же ответ,
+    что и ProductViewSet'''
+
+    settings.PRODUCT_DENORMALIZED_PRICE = denormalized_price
+    ExchangeRate.objects.create(currency='dollar', rate=90)
+    ExchangeRate.objects.create(currency='euro', rate=100)
+    response = api_client_with_jwt.get(reverse('async-product-list'), params)
+    assert response.status_code == HTTPStatus.OK
+    expected = api_client_with_jwt.get(product_list_url, params)
+    assert response.content == expected.content.replace(
+        b'/products/', b'/async/products/')
+
+
+def test_async_product_detail(api_client_with_jwt, product,
+                              product_detail_url):
+    response = api_client_with_jwt.get(
+        reverse('async-product-detail', args=(product.id,)))
+    assert response.status_code == HTTPStatus.OK
+    assert response.content == api_client_with_jwt.get(
+        product_detail_url).content
+
+    response = api_client_with_jwt.get(
+        reverse('async-product-by-barcode', args=(product.barcode,)))
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['id'] == product.id
+
+
+@pytest.mark.parametrize('url, status', (
+    (reverse('async-product-detail', args=(100,)), HTTPStatus.NOT_FOUND),
+    (reverse('async-product-by-barcode', args=('1234',)),
+     HTTPStatus.BAD_REQUEST),
+    (reverse('async-product-list') + '?target_currency=yuan',
+     HTTPStatus.BAD_REQUEST),
+))
+def test_async_product_fail(api_client_with_jwt, product, url, status):
+    assert api_client_with_jwt.get(url).status_code == status
+
+
+def test_async_product_types(api_client_with_jwt, product_type,
+                             product_type_2, product_type_list_url,
+                             product_type_detail_url):
+    response = api_client_with_jwt.get(reverse('async-product-type-list'))
+    assert response.status_code == HTTPStatus.OK
+    assert response.content == api_client_with_jwt.get(
+        product_type_list_url).content
+    response = api_client_with_jwt.get(
+        reverse('async-product-type-detail', args=(product_type.id,)))
+    assert response.content == api_client_with_jwt.get(
+        product_type_detail_url).content
+
+
+def test_async_views_require_jwt(api_client, api_client_with_jwt, product):
+    '''Тест проверяет, что асинхронные представления требуют JWT
+    и принимают только GET'''
+
+    url = reverse('async-product-list')
+    response = api_client.get(url)
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
+    assert response['WWW-Authenticate'].startswith('Bearer')
+    api_client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+    assert api_client.get(url).status_code == HTTPStatus.UNAUTHORIZED
+    assert api_client_with_jwt.post(
+        url, {}).status_code == HTTPStatus.METHOD_NOT_ALLOWED
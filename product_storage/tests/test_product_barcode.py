@@ -0,0 +1,83 @@
+from http import HTTPStatus
+
+import pytest
+from django.urls import reverse
+
+from api.cache import LRUCache
+from product_storage.constants import BARCODE_LOOKUP_MAX_COUNT
+
+
+def barcode_url(barcode):
+    return reverse('product-by-barcode', args=(barcode,))
+
+
+def test_product_by_barcode(api_client_with_jwt, product, product_detail_url,
+                            update_amount_url,
+                            django_capture_on_commit_callbacks,
+                            django_assert_num_queries):
+    '''Тест проверяет поиск по штрихкоду, попадание в кэш процесса
+    и его сброс при изменении товара'''
+
+    url = barcode_url(product.barcode)
+    # Первый запрос запоминает id товара, второй кэширует ответ
+    for _ in range(2):
+        response = api_client_with_jwt.get(url)
+        assert response.status_code == HTTPStatus.OK
+        assert response['X-Cache'] == 'MISS'
+    assert response.data == api_client_with_jwt.get(product_detail_url).data
+
+    with django_assert_num_queries(1):
+        # Единственный запрос — пользователь для проверки JWT
+        response = api_client_with_jwt.get(url)
+    assert response['X-Cache'] == 'HIT'
+
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client_with_jwt.patch(update_amount_url, {'amount_delta': 5},
+                                  format='json')
+    response = api_client_with_jwt.get(url)
+    assert response['X-Cache'] == 'MISS'
+    assert response.data.get('amount') == product.amount + 5
+
+
+@pytest.mark.parametrize('barcode, status', (
+    ('1234', HTTPStatus.BAD_REQUEST),
+    ('1234567a', HTTPStatus.BAD_REQUEST),
+    ('87654321', HTTPStatus.NOT_FOUND),
+))
+def test_product_by_barcode_fail(api_client_with_jwt, product, barcode,
+                                 status):
+    assert api_client_with_jwt.get(
+        barcode_url(barcode)).status_code == status
+
+
+def test_products_by_barcodes(api_client_with_jwt, product_list,
+                              django_assert_num_queries):
+    '''Тест проверяет, что несколько штрихкодов находятся одним
+    запросом к товарам в порядке запроса'''
+
+    url = reverse('product-by-barcodes')
+    barcodes = [product.barcode for product in product_list][::-1]
+    data = {'barcodes': barcodes + ['87654321', barcodes[0]]}
+    with django_assert_num_queries(2):
+        response = api_client_with_jwt.post(url, data, format='json')
+    assert response.status_code == HTTPStatus.OK
+    assert [item['barcode'] for item in response.data['results']] == barcodes
+    assert response.data['not_found'] == ['87654321']
+
+    response = api_client_with_jwt.post(
+        url, {'barcodes': ['12345678'] * (BARCODE_LOOKUP_MAX_COUNT + 1)},
+        format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = api_client_with_jwt.post(url, {'barcodes': ['1234']},
+                                        format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_lru_cache_eviction():
+    lru = LRUCache(max_size=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    assert lru.get('a') == 1
+    lru.set('c', 3)
+    assert lru.get('b') is None
+    assert (lru.get('a'), lru.get('c'), len(lru)) == (1, 3, 2)
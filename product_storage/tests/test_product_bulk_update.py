@@ -0,0 +1,186 @@
+from decimal import Decimal
+from http import HTTPStatus
+
+import pytest
+from django.db.models import Sum
+from django.urls import reverse
+
+from products.models import (CatalogChange, CatalogObjects, Product,
+                             ProductPrice, ProductTypeStats, StockMovement,
+                             StockMovementReasons, cascading_relations)
+
+
+def assert_derived_data_consistent():
+    '''Агрегаты совпадают с пересчитанными с нуля,
+    а сумма движений журнала — с количеством товаров'''
+
+    def stats():
+        return sorted(ProductTypeStats.objects.filter(
+            product_count__gt=0).values_list(
+            'type_id', 'currency', 'product_count', 'active_count',
+            'amount_total', 'price_sum', 'price_min', 'price_max'))
+
+    incremental = stats()
+    ProductTypeStats.objects.rebuild()
+    assert incremental == stats()
+    ledger = dict(StockMovement.objects.values_list('product').annotate(
+        total=Sum('delta')))
+    amounts = dict(Product.objects.values_list('pk', 'amount'))
+    assert {pk: ledger.get(pk, 0) for pk in amounts} == amounts
+
+
+@pytest.fixture
+def bulk_patch_url():
+    return reverse('product-bulk-partial-update')
+
+
+@pytest.fixture
+def bulk_deactivate_url():
+    return reverse('product-bulk-deactivate')
+
+
+@pytest.fixture
+def bulk_delete_url():
+    return reverse('product-bulk-delete')
+
+
+def test_bulk_patch_heterogeneous_fields(api_client_with_jwt, product_list,
+                                         product_type_2, bulk_patch_url,
+                                         django_assert_max_num_queries):
+    '''Тест проверяет, что у каждой позиции меняются только
+    переданные поля, включая цену и тип'''
+
+    car, laptop, banana = Product.objects.order_by('pk')
+    data = {'products': [
+        {'id': car.id, 'name': 'truck'},
+        {'id': laptop.id, 'price': {'price': '15.50'},
+         'type': product_type_2.id},
+        {'id': banana.id, 'is_active': False, 'barcode': car.barcode[::-1]},
+    ]}
+    # Не зависит от числа позиций: проверка, чтение и пачки записи
+    with django_assert_max_num_queries(32):
+        response = api_client_with_jwt.patch(bulk_patch_url, data,
+                                             format='json')
+    assert response.status_code == HTTPStatus.OK, response.data
+    assert response.json() == {'updated': 3}
+    car_after, laptop_after, banana_after = Product.objects.order_by('pk')
+    assert (car_after.name, car_after.is_active) == ('truck', car.is_active)
+    assert laptop_after.price.price == Decimal('15.50')
+    assert laptop_after.price.currency == 'dollar'
+    assert laptop_after.price_amount == Decimal('15.50')
+    assert laptop_after.type_id == product_type_2.id
+    assert laptop_after.name == laptop.name
+    assert not banana_after.is_active
+    assert banana_after.barcode == car.barcode[::-1]
+    assert all(after.date_updated > car.date_updated for after in (
+        car_after, laptop_after, banana_after))
+    assert_derived_data_consistent()
+    assert set(CatalogChange.objects.filter(
+        object_type=CatalogObjects.PRODUCT).values_list(
+        'object_id', flat=True)) == {car.id, laptop.id, banana.id}
+
+
+@pytest.mark.parametrize('item, field', (
+    ({'id': 10 ** 9}, 'id'),
+    ({'name': 'без id'}, 'id'),
+    ({'type': 10 ** 9}, 'type'),
+    ({'barcode': '12345671'}, 'barcode'),
+    ({'amount': 1, 'barcode': 'abc'}, 'barcode'),
+))
+def test_bulk_patch_invalid_item(api_client_with_jwt, product_list,
+                                 bulk_patch_url, item, field):
+    '''Тест проверяет, что ошибка одной позиции отклоняет весь запрос'''
+
+    first = Product.objects.order_by('pk').first()
+    item = {'id': first.id, **item}
+    if field == 'id' and 'name' in item:
+        del item['id']
+    response = api_client_with_jwt.patch(bulk_patch_url, {'products': [
+        {'id': product.id, 'name': 'changed'}
+        for product in Product.objects.exclude(pk=first.pk)] + [item]},
+        format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert field in response.json()['products'][-1]
+    assert not Product.objects.filter(name='changed').exists()
+
+
+def test_bulk_patch_duplicate_id(api_client_with_jwt, product,
+                                 bulk_patch_url):
+    response = api_client_with_jwt.patch(bulk_patch_url, {'products': [
+        {'id': product.id, 'name': 'a'}, {'id': product.id, 'name': 'b'}]},
+        format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+
+
+def test_bulk_deactivate_by_filters(api_client_with_jwt, product_list,
+                                    bulk_deactivate_url):
+    '''Тест проверяет, что снимаются с продажи только товары,
+    выбранные фильтрами, и ответ содержит их число'''
+
+    response = api_client_with_jwt.post(
+        f'{bulk_deactivate_url}?min_price=95&is_active=true')
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'deactivated': 1}
+    assert dict(Product.objects.values_list('name', 'is_active')) == {
+        'car': False, 'laptop': True, 'banana': False}
+    assert_derived_data_consistent()
+
+
+def test_bulk_delete_by_filters(api_client_with_jwt, product_list,
+                                bulk_delete_url):
+    '''Тест проверяет, что удаление по фильтрам удаляет товары
+    с ценами и учитывает их в агрегатах, журнале и ленте'''
+
+    deleted_ids = set(Product.objects.filter(is_active=True).values_list(
+        'pk', flat=True))
+    response = api_client_with_jwt.delete(
+        f'{bulk_delete_url}?is_active=true&min_price=50')
+    assert response.status_code == HTTPStatus.OK
+    assert response.json() == {'deleted': 2}
+    assert list(Product.objects.values_list('name', flat=True)) == ['car']
+    assert ProductPrice.objects.count() == 1
+    assert_derived_data_consistent()
+    assert set(StockMovement.objects.filter(
+        reason=StockMovementReasons.DELETE).values_list(
+        'product_id', flat=True)) == deleted_ids
+    assert set(CatalogChange.objects.filter(deleted=True).values_list(
+        'object_id', flat=True)) == deleted_ids
+
+
+def test_bulk_delete_handles_all_cascades():
+    '''bulk_delete удаляет строки без Collector: связь с товаром
+    с каскадным удалением должна обрабатываться в нем явно'''
+
+    assert cascading_relations(Product) == {ProductPrice}
+    assert not cascading_relations(ProductPrice)
+
+
+def test_bulk_actions_in_batches(product_list):
+    '''Тест проверяет обход выборки пачками по диапазонам id'''
+
+    assert Product.objects.all().deactivate(batch_size=1) == 2
+    assert not Product.objects.filter(is_active=True).exists()
+    assert Product.objects.exclude(name='car').bulk_delete(
+        batch_size=1) == 2
+    assert list(Product.objects.values_list('name', flat=True)) == ['car']
+    assert_derived_data_consistent()
+
+
+@pytest.mark.parametrize('params', (
+    '', '?page=1', '?min_price=abc', '?name=', '?is_active=', '?min_price=',
+    '?currency=', '?search=%20', '?name=&target_currency=rub'))
+def test_bulk_delete_requires_valid_filters(api_client_with_jwt,
+                                            product_list, bulk_delete_url,
+                                            params):
+    response = api_client_with_jwt.delete(f'{bulk_delete_url}{params}')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert Product.objects.count() == 3
+
+
+@pytest.mark.parametrize('params', ('?is_active=', '?search=%20'))
+def test_bulk_deactivate_requires_filter_value(api_client_with_jwt,
+                                               product_list,
+                                               bulk_deactivate_url, params):
+    response = api_client_with_jwt.post(f'{bulk_deactivate_url}{params}')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert Product.objects.filter(is_active=True).count() == 2
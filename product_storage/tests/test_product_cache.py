@@ -0,0 +1,77 @@
+from api import cache
+from products.models import Product
+
+# Кэш сбрасывается после коммита, а тесты работают внутри транзакции,
+# поэтому колбэки on_commit запускаем явно
+
+
+def test_product_detail_cache(api_client_with_jwt, product,
+                              product_detail_url, update_amount_url,
+                              product_cache_stats_url,
+                              django_capture_on_commit_callbacks):
+    '''Тест проверяет попадание в кэш и его сброс при изменении товара'''
+
+    response = api_client_with_jwt.get(product_detail_url)
+    assert response['X-Cache'] == 'MISS'
+    response = api_client_with_jwt.get(product_detail_url)
+    assert response['X-Cache'] == 'HIT'
+    assert response.data.get('amount') == product.amount
+
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client_with_jwt.patch(update_amount_url, {'amount_delta': 5},
+                                  format='json')
+    response = api_client_with_jwt.get(product_detail_url)
+    assert response['X-Cache'] == 'MISS'
+    assert response.data.get('amount') == product.amount + 5
+
+    response = api_client_with_jwt.get(product_cache_stats_url)
+    assert response.data == {'hits': 1, 'misses': 2}
+
+
+def test_product_list_cache(api_client_with_jwt, product, product_list_url,
+                            product_bulk_create, product_bulk_create_data,
+                            django_capture_on_commit_callbacks):
+    '''Тест проверяет, что ключ списка учитывает параметры запроса,
+    а массовое добавление сбрасывает кэш списков'''
+
+    params = {'ordering': 'name', 'is_active': True}
+    response = api_client_with_jwt.get(product_list_url, params)
+    assert response['X-Cache'] == 'MISS'
+    response = api_client_with_jwt.get(product_list_url,
+                                       dict(reversed(params.items())))
+    assert response['X-Cache'] == 'HIT'
+    response = api_client_with_jwt.get(product_list_url, {'name': 'nokia'})
+    assert response['X-Cache'] == 'MISS'
+
+    Product.objects.all().delete()
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client_with_jwt.post(product_bulk_create,
+                                 product_bulk_create_data, format='json')
+    response = api_client_with_jwt.get(product_list_url, params)
+    assert response['X-Cache'] == 'MISS'
+    assert response.data.get('count') == len(
+        product_bulk_create_data.get('products'))
+
+
+def test_invalidate_many_products(product_list, monkeypatch):
+    '''Тест проверяет, что сброс многих товаров меняет версию каждого
+    за одно обращение к кэшу, а не по incr на товар'''
+
+    pks = [product.pk for product in product_list]
+    keys = {pk: cache.detail_key(pk) for pk in pks}
+    calls = []
+
+    def counting(name):
+        method = getattr(cache.cache, name)
+
+        def call(*args, **kwargs):
+            calls.append(name)
+            return method(*args, **kwargs)
+        return call
+
+    for name in ('incr', 'set_many'):
+        monkeypatch.setattr(cache.cache, name, counting(name))
+    cache.invalidate(pks)
+    assert calls == ['set_many', 'incr']
+    monkeypatch.undo()
+    assert all(cache.detail_key(pk) != key for pk, key in keys.items())
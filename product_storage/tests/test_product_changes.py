@@ -0,0 +1,145 @@
+from http import HTTPStatus
+
+import pytest
+from django.db.models import Count
+from django.urls import reverse
+
+from api import changes
+from products.models import CatalogChange, Product, ProductType
+
+
+@pytest.fixture
+def product_changes_url():
+    return reverse('product-changes')
+
+
+def sync(client, url, since='0', **params):
+    '''Все страницы ленты после since: (записи, следующий токен)'''
+
+    results = []
+    while True:
+        response = client.get(url, {'since': since, **params})
+        assert response.status_code == HTTPStatus.OK, response.data
+        data = response.json()
+        results.extend(data['changes'])
+        since = data['next']
+        if not data['has_more']:
+            return results, since
+
+
+def test_initial_sync_returns_catalog(api_client_with_jwt, product_list,
+                                      product_changes_url):
+    '''Тест проверяет, что синхронизация с since=0 постранично
+    отдает все типы и товары с их текущими данными'''
+
+    results, _ = sync(api_client_with_jwt, product_changes_url, limit=2)
+    assert [result['seq'] for result in results] == sorted(
+        result['seq'] for result in results)
+    objects = {(result['object'], result['id']): result['data']
+               for result in results}
+    assert set(objects) == (
+        {('product', pk) for pk in Product.objects.values_list(
+            'pk', flat=True)}
+        | {('product_type', product_list[0].type_id)})
+    for product in product_list:
+        detail = api_client_with_jwt.get(
+            reverse('product-detail', args=(product.id,))).json()
+        assert objects[('product', product.id)] == detail
+
+
+def test_incremental_sync(api_client_with_jwt, product, product_type_2,
+                          product_detail_url, update_amount_url,
+                          product_type_detail_url, product_changes_url,
+                          product_patch_data):
+    '''Тест проверяет, что после токена приходят только изменения:
+    цена, количество, тип товара и удаление (tombstone)'''
+
+    _, since = sync(api_client_with_jwt, product_changes_url)
+    results, since_after = sync(api_client_with_jwt, product_changes_url,
+                                since)
+    assert results == [] and since_after == since
+
+    api_client_with_jwt.patch(update_amount_url, {'amount_delta': 5},
+                              format='json')
+    api_client_with_jwt.patch(product_detail_url, product_patch_data,
+                              format='json')
+    api_client_with_jwt.patch(product_type_detail_url, {'name': 'Гаджеты'},
+                              format='json')
+    results, since = sync(api_client_with_jwt, product_changes_url, since)
+    assert [(result['object'], result['id']) for result in results] == [
+        ('product', product.id), ('product_type', product.type_id)]
+    assert results[0]['data']['amount'] == 55
+    assert results[0]['data']['price']['currency'] == 'dollar'
+    assert results[1]['data']['name'] == 'Гаджеты'
+
+    api_client_with_jwt.delete(product_detail_url)
+    ProductType.objects.filter(pk=product.type_id).delete()
+    results, _ = sync(api_client_with_jwt, product_changes_url, since)
+    assert [(result['object'], result['id'], result['deleted'],
+             result['data']) for result in results] == [
+        ('product', product.id, True, None),
+        ('product_type', product.type_id, True, None)]
+
+
+def test_one_entry_per_object(api_client_with_jwt, product,
+                              update_amount_url):
+    for _ in range(3):
+        api_client_with_jwt.patch(update_amount_url, {'amount_delta': 1},
+                                  format='json')
+    assert not CatalogChange.objects.values(
+        'object_type', 'object_id').annotate(
+        entries=Count('seq')).filter(entries__gt=1).exists()
+
+
+def test_long_poll_returns_new_change(api_client_with_jwt, product_type,
+                                      product_changes_url, monkeypatch):
+    '''Тест проверяет, что long-poll без изменений ждет и отдает
+    изменение, появившееся во время ожидания'''
+
+    _, since = sync(api_client_with_jwt, product_changes_url)
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            ProductType.objects.create(name='Новый', description='')
+
+    monkeypatch.setattr(changes.time, 'sleep', sleep)
+    response = api_client_with_jwt.get(product_changes_url,
+                                       {'since': since, 'wait': 5})
+    assert len(sleeps) == 2
+    assert [result['data']['name']
+            for result in response.json()['changes']] == ['Новый']
+
+
+def test_async_long_poll_returns_new_change(api_client_with_jwt,
+                                            product_type,
+                                            product_changes_url,
+                                            monkeypatch):
+    '''Тест проверяет, что асинхронный long-poll ждет без потока
+    дольше синхронного и отдает ту же ленту'''
+
+    _, since = sync(api_client_with_jwt, product_changes_url)
+    sleeps = []
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 2:
+            await ProductType.objects.acreate(name='Новый', description='')
+
+    monkeypatch.setattr(changes.asyncio, 'sleep', sleep)
+    response = api_client_with_jwt.get(reverse('async-product-changes'),
+                                       {'since': since, 'wait': 30})
+    assert response.status_code == HTTPStatus.OK
+    assert len(sleeps) == 2
+    assert response.content == api_client_with_jwt.get(
+        product_changes_url, {'since': since}).content
+
+
+@pytest.mark.parametrize('params', (
+    {'since': -1}, {'since': 'abc'}, {'limit': 0}, {'wait': 30},
+    {'wait': 3600}))
+def test_changes_invalid_params(api_client_with_jwt, product_changes_url,
+                                params):
+    response = api_client_with_jwt.get(product_changes_url, params)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
@@ -0,0 +1,91 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from http import HTTPStatus
+
+import pytest
+from rest_framework.renderers import JSONRenderer
+
+from api.middleware import negotiate_encoding
+from api.renderers import FastJSONRenderer
+
+
+@pytest.fixture
+def compress_all(settings):
+    settings.RESPONSE_COMPRESSION_MIN_SIZE = 1
+
+
+def test_fast_json_renderer_matches_drf():
+    '''Тест проверяет, что FastJSONRenderer отдает те же байты,
+    что и JSONRenderer DRF'''
+
+    moscow = timezone(timedelta(hours=3))
+    data = {'name': 'Молоко\u2028\u2029', 'price': Decimal('10.50'),
+            'created': datetime(2024, 1, 2, 3, 4, 5, 6007,
+                                tzinfo=timezone.utc),
+            'updated': datetime(2024, 1, 2, 3, 4, 5, tzinfo=moscow),
+            1: [None, True, 1.5], 'nested': {'amount': 10}}
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+    assert FastJSONRenderer().render(
+        data, 'application/json; indent=4') == JSONRenderer().render(
+        data, 'application/json; indent=4')
+
+
+@pytest.mark.parametrize('accept_encoding, expected', (
+    ('gzip', 'gzip'),
+    ('deflate, gzip;q=0.5', 'gzip'),
+    ('*;q=0, gzip', 'gzip'),
+    ('gzip;q=0', None),
+    ('*;q=0', None),
+    ('identity', None),
+    ('', None),
+))
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+def test_list_compressed(api_client_with_jwt, product_list,
+                         product_list_url, compress_all):
+    '''Тест проверяет, что список сжимается по Accept-Encoding,
+    а ETag сжатого ответа становится слабым'''
+
+    plain = api_client_with_jwt.get(product_list_url)
+    assert 'Content-Encoding' not in plain
+    response = api_client_with_jwt.get(product_list_url,
+                                       HTTP_ACCEPT_ENCODING='gzip')
+    assert response.status_code == HTTPStatus.OK
+    assert response['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response['Vary']
+    assert int(response['Content-Length']) == len(response.content)
+    assert gzip.decompress(response.content) == plain.content
+    assert response['ETag'] == 'W/' + plain['ETag']
+
+    not_modified = api_client_with_jwt.get(
+        product_list_url, HTTP_ACCEPT_ENCODING='gzip',
+        HTTP_IF_NONE_MATCH=response['ETag'])
+    assert not_modified.status_code == HTTPStatus.NOT_MODIFIED
+
+
+def test_small_response_not_compressed(api_client_with_jwt,
+                                       product_detail_url, settings):
+    settings.RESPONSE_COMPRESSION_MIN_SIZE = 10_000
+    response = api_client_with_jwt.get(product_detail_url,
+                                       HTTP_ACCEPT_ENCODING='gzip')
+    assert response.status_code == HTTPStatus.OK
+    assert 'Content-Encoding' not in response
+    assert response.json()['id']
+
+
+def test_export_compressed(api_client_with_jwt, product_list,
+                           product_export_url, compress_all):
+    '''Тест проверяет сжатие потоковой выгрузки'''
+
+    response = api_client_with_jwt.get(product_export_url,
+                                       HTTP_ACCEPT_ENCODING='gzip')
+    assert response.status_code == HTTPStatus.OK
+    assert response['Content-Encoding'] == 'gzip'
+    lines = gzip.decompress(
+        b''.join(response.streaming_content)).decode().splitlines()
+    assert len(lines) == product_list.count()
+    assert json.loads(lines[0])['id']
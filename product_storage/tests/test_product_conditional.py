@@ -0,0 +1,153 @@
+from http import HTTPStatus
+
+import pytest
+from django.utils.http import http_date
+
+from products.models import Product, ProductPrice
+
+
+def test_product_detail_etag(api_client_with_jwt, product,
+                             product_detail_url, update_amount_url):
+    '''Тест проверяет ответ 304 по ETag и смену ETag при изменении'''
+
+    response = api_client_with_jwt.get(product_detail_url)
+    etag = response['ETag']
+    response = api_client_with_jwt.get(product_detail_url,
+                                       HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    assert response['ETag'] == etag
+    assert not response.content
+
+    api_client_with_jwt.patch(update_amount_url, {'amount_delta': 1},
+                              format='json')
+    response = api_client_with_jwt.get(product_detail_url,
+                                       HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+    assert response['ETag'] != etag
+
+
+def test_product_detail_etag_price_change(api_client_with_jwt, product,
+                                          product_detail_url):
+    '''Тест проверяет, что изменение одной цены меняет ETag товара'''
+
+    etag = api_client_with_jwt.get(product_detail_url)['ETag']
+    product.price.price = 1
+    product.price.save()
+    response = api_client_with_jwt.get(product_detail_url,
+                                       HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_product_detail_etag_price_queryset_update(
+        api_client_with_jwt, product, product_detail_url,
+        django_capture_on_commit_callbacks):
+    '''Тест проверяет, что массовое изменение цен через
+    QuerySet.update() тоже меняет ETag товара'''
+
+    etag = api_client_with_jwt.get(product_detail_url)['ETag']
+    with django_capture_on_commit_callbacks(execute=True):
+        ProductPrice.objects.filter(product=product).update(price=777)
+    response = api_client_with_jwt.get(product_detail_url,
+                                       HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['price']['price'] == '777.00'
+
+
+def test_product_list_conditional(api_client_with_jwt, product_list,
+                                  product_list_url, django_assert_num_queries,
+                                  django_capture_on_commit_callbacks):
+    '''Тест проверяет, что 304 для списка отдается без запросов
+    к товарам: версия списка кэшируется до их изменения'''
+
+    params = {'is_active': True}
+    response = api_client_with_jwt.get(product_list_url, params)
+    etag, last_modified = response['ETag'], response['Last-Modified']
+    assert last_modified == http_date(
+        Product.objects.filter(is_active=True).latest(
+            'date_updated').date_updated.timestamp())
+
+    # Только аутентификация по JWT
+    with django_assert_num_queries(1):
+        response = api_client_with_jwt.get(product_list_url, params,
+                                           HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+    response = api_client_with_jwt.get(product_list_url, params,
+                                       HTTP_IF_MODIFIED_SINCE=last_modified)
+    assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+    # Другой фильтр — другая версия списка
+    response = api_client_with_jwt.get(product_list_url,
+                                       {'is_active': False},
+                                       HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Product.objects.filter(is_active=True).first().delete()
+    response = api_client_with_jwt.get(product_list_url, params,
+                                       HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+
+
+def test_patch_if_match(api_client_with_jwt, product, product_detail_url,
+                        product_patch_data):
+    '''Тест проверяет, что из двух изменений по одному ETag
+    применяется первое, а второе получает 412 и ничего не меняет'''
+
+    etag = api_client_with_jwt.get(product_detail_url)['ETag']
+    response = api_client_with_jwt.patch(
+        product_detail_url, {'name': 'Первый'}, format='json',
+        HTTP_IF_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+    new_etag = response['ETag']
+    assert new_etag != etag
+    response = api_client_with_jwt.patch(
+        product_detail_url, product_patch_data, format='json',
+        HTTP_IF_MATCH=etag)
+    assert response.status_code == HTTPStatus.PRECONDITION_FAILED
+    product = Product.objects.select_related('price').get(pk=product.pk)
+    assert (product.name, product.price.currency) == ('Первый', 'rub')
+
+    # Новый ETag из ответа, в том числе слабый, подходит
+    response = api_client_with_jwt.patch(
+        product_detail_url, product_patch_data, format='json',
+        HTTP_IF_MATCH=f'W/{new_etag}')
+    assert response.status_code == HTTPStatus.OK
+    assert response['ETag'] == api_client_with_jwt.get(
+        product_detail_url)['ETag']
+
+
+def test_update_amount_if_match(api_client_with_jwt, product,
+                                product_detail_url, update_amount_url):
+    etag = api_client_with_jwt.get(product_detail_url)['ETag']
+    api_client_with_jwt.patch(update_amount_url, {'amount_delta': 1},
+                              format='json')
+    response = api_client_with_jwt.patch(
+        update_amount_url, {'amount_delta': 5}, format='json',
+        HTTP_IF_MATCH=etag)
+    assert response.status_code == HTTPStatus.PRECONDITION_FAILED
+    product.refresh_from_db()
+    assert product.amount == 51
+
+    etag = api_client_with_jwt.get(product_detail_url)['ETag']
+    response = api_client_with_jwt.patch(
+        update_amount_url, {'amount_delta': -100}, format='json',
+        HTTP_IF_MATCH=etag)
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    response = api_client_with_jwt.patch(
+        update_amount_url, {'amount_delta': 5}, format='json',
+        HTTP_IF_MATCH=etag)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['amount'] == 56
+
+
+@pytest.mark.parametrize('if_match, status', (
+    ('*', HTTPStatus.OK),
+    ('"1-1.000000-json"', HTTPStatus.PRECONDITION_FAILED),
+    ('"не-etag"', HTTPStatus.PRECONDITION_FAILED),
+))
+def test_patch_if_match_values(api_client_with_jwt, product,
+                               product_detail_url, if_match, status):
+    response = api_client_with_jwt.patch(
+        product_detail_url, {'name': 'Новое'}, format='json',
+        HTTP_IF_MATCH=if_match)
+    assert response.status_code == status
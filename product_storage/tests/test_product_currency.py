@@ -0,0 +1,96 @@
+from decimal import Decimal
+from http import HTTPStatus
+
+import pytest
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+
+from products.models import ExchangeRate, Product
+
+
+@pytest.fixture
+def exchange_rates():
+    ExchangeRate.objects.create(currency='dollar', rate=90)
+    ExchangeRate.objects.create(currency='euro', rate=100)
+
+
+def test_product_list_target_currency(api_client_with_jwt, product_list,
+                                      exchange_rates, product_list_url):
+    '''Тест проверяет сортировку, фильтр и вывод цен,
+    пересчитанных в одну валюту'''
+
+    # banana 100 rub, laptop 90 dollar, car 80 euro
+    response = api_client_with_jwt.get(
+        product_list_url, {'target_currency': 'dollar', 'ordering': '-price',
+                           'min_price': 2})
+    assert response.status_code == HTTPStatus.OK
+    results = response.data['results']
+    assert [el['name'] for el in results] == ['laptop', 'car']
+    assert [el['converted_price'] for el in results] == [
+        {'currency': 'dollar', 'price': '90.00'},
+        {'currency': 'dollar', 'price': '88.89'},
+    ]
+    assert results[1]['price'] == {'id': results[1]['price']['id'],
+                                   'currency': 'euro', 'price': '80.00'}
+
+
+def test_exchange_rate_change_refreshes_prices(product_list,
+                                               exchange_rates):
+    '''Тест проверяет, что новый курс пересчитывает цены
+    товаров в базовой валюте одним UPDATE'''
+
+    rate = ExchangeRate.objects.get(currency='euro')
+    rate.rate = Decimal('110.5')
+    with CaptureQueriesContext(connection) as context:
+        rate.save()
+    assert len([query for query in context.captured_queries
+                if query['sql'].startswith('UPDATE "products_product"')]) == 1
+    assert Product.objects.get(name='car').price_base == Decimal('8840')
+
+    rate.delete()
+    assert Product.objects.get(name='car').price_base is None
+    assert Product.objects.get(name='banana').price_base == Decimal('100')
+
+
+def test_exchange_rate_rounds_base_price(product_list, exchange_rates):
+    '''Тест проверяет, что цена в базовой валюте хранится округленной
+    до копеек: сравнение идет в SQL, а не по прочитанному значению'''
+
+    rate = ExchangeRate.objects.get(currency='euro')
+    rate.rate = Decimal('90.123456')
+    rate.save()
+    # 80 * 90.123456 = 7209.87648
+    assert Product.objects.filter(
+        name='car', price_base=Decimal('7209.88')).exists()
+
+
+def test_exchange_rate_base_currency_forbidden(db):
+    with pytest.raises(IntegrityError):
+        ExchangeRate.objects.create(currency='rub', rate=1)
+
+
+def test_product_list_target_currency_without_rate(api_client_with_jwt,
+                                                   product_list,
+                                                   product_list_url):
+    response = api_client_with_jwt.get(product_list_url,
+                                       {'target_currency': 'yuan'})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert 'target_currency' in response.data
+
+
+def test_product_list_target_currency_missing_product_rate(
+        api_client_with_jwt, product_list, product_list_url):
+    '''Тест проверяет, что товары валют без курса не исключаются
+    молча: запрос отклоняется, пока выборка их содержит'''
+
+    ExchangeRate.objects.create(currency='dollar', rate=90)
+    response = api_client_with_jwt.get(product_list_url,
+                                       {'target_currency': 'dollar'})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.data['target_currency'] == ['Курс валюты euro не задан']
+
+    response = api_client_with_jwt.get(
+        product_list_url, {'target_currency': 'dollar', 'is_active': True})
+    assert response.status_code == HTTPStatus.OK
+    assert [el['name'] for el in response.data['results']] == [
+        'banana', 'laptop']
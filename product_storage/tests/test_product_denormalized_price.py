@@ -0,0 +1,94 @@
+from decimal import Decimal
+from http import HTTPStatus
+
+import pytest
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from products.models import Product, ProductPrice
+
+
+def get_price_columns(product_id):
+    return Product.objects.filter(pk=product_id).values_list(
+        'price_pk', 'price_amount', 'price_currency').get()
+
+
+def assert_prices_synced():
+    for product in Product.objects.select_related('price'):
+        assert get_price_columns(product.pk) == (
+            product.price.pk, product.price.price, product.price.currency)
+
+
+def test_denormalized_price_write_paths(api_client_with_jwt, product,
+                                        product_detail_url,
+                                        product_patch_data,
+                                        product_bulk_create,
+                                        product_bulk_create_data):
+    '''Тест проверяет, что столбцы price_* совпадают с ProductPrice
+    после записи цены любым способом'''
+
+    # save() и PATCH через API
+    assert_prices_synced()
+    response = api_client_with_jwt.patch(product_detail_url,
+                                         product_patch_data, format='json')
+    assert response.status_code == HTTPStatus.OK
+    assert get_price_columns(product.pk)[1:] == (Decimal('200.00'), 'dollar')
+
+    # Массовое добавление, повторное с upsert и update() по queryset цен
+    api_client_with_jwt.post(product_bulk_create, product_bulk_create_data,
+                             format='json')
+    for item in product_bulk_create_data['products']:
+        item['price'] = {'price': 300, 'currency': 'euro'}
+    product_bulk_create_data['upsert'] = True
+    api_client_with_jwt.post(product_bulk_create, product_bulk_create_data,
+                             format='json')
+    assert_prices_synced()
+    ProductPrice.objects.filter(currency='rub').update(price=1)
+    assert_prices_synced()
+
+    # Удаление цены очищает ее копию
+    product.price.delete()
+    assert get_price_columns(product.pk) == (None, None, None)
+
+
+def test_product_save_keeps_price_columns(product):
+    '''Сохранение товара, загруженного до изменения цены,
+    не затирает новую цену (как при list_editable в админке)'''
+
+    stale_product = Product.objects.get(pk=product.pk)
+    price = product.price
+    price.price = 700
+    price.save()
+    stale_product.amount = 1
+    stale_product.save()
+    assert get_price_columns(product.pk)[1] == Decimal('700.00')
+
+
+@pytest.mark.parametrize('params', (
+    {},
+    {'ordering': 'price'},
+    {'ordering': '-price', 'currency': 'RUB'},
+    {'min_price': 85, 'max_price': 100},
+))
+def test_denormalized_price_list(api_client_with_jwt, product_list,
+                                 product_list_url, settings, params):
+    '''Тест проверяет, что список из столбцов price_* совпадает
+    со списком через JOIN и выбирается запросом к одной таблице'''
+
+    expected = api_client_with_jwt.get(product_list_url, params).content
+    cache.clear()
+    settings.PRODUCT_DENORMALIZED_PRICE = True
+    with CaptureQueriesContext(connection) as context:
+        response = api_client_with_jwt.get(product_list_url, params)
+    assert response.content == expected
+    assert not [query['sql'] for query in context.captured_queries
+                if 'JOIN' in query['sql']]
+
+
+def test_backfill_product_prices(product_list):
+    Product.objects.update(price_pk=None, price_amount=None,
+                           price_currency=None)
+    call_command('backfill_product_prices', batch_size=1)
+    assert_prices_synced()
@@ -0,0 +1,43 @@
+import csv
+import json
+from http import HTTPStatus
+from io import StringIO
+
+from products.models import Product
+
+
+def read_streaming(response):
+    return b''.join(response.streaming_content).decode()
+
+
+def test_export_products_ndjson(api_client_with_jwt, product_list,
+                                product_list_url, product_export_url):
+    '''Тест проверяет, что выгрузка совпадает с ответом списка товаров'''
+
+    response = api_client_with_jwt.get(product_export_url)
+    assert response.status_code == HTTPStatus.OK
+    assert response['Content-Type'] == 'application/x-ndjson'
+    rows = [json.loads(line)
+            for line in read_streaming(response).splitlines()]
+    expected = api_client_with_jwt.get(product_list_url).json()
+    assert rows == expected.get('results')
+
+
+def test_export_products_csv_filtered(api_client_with_jwt, product_list,
+                                      product_export_url):
+    '''Тест проверяет выгрузку CSV с фильтрами списка товаров'''
+
+    response = api_client_with_jwt.get(
+        product_export_url, {'format': 'csv', 'is_active': True,
+                             'ordering': 'name'})
+    assert response.status_code == HTTPStatus.OK
+    rows = list(csv.DictReader(StringIO(read_streaming(response))))
+    assert [row['id'] for row in rows] == [
+        str(pk) for pk in Product.objects.filter(is_active=True).order_by(
+            'name').values_list('id', flat=True)]
+    assert {'price.currency', 'price.price', 'barcode'} <= set(rows[0])
+
+
+def test_export_products_unauthorized(api_client, product_export_url):
+    response = api_client.get(product_export_url)
+    assert response.status_code == HTTPStatus.UNAUTHORIZED
@@ -37,3 +37,132 @@ def test_update_product_amount_incorrect_value(api_client_with_jwt, product,
         f'Response: {response.data}')
     product.refresh_from_db()
     assert product.amount == start_amount
+
+
+def test_update_product_amount_overflow(api_client_with_jwt, product,
+                                        update_amount_url):
+    '''Тест ожидает ошибку валидации, а не ошибку БД, если количество
+    превысило бы диапазон столбца'''
+
+    response = api_client_with_jwt.patch(
+        update_amount_url, {'amount_delta': 32767 - product.amount},
+        format='json')
+    assert response.status_code == HTTPStatus.OK
+    response = api_client_with_jwt.patch(update_amount_url,
+                                         {'amount_delta': 1}, format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert response.data['non_field_errors'] == [
+        'Количество товара на складе не может превысить 32767']
+    product.refresh_from_db()
+    assert product.amount == 32767
+
+
+@pytest.mark.parametrize('amount_delta', (10 ** 20, -10 ** 20, 32768))
+def test_update_product_amount_out_of_range(api_client_with_jwt, product,
+                                            update_amount_url,
+                                            product_bulk_update_amount_url,
+                                            amount_delta):
+    '''Тест ожидает ошибку валидации, а не ошибку БД, если изменение
+    количества не помещается в столбец'''
+
+    start_amount = product.amount
+    response = api_client_with_jwt.patch(
+        update_amount_url, {'amount_delta': amount_delta}, format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert 'amount_delta' in response.data
+    response = api_client_with_jwt.post(
+        product_bulk_update_amount_url,
+        {'items': [{'id': product.id, 'amount_delta': amount_delta}]},
+        format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert 'amount_delta' in response.data['items'][0]
+    product.refresh_from_db()
+    assert product.amount == start_amount
+
+
+def test_bulk_update_product_amount_is_atomic(api_client_with_jwt,
+                                              product_list,
+                                              product_bulk_update_amount_url):
+    '''Тест ожидает, что при отрицательном остатке у одной позиции
+    не применяется ни одно изменение'''
+
+    amounts = dict(Product.objects.values_list('id', 'amount'))
+    first_id, second_id = list(amounts)[:2]
+    data = {'items': [{'id': first_id, 'amount_delta': 1},
+                      {'id': second_id, 'amount_delta': -1000}]}
+    response = api_client_with_jwt.post(product_bulk_update_amount_url,
+                                        data, format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST, (
+        f'Response: {response.data}')
+    assert not response.data.get('items')[0]
+    assert response.data.get('items')[1]
+    assert dict(Product.objects.values_list('id', 'amount')) == amounts
+
+
+def test_bulk_update_product_amount_overflow(api_client_with_jwt,
+                                             product_list,
+                                             product_bulk_update_amount_url):
+    '''Тест ожидает, что позиции одного товара суммируются и их сумма
+    не может увести количество за границу столбца'''
+
+    amounts = dict(Product.objects.values_list('id', 'amount'))
+    first_id, second_id, third_id = amounts
+    data = {'items': [{'id': first_id, 'amount_delta': 32767},
+                      {'id': second_id, 'amount_delta': 1},
+                      {'id': third_id, 'amount_delta': 20000},
+                      {'id': third_id, 'amount_delta': 20000},
+                      {'id': second_id, 'amount_delta': -1000}]}
+    response = api_client_with_jwt.post(product_bulk_update_amount_url,
+                                        data, format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    overflow = ['Количество товара на складе не может превысить 32767']
+    negative = ['Количество товара на складе не может стать отрицательным']
+    assert [item.get('non_field_errors')
+            for item in response.data['items']] == [
+        overflow, negative, overflow, overflow, negative]
+    assert dict(Product.objects.values_list('id', 'amount')) == amounts
+
+
+def test_bulk_update_product_amount_unknown_product(
+        api_client_with_jwt, product, product_bulk_update_amount_url):
+    data = {'items': [{'id': product.id, 'amount_delta': 1},
+                      {'barcode': '00000000', 'amount_delta': 1}]}
+    response = api_client_with_jwt.post(product_bulk_update_amount_url,
+                                        data, format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST, (
+        f'Response: {response.data}')
+    start_amount = product.amount
+    product.refresh_from_db()
+    assert product.amount == start_amount
+
+
+def test_bulk_create_product_unknown_type(api_client_with_jwt,
+                                          product_bulk_create_data,
+                                          product_bulk_create):
+    '''Тест ожидает ошибку для товара с несуществующим типом'''
+
+    Product.objects.all().delete()
+    data = product_bulk_create_data
+    data.get('products')[1]['type'] = 0
+    response = api_client_with_jwt.post(product_bulk_create, data,
+                                        format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST, (
+        f'Response: {response.data}')
+    assert not response.data.get('products')[0]
+    assert 'type' in response.data.get('products')[1]
+    assert Product.objects.count() == 0
+
+
+def test_bulk_create_product_existing_barcode(api_client_with_jwt, product,
+                                              product_bulk_create_data,
+                                              product_bulk_create):
+    '''Тест ожидает ошибку при повторном штрихкоде без режима upsert'''
+
+    data = product_bulk_create_data
+    data.get('products')[0]['barcode'] = product.barcode
+    response = api_client_with_jwt.post(product_bulk_create, data,
+                                        format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST, (
+        f'Response: {response.data}')
+    assert 'barcode' in response.data.get('products')[0]
+    assert Product.objects.count() == 1
@@ -0,0 +1,99 @@
+import json
+import logging
+import re
+from http import HTTPStatus
+
+import pytest
+from django.urls import reverse
+
+from api.metrics import registry
+
+
+@pytest.fixture
+def metrics_enabled(settings):
+    '''Включает метрики: объявляется до фикстур с запросами, иначе
+    клиент уже загрузил цепочку middleware без MetricsMiddleware'''
+
+    settings.API_METRICS = True
+    registry.clear()
+    yield
+    registry.clear()
+
+
+@pytest.fixture
+def metrics_log(caplog):
+    '''Записи логгера api.metrics (он не передает их корневому)'''
+
+    logger = logging.getLogger('api.metrics')
+    logger.addHandler(caplog.handler)
+    yield caplog
+    logger.removeHandler(caplog.handler)
+
+
+def test_server_timing_and_log(metrics_enabled, metrics_log,
+                               api_client_with_jwt, product_list,
+                               product_list_url, django_assert_num_queries):
+    '''Тест проверяет, что число запросов в Server-Timing и в логе
+    совпадает с фактическим, а ответ описан представлением DRF'''
+
+    with django_assert_num_queries(4) as captured:
+        response = api_client_with_jwt.get(product_list_url)
+    timing = response['Server-Timing']
+    assert re.fullmatch(
+        r'db;dur=[\d.]+;desc="(\d+) queries", serialize;dur=[\d.]+, '
+        r'render;dur=[\d.]+, '
+        r'total;dur=[\d.]+', timing)
+    assert f'desc="{len(captured)} queries"' in timing
+    record = json.loads(metrics_log.records[-1].getMessage())
+    assert record['event'] == 'request'
+    assert record['view'] == 'ProductViewSet.list'
+    assert record['status'] == HTTPStatus.OK
+    assert record['db_queries'] == len(captured)
+    assert record['response_bytes'] == len(response.content)
+    # В логе миллисекунды округлены, счетчик хранит точное значение
+    assert registry.views['ProductViewSet.list'].serialize_duration > 0
+    assert record['render_ms'] > 0
+
+
+def test_slow_query_logged(metrics_enabled, metrics_log, settings,
+                           api_client_with_jwt, product, update_amount_url):
+    settings.API_SLOW_QUERY_MS = 0
+    api_client_with_jwt.patch(update_amount_url, {'amount_delta': 1},
+                              format='json')
+    slow = [json.loads(record.getMessage())
+            for record in metrics_log.records
+            if record.levelno == logging.WARNING]
+    assert slow and all(entry['view'] == 'ProductViewSet.update_amount'
+                        for entry in slow)
+    assert any(entry['sql'].startswith('UPDATE "products_product"')
+               for entry in slow)
+
+
+def test_prometheus_endpoint(metrics_enabled, api_client_with_jwt,
+                             product_type):
+    '''Тест проверяет накопление метрик по представлениям'''
+
+    for _ in range(2):
+        api_client_with_jwt.get(reverse('product_type-list'))
+    api_client_with_jwt.get(reverse('product_type-stats',
+                                    args=(product_type.id,)))
+    response = api_client_with_jwt.get(reverse('metrics'))
+    assert response.status_code == HTTPStatus.OK
+    assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+    text = response.content.decode()
+    assert 'api_requests_total{view="ProductTypeViewSet.list"} 2' in text
+    assert 'api_requests_total{view="ProductTypeViewSet.stats"} 1' in text
+    assert '# TYPE api_db_queries_total counter' in text
+    assert '# TYPE api_serialize_duration_seconds_total counter' in text
+
+
+def test_metrics_disabled_by_default(api_client_with_jwt, product_list_url):
+    response = api_client_with_jwt.get(product_list_url)
+    assert 'Server-Timing' not in response
+    response = api_client_with_jwt.get(reverse('metrics'))
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_metrics_endpoint_only_local(metrics_enabled, client):
+    response = client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+    assert response.status_code == HTTPStatus.NOT_FOUND
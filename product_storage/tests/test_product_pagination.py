@@ -0,0 +1,185 @@
+import json
+from base64 import urlsafe_b64encode
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.pagination import ProductPagination
+from products.models import Product
+
+
+def walk_pages(client, url, params):
+    '''Проходит по всем страницам через ссылки next'''
+
+    response = client.get(url, params)
+    pages = [response]
+    while response.data.get('next'):
+        response = client.get(response.data.get('next'))
+        pages.append(response)
+    return pages
+
+
+@pytest.mark.parametrize('ordering_field', (None, 'name', '-name',
+                                            'price', '-price',
+                                            'date_updated', '-date_updated'))
+def test_product_cursor_pagination(api_client_with_jwt, product_list,
+                                   product_list_url, ordering_field):
+    '''Тест проверяет, что keyset-пагинация отдает все товары
+    в порядке сортировки без пропусков и повторов'''
+
+    params = {'cursor': '', 'limit': 1}
+    if ordering_field:
+        params['ordering'] = ordering_field
+    pages = walk_pages(api_client_with_jwt, product_list_url, params)
+    assert all(page.status_code == HTTPStatus.OK for page in pages)
+    ids = [el.get('id') for page in pages for el in page.data['results']]
+    field = (ordering_field or '-date_updated').replace('price',
+                                                        'price__price')
+    tiebreaker = '-id' if field.startswith('-') else 'id'
+    assert ids == list(Product.objects.order_by(
+        field, tiebreaker).values_list('id', flat=True))
+    assert 'count' not in pages[0].data
+
+    # Проверяем, что ссылка previous возвращает на предыдущую страницу
+    response = api_client_with_jwt.get(pages[-1].data.get('previous'))
+    assert response.status_code == HTTPStatus.OK
+    assert response.data['results'] == pages[-2].data['results']
+
+
+@pytest.mark.parametrize('ordering', ('price', '-price'))
+@pytest.mark.parametrize('denormalized_price', (False, True))
+def test_product_price_ordering_without_price(api_client_with_jwt,
+                                              product_list, product_type,
+                                              product_list_url, settings,
+                                              ordering, denormalized_price):
+    '''Тест проверяет, что товары без цены не пропадают при сортировке
+    по цене: они идут в конце выдачи, и курсор проходит их в обе стороны'''
+
+    settings.PRODUCT_DENORMALIZED_PRICE = denormalized_price
+    without_price = [Product.objects.create(
+        name=f'no price {idx}', type=product_type, amount=1,
+        barcode=f'2234567{idx}', is_active=True).id for idx in range(2)]
+    descending = ordering.startswith('-')
+    priced = list(Product.objects.filter(price__isnull=False).order_by(
+        ordering.replace('price', 'price__price')).values_list(
+        'id', flat=True))
+    expected = priced + sorted(without_price, reverse=descending)
+
+    response = api_client_with_jwt.get(product_list_url,
+                                       {'ordering': ordering})
+    assert response.data['count'] == len(expected)
+    assert {el['id'] for el in response.data['results'][-2:]} == set(
+        without_price)
+
+    pages = walk_pages(api_client_with_jwt, product_list_url,
+                       {'cursor': '', 'limit': 1, 'ordering': ordering})
+    assert [el['id'] for page in pages
+            for el in page.data['results']] == expected
+    previous = pages[-1].data['previous']
+    for page in reversed(pages[:-1]):
+        response = api_client_with_jwt.get(previous)
+        assert response.data['results'] == page.data['results']
+        previous = response.data['previous']
+    assert previous is None
+
+
+def test_product_cursor_pagination_count(api_client_with_jwt, product_list,
+                                         product_list_url):
+    response = api_client_with_jwt.get(product_list_url,
+                                       {'cursor': '', 'count': 'true'})
+    assert response.status_code == HTTPStatus.OK
+    assert response.data.get('count') == Product.objects.count()
+    assert response.data.get('previous') is None
+
+
+@pytest.mark.parametrize('cursor, ordering', (
+    ('not-a-cursor', None),
+    ({'v': '2024-01-01T00:00:00+00:00', 'id': 'abc', 'r': False}, None),
+    ({'v': 'garbage', 'id': 1, 'r': False}, None),
+    ({'v': [1], 'id': 1, 'r': False}, None),
+    ({'v': None, 'id': 1, 'r': False}, None),
+    ({'v': '2024-01-01T00:00:00+00:00', 'id': [1], 'r': False}, None),
+    ({'v': '2024-01-01T00:00:00+00:00', 'id': 1, 'r': 'yes'}, None),
+    ({'v': 'garbage', 'id': 1, 'r': False}, 'price'),
+    ({'v': {'a': 1}, 'id': 1, 'r': False}, 'price'),
+))
+def test_product_cursor_pagination_invalid_cursor(api_client_with_jwt,
+                                                  product_list,
+                                                  product_list_url,
+                                                  cursor, ordering):
+    if not isinstance(cursor, str):
+        cursor = urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+    params = {'cursor': cursor}
+    if ordering:
+        params['ordering'] = ordering
+    response = api_client_with_jwt.get(product_list_url, params)
+    assert response.status_code == HTTPStatus.NOT_FOUND
+
+
+def test_product_pagination_max_limit(api_client_with_jwt, product_list,
+                                      product_list_url, monkeypatch):
+    monkeypatch.setattr(ProductPagination, 'max_limit', 2)
+    response = api_client_with_jwt.get(product_list_url, {'limit': 1000})
+    assert len(response.data['results']) == 2
+    assert 'limit=2' in response.data['next']
+
+
+def test_product_pagination_without_count(api_client_with_jwt, product_list,
+                                          product_list_url):
+    '''Тест проверяет, что с ?count=false страницы и ссылки
+    строятся без COUNT(*)'''
+
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client_with_jwt.get(product_list_url,
+                                           {'count': 'false', 'limit': 2})
+    assert not any('COUNT(*)' in query['sql']
+                   for query in queries.captured_queries)
+    assert 'count' not in response.data
+    assert len(response.data['results']) == 2
+    response = api_client_with_jwt.get(response.data['next'])
+    assert len(response.data['results']) == 1
+    assert response.data['next'] is None
+    assert response.data['previous'] is not None
+
+
+def test_product_pagination_cached_count(api_client_with_jwt, product_list,
+                                         product_list_url,
+                                         product_bulk_create,
+                                         product_bulk_create_data,
+                                         django_capture_on_commit_callbacks):
+    '''Тест проверяет, что точный COUNT(*) выборки кэшируется для всех
+    ее страниц и сбрасывается при изменении товаров'''
+
+    response = api_client_with_jwt.get(product_list_url, {'limit': 1})
+    assert response.data['count'] == 3
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client_with_jwt.get(product_list_url,
+                                           {'limit': 1, 'offset': 1})
+    assert not any('COUNT(*)' in query['sql']
+                   for query in queries.captured_queries)
+    assert response.data['count'] == 3
+
+    with django_capture_on_commit_callbacks(execute=True):
+        api_client_with_jwt.post(product_bulk_create,
+                                 product_bulk_create_data, format='json')
+    response = api_client_with_jwt.get(product_list_url,
+                                       {'limit': 1, 'offset': 2})
+    assert response.data['count'] == 6
+
+
+def test_product_pagination_estimated_count(api_client_with_jwt,
+                                            product_list, product_list_url):
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+    Product.objects.filter(pk=product_list[0].pk).delete()
+    # Оценка берется из статистики и не видит удаления до ANALYZE
+    response = api_client_with_jwt.get(product_list_url,
+                                       {'count': 'estimate'})
+    assert response.data['count'] == 3
+    # С фильтром оценки нет, считается точно
+    response = api_client_with_jwt.get(
+        product_list_url, {'count': 'estimate', 'is_active': True})
+    assert response.data['count'] == Product.objects.filter(
+        is_active=True).count()
@@ -0,0 +1,74 @@
+import re
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from products.models import ExchangeRate
+
+# Полное сканирование таблицы: SCAN без индекса
+FULL_SCAN = re.compile(r'^SCAN \S+$')
+# Сортировка всей выборки во временном B-дереве. Досортировка по второму
+# ключу (RIGHT PART OF ORDER BY) допустима: строки идут в порядке индекса
+FULL_SORT = 'USE TEMP B-TREE FOR ORDER BY'
+
+# Порядок задает индекс только со столбцами цены товара: через LEFT JOIN
+# товары без цены остаются в выдаче, и выборка сортируется целиком
+DENORMALIZED_ONLY = 'denormalized'
+
+# Параметры запроса и признак того, что порядок задает индекс. Фильтр
+# по валюте сужает выборку индексом, а найденные строки сортируются
+QUERY_SHAPES = (
+    ({}, True),
+    ({'is_active': 'true'}, True),
+    ({'is_active': 'false'}, True),
+    ({'is_active': 'true', 'date_updated_after': '2024-01-01T00:00:00Z'},
+     True),
+    ({'date_updated_after': '2024-01-01T00:00:00Z',
+      'date_updated_before': '2025-01-01T00:00:00Z'}, True),
+    ({'ordering': 'name'}, True),
+    ({'ordering': 'price'}, DENORMALIZED_ONLY),
+    ({'ordering': '-price'}, DENORMALIZED_ONLY),
+    ({'ordering': 'price', 'min_price': 10, 'max_price': 100}, True),
+    ({'ordering': 'price', 'currency': 'RUB'}, True),
+    ({'ordering': 'price', 'target_currency': 'rub'}, True),
+    ({'ordering': '-price', 'target_currency': 'rub', 'min_price': 10},
+     True),
+    ({'currency': 'RUB', 'min_price': 10}, False),
+    ({'currency': 'rub'}, False),
+)
+
+
+def get_list_query(client, url, params):
+    '''SQL выборки страницы товаров, выполненный при запросе списка'''
+
+    with CaptureQueriesContext(connection) as context:
+        client.get(url, {'cursor': '', 'limit': 20, **params})
+    return next(query['sql'] for query in context.captured_queries
+                if query['sql'].startswith('SELECT')
+                and 'FROM "products_product"' in query['sql']
+                and 'LIMIT' in query['sql'])
+
+
+@pytest.mark.skipif(connection.vendor != 'sqlite',
+                    reason='формат EXPLAIN QUERY PLAN SQLite')
+@pytest.mark.parametrize('params, index_order', QUERY_SHAPES)
+@pytest.mark.parametrize('denormalized_price', (False, True))
+def test_product_list_uses_indexes(api_client_with_jwt, product_list,
+                                   product_list_url, settings, params,
+                                   index_order, denormalized_price):
+    '''Тест проверяет, что каждая комбинация фильтров и сортировки
+    списка товаров выполняется по индексу, без полного сканирования'''
+
+    settings.PRODUCT_DENORMALIZED_PRICE = denormalized_price
+    if 'target_currency' in params:
+        ExchangeRate.objects.create(currency='dollar', rate=90)
+        ExchangeRate.objects.create(currency='euro', rate=100)
+    sql = get_list_query(api_client_with_jwt, product_list_url, params)
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        plan = [row[-1] for row in cursor.fetchall()]
+    assert not [step for step in plan if FULL_SCAN.match(step)], plan
+    if index_order is True or index_order == DENORMALIZED_ONLY \
+            and denormalized_price:
+        assert FULL_SORT not in plan, plan
@@ -0,0 +1,59 @@
+from http import HTTPStatus
+
+import pytest
+
+from products.models import Product, ProductPrice
+
+
+@pytest.fixture
+def search_products(product_type):
+    names = ('Молоко Простоквашино 3.2%', 'Молочный шоколад',
+             'Кефир', 'Сыр молочный')
+    products = Product.objects.bulk_create(
+        Product(name=name, amount=1, barcode=str(20000000 + idx),
+                type=product_type) for idx, name in enumerate(names))
+    ProductPrice.objects.bulk_create(
+        ProductPrice(price=10, product=product) for product in products)
+    return products
+
+
+def search_names(client, url, query, **params):
+    response = client.get(url, {'search': query, **params})
+    assert response.status_code == HTTPStatus.OK, (
+        f'Response: {response.data}')
+    return [el.get('name') for el in response.data.get('results')]
+
+
+def test_product_search_prefix(api_client_with_jwt, search_products,
+                               product_list_url):
+    '''Тест проверяет регистронезависимый поиск по префиксам слов'''
+
+    assert set(search_names(api_client_with_jwt, product_list_url,
+                            'МОЛОЧ')) == {'Молочный шоколад', 'Сыр молочный'}
+    assert search_names(api_client_with_jwt, product_list_url,
+                        'молок прост') == ['Молоко Простоквашино 3.2%']
+    assert len(search_names(api_client_with_jwt, product_list_url,
+                            '2000000')) == len(search_products)
+    assert search_names(api_client_with_jwt, product_list_url,
+                        'шокола', ordering='name') == ['Молочный шоколад']
+    assert search_names(api_client_with_jwt, product_list_url, '"*') == []
+
+
+def test_product_search_index_sync(api_client_with_jwt, search_products,
+                                   product_list_url, product_detail_url,
+                                   product):
+    '''Тест проверяет, что индекс следует за изменениями товаров'''
+
+    kefir = Product.objects.get(name='Кефир')
+    kefir.name = 'Ряженка'
+    kefir.save()
+    Product.objects.filter(name__startswith='Сыр').delete()
+
+    assert search_names(api_client_with_jwt, product_list_url,
+                        'кефир') == []
+    assert search_names(api_client_with_jwt, product_list_url,
+                        'ряж') == ['Ряженка']
+    assert search_names(api_client_with_jwt, product_list_url,
+                        'молочн') == ['Молочный шоколад']
+    assert search_names(api_client_with_jwt, product_list_url,
+                        product.barcode[:5]) == [product.name]
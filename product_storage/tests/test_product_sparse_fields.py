@@ -0,0 +1,86 @@
+import json
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@pytest.mark.parametrize('values_list_read', (False, True))
+@pytest.mark.parametrize('denormalized_price', (False, True))
+def test_product_list_sparse_fields(api_client_with_jwt, product_list,
+                                    product_list_url, settings,
+                                    values_list_read, denormalized_price):
+    '''Тест проверяет, что ?fields= сужает и ответ, и SELECT,
+    а без цены в полях JOIN с ценами не выполняется'''
+
+    settings.PRODUCT_VALUES_LIST_READ = values_list_read
+    settings.PRODUCT_DENORMALIZED_PRICE = denormalized_price
+    full = api_client_with_jwt.get(product_list_url).data['results']
+    with CaptureQueriesContext(connection) as queries:
+        response = api_client_with_jwt.get(
+            product_list_url, {'fields': 'amount, name,id,barcode'})
+    assert response.status_code == HTTPStatus.OK
+    assert response.data['results'] == [
+        {key: product[key] for key in ('id', 'name', 'amount', 'barcode')}
+        for product in full]
+    select = queries.captured_queries[-1]['sql']
+    assert 'JOIN' not in select
+    assert 'date_updated' not in select.split('FROM')[0]
+
+    response = api_client_with_jwt.get(product_list_url,
+                                       {'fields': 'id,price'})
+    assert response.data['results'] == [
+        {'id': product['id'], 'price': product['price']}
+        for product in full]
+
+
+def test_product_detail_sparse_fields(api_client_with_jwt, product,
+                                      product_detail_url,
+                                      django_assert_max_num_queries):
+    with django_assert_max_num_queries(2):
+        response = api_client_with_jwt.get(product_detail_url,
+                                           {'fields': 'id,type'})
+    assert response.status_code == HTTPStatus.OK
+    assert response.data == {'id': product.id, 'type': product.type_id}
+    assert 'ETag' not in response
+
+
+def test_product_sparse_fields_unknown(api_client_with_jwt, product_list,
+                                       product_list_url):
+    response = api_client_with_jwt.get(product_list_url,
+                                       {'fields': 'id,secret'})
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert 'fields' in response.data
+
+
+def test_product_list_columns_format(api_client_with_jwt, product_list,
+                                     product_list_url):
+    '''Тест проверяет, что колоночный формат содержит те же данные,
+    что и обычный JSON, и короче его'''
+
+    response = api_client_with_jwt.get(product_list_url)
+    compact = api_client_with_jwt.get(product_list_url,
+                                      {'format': 'columns'})
+    assert compact.status_code == HTTPStatus.OK
+    assert compact['Content-Type'] == 'application/vnd.columns+json'
+    assert len(compact.content) < len(response.content)
+
+    data = json.loads(compact.content)
+    columns = data['columns']
+    assert columns[:3] == ['id', 'name', {'price': ['id', 'currency',
+                                                    'price']}]
+
+    def to_object(row, columns):
+        obj = {}
+        for column, value in zip(columns, row):
+            if isinstance(column, dict):
+                (key, nested), = column.items()
+                obj[key] = value and to_object(value, nested)
+            else:
+                obj[column] = value
+        return obj
+
+    assert [to_object(row, columns) for row in data['rows']] == json.loads(
+        response.content)['results']
+    assert data['count'] == response.data['count']
@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta, timezone
+from http import HTTPStatus
+
+import pytest
+from django.core.management import call_command
+from django.db.models import Sum
+from django.urls import reverse
+
+from products.models import (Product, StockMovement, StockMovementReasons,
+                             StockSnapshot)
+
+
+def assert_ledger_matches_products():
+    ledger = dict(StockMovement.objects.values_list('product').annotate(
+        total=Sum('delta')))
+    amounts = dict(Product.objects.values_list('pk', 'amount'))
+    assert {pk: ledger.get(pk, 0) for pk in amounts} == amounts
+
+
+@pytest.fixture
+def stock_url(product):
+    return reverse('product-stock', args=(product.id,))
+
+
+def test_movements_written_by_every_amount_change(
+        api_client_with_jwt, product, update_amount_url,
+        product_detail_url, product_patch_data,
+        product_bulk_update_amount_url, product_bulk_create,
+        product_bulk_create_data):
+    '''Тест проверяет, что каждое изменение количества попадает
+    в журнал и сумма движений совпадает с количеством товаров'''
+
+    # upsert перезаписывает количество существующего товара
+    product_bulk_create_data['products'][0]['barcode'] = product.barcode
+    api_client_with_jwt.post(product_bulk_create,
+                             {**product_bulk_create_data, 'upsert': True},
+                             format='json')
+    assert_ledger_matches_products()
+    api_client_with_jwt.patch(update_amount_url, {'amount_delta': 20},
+                              format='json')
+    # Изменение без количества в журнал не попадает
+    api_client_with_jwt.patch(product_detail_url, product_patch_data,
+                              format='json')
+    api_client_with_jwt.post(product_bulk_update_amount_url, {'items': [
+        {'id': pk, 'amount_delta': 3}
+        for pk in Product.objects.values_list('pk', flat=True)]},
+        format='json')
+    assert_ledger_matches_products()
+    assert list(StockMovement.objects.filter(product=product).values_list(
+        'reason', 'delta')) == [(StockMovementReasons.CREATE, 50),
+                                (StockMovementReasons.BULK_CREATE, -50),
+                                (StockMovementReasons.AMOUNT, 20),
+                                (StockMovementReasons.AMOUNT, 3)]
+
+
+def test_rejected_change_not_recorded(api_client_with_jwt, product,
+                                      update_amount_url):
+    response = api_client_with_jwt.patch(
+        update_amount_url, {'amount_delta': -1000}, format='json')
+    assert response.status_code == HTTPStatus.BAD_REQUEST
+    assert StockMovement.objects.filter(product=product).count() == 1
+
+
+def test_admin_list_editable_recorded(client, django_user_model, product):
+    '''Тест проверяет запись изменения из списка товаров в админке'''
+
+    client.force_login(django_user_model.objects.create_superuser(
+        'admin', password='admin'))
+    response = client.post(reverse('admin:products_product_changelist'), {
+        'form-TOTAL_FORMS': 1, 'form-INITIAL_FORMS': 1,
+        'form-0-id': product.id, 'form-0-amount': 60,
+        'form-0-is_active': 'on', '_save': 'Сохранить'})
+    assert response.status_code == HTTPStatus.FOUND
+    assert StockMovement.objects.filter(
+        product=product).latest('pk').delta == 10
+    assert_ledger_matches_products()
+
+
+def test_stock_as_of_after_compaction(api_client_with_jwt, product,
+                                      update_amount_url, stock_url,
+                                      django_assert_num_queries):
+    '''Тест проверяет, что остаток на момент времени одинаков
+    до и после сворачивания движений в дневные снимки'''
+
+    today = datetime.now(timezone.utc).replace(hour=12, minute=0, second=0,
+                                               microsecond=0)
+    for delta in (5, -3, 1):
+        api_client_with_jwt.patch(update_amount_url,
+                                  {'amount_delta': delta}, format='json')
+    # Движения за четыре дня до сегодняшнего и сегодня
+    for days_ago, movement in zip(
+            (4, 3, 2, 0), StockMovement.objects.order_by('pk')):
+        StockMovement.objects.filter(pk=movement.pk).update(
+            created_at=today - timedelta(days=days_ago))
+    midnight = today.replace(hour=0)
+    moments = {today - timedelta(days=4, hours=13): 0,
+               midnight - timedelta(days=2): 55,
+               today - timedelta(days=1): 52,
+               today + timedelta(hours=1): 53}
+    for moment, amount in moments.items():
+        assert StockMovement.objects.amount_as_of(
+            product.pk, moment) == amount
+    assert StockMovement.objects.amount_as_of(
+        product.pk, today - timedelta(days=3)) == 55
+
+    call_command('compact_stock_movements', days=1)
+    assert StockMovement.objects.count() == 1
+    assert list(StockSnapshot.objects.order_by('date').values_list(
+        'amount', flat=True)) == [50, 55, 52]
+    for moment, amount in moments.items():
+        with django_assert_num_queries(2):
+            assert StockMovement.objects.amount_as_of(
+                product.pk, moment) == amount
+    # Внутри свернутого дня — остаток на его начало
+    assert StockMovement.objects.amount_as_of(
+        product.pk, today - timedelta(days=3)) == 50
+
+    response = api_client_with_jwt.get(stock_url, {
+        'at': (today - timedelta(days=1)).isoformat()})
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['amount'] == 52
+
+    # Следующее сворачивание продолжает от последнего снимка
+    call_command('compact_stock_movements', days=-1)
+    assert not StockMovement.objects.exists()
+    assert StockSnapshot.objects.latest('date').amount == 53
+
+
+def test_stock_of_deleted_product(api_client_with_jwt, product,
+                                  product_detail_url, stock_url):
+    before_delete = datetime.now(timezone.utc)
+    api_client_with_jwt.delete(product_detail_url)
+    response = api_client_with_jwt.get(stock_url)
+    assert response.status_code == HTTPStatus.OK
+    assert response.json()['amount'] == 0
+    response = api_client_with_jwt.get(stock_url,
+                                       {'at': before_delete.isoformat()})
+    assert response.json()['amount'] == 50
+
+
+@pytest.mark.parametrize('pk, params, status', (
+    (10 ** 9, {}, HTTPStatus.NOT_FOUND),
+    (None, {'at': 'вчера'}, HTTPStatus.BAD_REQUEST),
+))
+def test_stock_errors(api_client_with_jwt, product, pk, params, status):
+    url = reverse('product-stock', args=(pk or product.id,))
+    assert api_client_with_jwt.get(url, params).status_code == status
@@ -0,0 +1,113 @@
+from decimal import Decimal
+from http import HTTPStatus
+
+from django.core.management import call_command
+from django.urls import reverse
+
+from products.models import Product, ProductPrice, ProductTypeStats
+
+
+def stats_snapshot():
+    '''Непустые группы агрегатов в сравнимом виде'''
+
+    return sorted(ProductTypeStats.objects.filter(
+        product_count__gt=0).values_list(
+        'type_id', 'currency', 'product_count', 'active_count',
+        'amount_total', 'price_sum', 'price_min', 'price_max'))
+
+
+def assert_stats_consistent():
+    '''Инкрементальные агрегаты совпадают с пересчитанными с нуля'''
+
+    incremental = stats_snapshot()
+    ProductTypeStats.objects.rebuild()
+    assert incremental == stats_snapshot()
+
+
+def test_type_stats_follow_writes(api_client_with_jwt, product_list,
+                                  product_type, product_type_2,
+                                  product_list_url, product_bulk_create,
+                                  product_bulk_create_data,
+                                  product_bulk_update_amount_url):
+    '''Тест проверяет, что агрегаты остаются согласованными
+    после каждого вида записи товаров и цен'''
+
+    assert_stats_consistent()
+    car, laptop, banana = product_list.order_by('id')
+
+    response = api_client_with_jwt.post(
+        product_bulk_create, product_bulk_create_data, format='json')
+    assert response.status_code == HTTPStatus.CREATED
+    assert_stats_consistent()
+
+    response = api_client_with_jwt.patch(
+        reverse('product-detail', args=(car.id,)),
+        {'type': product_type_2.id, 'is_active': True,
+         'price': {'price': 50, 'currency': 'dollar'}}, format='json')
+    assert response.status_code == HTTPStatus.OK
+    assert_stats_consistent()
+
+    response = api_client_with_jwt.patch(
+        reverse('product-update-amount', args=(laptop.id,)),
+        {'amount_delta': -19}, format='json')
+    assert response.status_code == HTTPStatus.OK
+    response = api_client_with_jwt.post(
+        product_bulk_update_amount_url,
+        {'items': [{'id': car.id, 'amount_delta': 5},
+                   {'id': banana.id, 'amount_delta': -8}]}, format='json')
+    assert response.status_code == HTTPStatus.OK
+    assert_stats_consistent()
+
+    # Удаление самой дешевой цены пересчитывает минимум группы
+    ProductPrice.objects.filter(product=banana).delete()
+    assert_stats_consistent()
+
+    response = api_client_with_jwt.delete(
+        reverse('product-detail', args=(laptop.id,)))
+    assert response.status_code == HTTPStatus.NO_CONTENT
+    assert_stats_consistent()
+    assert not ProductTypeStats.objects.filter(
+        type=product_type, currency='dollar', product_count__gt=0).exists()
+
+
+def test_type_stats_endpoint(api_client_with_jwt, product_list,
+                             product_type):
+    '''Тест проверяет ответ статистики типа'''
+
+    url = reverse('product_type-stats', args=(product_type.id,))
+    Product.objects.create(name='Без цены', amount=7, barcode='87654321',
+                           type=product_type)
+    response = api_client_with_jwt.get(url)
+    assert response.status_code == HTTPStatus.OK
+    assert response.data['type'] == product_type.id
+    assert response.data['product_count'] == 4
+    assert response.data['active_count'] == 3
+    assert response.data['amount_total'] == 100 + 99 + 98 + 7
+    prices = {price['currency']: price for price in response.data['prices']}
+    assert set(prices) == {'rub', 'dollar', 'euro'}
+    assert prices['dollar'] == {'currency': 'dollar', 'product_count': 1,
+                                'min': '90.00', 'max': '90.00',
+                                'avg': '90.00'}
+
+
+def test_type_stats_list(api_client_with_jwt, product_list, product_type,
+                         product_type_2, django_assert_max_num_queries):
+    url = reverse('product_type-stats-list')
+    with django_assert_max_num_queries(4):
+        response = api_client_with_jwt.get(url)
+    assert response.status_code == HTTPStatus.OK
+    results = {item['type']: item for item in response.data['results']}
+    assert results[product_type.id]['product_count'] == 3
+    assert results[product_type_2.id] == {
+        'type': product_type_2.id, 'name': product_type_2.name,
+        'product_count': 0, 'active_count': 0, 'amount_total': 0,
+        'prices': []}
+
+
+def test_rebuild_type_stats_command(product_list, product_type):
+    ProductTypeStats.objects.all().delete()
+    call_command('rebuild_type_stats')
+    stats = ProductTypeStats.objects.get(type=product_type, currency='rub')
+    assert stats.product_count == 1
+    assert stats.price_min == stats.price_max == Decimal(100)
+    assert stats.price_avg == Decimal('100.00')
@@ -0,0 +1,32 @@
+import pytest
+from django.core.cache import cache
+
+from products.models import Product, ProductPrice
+
+
+@pytest.mark.parametrize('params', (
+    {},
+    {'limit': 500},
+    {'ordering': '-price'},
+    {'search': 'ban'},
+    {'currency': 'dollar', 'format': 'json'},
+))
+@pytest.mark.parametrize('denormalized_price', (False, True))
+def test_product_list_values_read(api_client_with_jwt, product_list,
+                                  product_list_url, settings, params,
+                                  denormalized_price):
+    '''Тест проверяет, что список через values_list побайтно совпадает
+    с ответом сериализатора, в том числе для товара без цены'''
+
+    settings.PRODUCT_DENORMALIZED_PRICE = denormalized_price
+    Product.objects.create(name='Без цены', amount=1, barcode='87654321',
+                           type=product_list[0].type)
+    ProductPrice.objects.filter(product=product_list[0]).delete()
+    responses = []
+    for values_list_read in (False, True):
+        settings.PRODUCT_VALUES_LIST_READ = values_list_read
+        cache.clear()
+        response = api_client_with_jwt.get(product_list_url, params)
+        assert response.status_code == 200
+        responses.append(response.content)
+    assert responses[0] == responses[1]